@@ -3,7 +3,7 @@ from logging import getLogger
 from pydantic import SecretStr
 import urllib
 
-from httpx import AsyncClient, HTTPStatusError
+from httpx import AsyncClient, AsyncHTTPTransport, HTTPStatusError, Limits, Timeout
 
 from prefect.blocks.system import Secret
 from prefect.variables import Variable
@@ -14,6 +14,27 @@ SCICAT_LOGIN_PATH = "/auth/login"
 
 _LOGGER = getLogger("uvicorn.scicat")
 
+# requests to SciCat share one pool of keep-alive connections instead of connecting for every request
+SCICAT_MAX_CONNECTIONS = 16
+SCICAT_TIMEOUT_S = 30.0
+# retries of requests whose connection could not be established
+SCICAT_CONNECT_RETRIES = 3
+
+_client: AsyncClient | None = None
+
+
+def scicat_http_client() -> AsyncClient:
+    global _client
+    if _client is None:
+        limits = Limits(
+            max_connections=SCICAT_MAX_CONNECTIONS, max_keepalive_connections=SCICAT_MAX_CONNECTIONS
+        )
+        _client = AsyncClient(
+            timeout=Timeout(SCICAT_TIMEOUT_S),
+            transport=AsyncHTTPTransport(retries=SCICAT_CONNECT_RETRIES, limits=limits),
+        )
+    return _client
+
 
 async def get_scicat_credentials():
     user_block = await Secret.load("scicat-user")
@@ -24,23 +45,23 @@ async def get_scicat_credentials():
 async def get_scicat_token(
     scicat_endpoint: str, sciat_api_prefix: str, user: SecretStr, password: SecretStr
 ) -> SecretStr:
-    async with AsyncClient() as client:
-        resp = await client.post(
-            url=f"{scicat_endpoint}{sciat_api_prefix}{SCICAT_LOGIN_PATH}",
-            data={
-                "username": f"{user.get_secret_value()}",
-                "password": f"{password.get_secret_value()}",
-            },
-        )
+    client = scicat_http_client()
+    resp = await client.post(
+        url=f"{scicat_endpoint}{sciat_api_prefix}{SCICAT_LOGIN_PATH}",
+        data={
+            "username": f"{user.get_secret_value()}",
+            "password": f"{password.get_secret_value()}",
+        },
+    )
 
-        try:
-            resp.raise_for_status()
-        except HTTPStatusError as e:
-            message = f"SciCat login failed: {resp.status_code} {resp.reason_phrase} - {resp.text}"
-            _LOGGER.error(message)
-            raise HTTPStatusError(message, request=e.request, response=e.response) from e
+    try:
+        resp.raise_for_status()
+    except HTTPStatusError as e:
+        message = f"SciCat login failed: {resp.status_code} {resp.reason_phrase} - {resp.text}"
+        _LOGGER.error(message)
+        raise HTTPStatusError(message, request=e.request, response=e.response) from e
 
-        return SecretStr(resp.json()["access_token"])
+    return SecretStr(resp.json()["access_token"])
 
 
 async def get_scicat_endpoint():
@@ -82,22 +103,22 @@ async def mark_dataset_as_archivable(dataset_id: str):
 
     headers = build_headers(token)
     pid = safe_dataset_id(dataset_id)
-    async with AsyncClient() as client:
-        response = await client.patch(
-            url=f"{endpoint}{api_prefix}{SCICAT_DATASET_PATH}/{pid}/datasetlifecycle",
-            json=data,
-            headers=headers,
+    client = scicat_http_client()
+    response = await client.patch(
+        url=f"{endpoint}{api_prefix}{SCICAT_DATASET_PATH}/{pid}/datasetlifecycle",
+        json=data,
+        headers=headers,
+    )
+
+    try:
+        response.raise_for_status()
+    except HTTPStatusError as e:
+        message = (
+            f"SciCat mark-as-archivable failed for dataset {dataset_id}: "
+            f"{response.status_code} {response.reason_phrase} - {response.text}"
         )
-
-        try:
-            response.raise_for_status()
-        except HTTPStatusError as e:
-            message = (
-                f"SciCat mark-as-archivable failed for dataset {dataset_id}: "
-                f"{response.status_code} {response.reason_phrase} - {response.text}"
-            )
-            _LOGGER.error(message)
-            raise HTTPStatusError(message, request=e.request, response=e.response) from e
+        _LOGGER.error(message)
+        raise HTTPStatusError(message, request=e.request, response=e.response) from e
 
 
 async def start_archiving(owner_user: str, contact_email, owner_group: str, dataset_pid: str):
@@ -120,19 +141,19 @@ async def start_archiving(owner_user: str, contact_email, owner_group: str, data
 
     headers = build_headers(token)
 
-    async with AsyncClient() as client:
-        response = await client.post(
-            url=f"{endpoint}/api/v4{SCICAT_JOB_PATH}",
-            json=data,
-            headers=headers,
+    client = scicat_http_client()
+    response = await client.post(
+        url=f"{endpoint}/api/v4{SCICAT_JOB_PATH}",
+        json=data,
+        headers=headers,
+    )
+
+    try:
+        response.raise_for_status()
+    except HTTPStatusError as e:
+        message = (
+            f"SciCat job creation failed for dataset {dataset_pid}: "
+            f"{response.status_code} {response.reason_phrase} - {response.text}"
         )
-
-        try:
-            response.raise_for_status()
-        except HTTPStatusError as e:
-            message = (
-                f"SciCat job creation failed for dataset {dataset_pid}: "
-                f"{response.status_code} {response.reason_phrase} - {response.text}"
-            )
-            _LOGGER.error(message)
-            raise HTTPStatusError(message, request=e.request, response=e.response) from e
+        _LOGGER.error(message)
+        raise HTTPStatusError(message, request=e.request, response=e.response) from e
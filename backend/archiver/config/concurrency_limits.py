@@ -16,7 +16,7 @@ class ConcurrencyLimits(BaseSettings):
 def register_concurrency_limits(limits: ConcurrencyLimits):
     model = limits.model_dump()
     print(f"Applying concurrency limits: {model}")
-    stubs = [f.strip("_TAG") for f in model.keys() if f.endswith("_TAG")]
+    stubs = [f.removesuffix("_TAG") for f in model.keys() if f.endswith("_TAG")]
     for stub in stubs:
         tag = str(model.get(stub + "_TAG"))
         limit = int(model.get(stub + "_LIMIT"))
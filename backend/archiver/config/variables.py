@@ -31,15 +31,27 @@ class PrefectVariablesModel(BaseSettings):
     S3_ENDPOINT: str = ""
     S3_EXTERNAL_ENDPOINT: str = ""
     S3_URL_EXPIRATION_DAYS: int = 7
+    S3_MAX_BANDWIDTH_BYTES_PER_S: int = 0
+    S3_MAX_REQUESTS_PER_S: float = 0
 
     ARCHIVER_SCRATCH_FOLDER: Path = Path("")
     ARCHIVER_TARGET_SIZE_GB: int = 20
+    ARCHIVER_MAX_FILES_PER_DATABLOCK: int = 0
     ARCHIVER_NUM_WORKERS: int = 4
+    ARCHIVER_MAX_CONCURRENT_DATASETS: int = 4
+    ARCHIVER_DISTRIBUTED_MIN_SIZE_GB: int = 0
+    ARCHIVER_LARGE_DATASET_SIZE_GB: int = 1000
+    ARCHIVER_LARGE_DATASET_SLOTS: int = 1
+    ARCHIVER_SCHEDULING_THROUGHPUT_MB_S: int = 500
 
     SCICAT_ENDPOINT: str = ""
     SCICAT_API_PREFIX: str = ""
     SCICAT_DATASETS_API_PREFIX: str = ""
     SCICAT_JOBS_API_PREFIX: str = ""
+    SCICAT_MAX_CONCURRENT_REQUESTS: int = 16
+    SCICAT_DATABLOCKS_BULK_API: bool = False
+    SCICAT_HTTP2: bool = False
+    SCICAT_GZIP_REQUESTS: bool = True
 
 
 class Variables:
@@ -84,6 +96,26 @@ class Variables:
     def SCICAT_JOBS_API_PREFIX(self) -> str:
         return self.__get("scicat_jobs_api_prefix") or ""
 
+    @property
+    def SCICAT_MAX_CONCURRENT_REQUESTS(self) -> int:
+        """Bound of the concurrent requests of bulk datablock operations"""
+        return int(self.__get("scicat_max_concurrent_requests") or 16)
+
+    @property
+    def SCICAT_DATABLOCKS_BULK_API(self) -> bool:
+        """Whether SciCat accepts a list of datablocks in a single registration request"""
+        return self.__get("scicat_datablocks_bulk_api").lower() == "true"
+
+    @property
+    def SCICAT_HTTP2(self) -> bool:
+        """Whether requests to SciCat use HTTP/2 if the server supports it"""
+        return self.__get("scicat_http2").lower() == "true"
+
+    @property
+    def SCICAT_GZIP_REQUESTS(self) -> bool:
+        """Whether datablock registrations are sent gzip encoded, as long as SciCat accepts it"""
+        return (self.__get("scicat_gzip_requests") or "true").lower() == "true"
+
     @property
     def S3_ARCHIVAL_BUCKET(self) -> str:
         return self.__get("s3_archival_bucket")
@@ -108,6 +140,16 @@ class Variables:
     def S3_EXTERNAL_ENDPOINT(self) -> str:
         return self.__get("s3_external_endpoint")
 
+    @property
+    def S3_MAX_BANDWIDTH_BYTES_PER_S(self) -> int:
+        """Bandwidth budget shared by all S3 transfers on a node, 0 for unlimited"""
+        return int(self.__get("s3_max_bandwidth_bytes_per_s") or 0)
+
+    @property
+    def S3_MAX_REQUESTS_PER_S(self) -> float:
+        """Request rate budget shared by all S3 transfers on a node, 0 for unlimited"""
+        return float(self.__get("s3_max_requests_per_s") or 0)
+
     @property
     def ARCHIVER_SCRATCH_FOLDER(self) -> Path:
         return Path(self.__get("archiver_scratch_folder"))
@@ -116,10 +158,39 @@ class Variables:
     def ARCHIVER_TARGET_SIZE_GB(self) -> int:
         return int(self.__get("archiver_target_size_gb") or 200)
 
+    @property
+    def ARCHIVER_MAX_FILES_PER_DATABLOCK(self) -> int:
+        """Datablocks are split such that each is registered with at most this many files, 0 for no limit"""
+        return int(self.__get("archiver_max_files_per_datablock") or 0)
+
     @property
     def ARCHIVER_NUM_WORKERS(self) -> int:
         return int(self.__get("archiver_num_workers") or 30)
 
+    @property
+    def ARCHIVER_MAX_CONCURRENT_DATASETS(self) -> int:
+        return int(self.__get("archiver_max_concurrent_datasets") or 4)
+
+    @property
+    def ARCHIVER_DISTRIBUTED_MIN_SIZE_GB(self) -> int:
+        """Datasets of at least this size are packed by all workers of the pool, 0 to disable"""
+        return int(self.__get("archiver_distributed_min_size_gb") or 0)
+
+    @property
+    def ARCHIVER_LARGE_DATASET_SIZE_GB(self) -> int:
+        """Datasets of at least this size are scheduled in the lane for large datasets"""
+        return int(self.__get("archiver_large_dataset_size_gb") or 1000)
+
+    @property
+    def ARCHIVER_LARGE_DATASET_SLOTS(self) -> int:
+        """Number of the datasets in flight on a node that are reserved for large datasets"""
+        return int(self.__get("archiver_large_dataset_slots") or 1)
+
+    @property
+    def ARCHIVER_SCHEDULING_THROUGHPUT_MB_S(self) -> int:
+        """Throughput used to weigh the size of a dataset against its waiting time when scheduling"""
+        return int(self.__get("archiver_scheduling_throughput_mb_s") or 500)
+
 
 def register_variables_from_config(config: PrefectVariablesModel) -> None:
     model = config.model_dump()
@@ -1,26 +1,32 @@
-import math
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, Iterable, List
 from functools import partial
+from itertools import batched
 from uuid import UUID
+from pydantic import SecretStr
 
 
-from prefect import flow, task, State, Task, Flow
+from prefect import flow, task, unmapped, State, Task, Flow
+from prefect.deployments import run_deployment
 from prefect.client.schemas.objects import TaskRun, FlowRun
 from prefect.futures import wait as wait_for_futures
-from prefect.artifacts import (
-    create_progress_artifact,
-    update_progress_artifact,
-)
 
 from config.variables import Variables
 from utils.datablocks import ArchiveInfo
 
-from .flow_utils import StoragePaths, report_archival_error
+from .flow_utils import (
+    StoragePaths,
+    SystemError,
+    ProgressReporter,
+    report_archival_error,
+    submit_bounded,
+    dataset_archival_concurrency,
+)
 from .task_utils import (
     generate_task_name_dataset,
     generate_flow_name_job_id,
     generate_subflow_run_name_job_id_dataset_id,
+    generate_flow_name_partition,
 )
 from scicat.scicat_interface import SciCatClient
 from scicat.scicat_tasks import (
@@ -30,6 +36,7 @@ from scicat.scicat_tasks import (
     register_datablocks,
     get_scicat_access_token,
     get_job_datasetlist,
+    get_dataset_sizes,
     reset_dataset,
 )
 from scicat.scicat_tasks import report_job_failure_system_error, report_dataset_user_error
@@ -37,148 +44,207 @@ from scicat.scicat_tasks import report_job_failure_system_error, report_dataset_
 from utils.model import OrigDataBlock, DataBlock
 import utils.datablocks as datablocks_operations
 from config.concurrency_limits import ConcurrencyLimits
-from utils.s3_storage_interface import Bucket, get_s3_client
+from utils.s3_storage_interface import Bucket, S3Storage, get_s3_client
+from utils.scratch_reservations import ScratchReservations
+from utils.dataset_scheduler import DatasetScheduler
+from utils.stage_markers import StageMarkers
+from utils.result_manifests import ResultRef, save_results, load_results, iter_results
 from utils.log import getLogger
 
 
 def on_get_origdatablocks_error(dataset_id: str, task: Task, task_run: TaskRun, state: State):
     """Callback for get_origdatablocks tasks. Reports a user error."""
-    scicat_token = get_scicat_access_token()
-    report_dataset_user_error(dataset_id, token=scicat_token)
+    report_dataset_user_error(dataset_id)
 
 
 @task(task_run_name=generate_task_name_dataset)
-def download_origdatablocks(dataset_id: str, origDataBlocks: List[OrigDataBlock]):
-    s3_client = get_s3_client()
+def reserve_scratch(dataset_id: str, origDataBlocks: List[OrigDataBlock]) -> None:
+    """Prefect task waiting until the scratch space needed to archive the dataset is reserved. Datasets that
+    don't fit are queued until other datasets release their space.
+    """
+    GB_TO_B = 1024 * 1024 * 1024
+    datablocks_operations.reserve_scratch(
+        dataset_id, origDataBlocks, target_size=Variables().ARCHIVER_TARGET_SIZE_GB * GB_TO_B
+    )
 
-    if len(origDataBlocks) == 0:
-        return []
 
-    if all(
-        False
-        for _ in datablocks_operations.list_datablocks(
-            s3_client,
-            StoragePaths.relative_raw_files_folder(dataset_id),
-            Bucket.landingzone_bucket(),
-        )
-    ):
-        raise Exception(
-            f"""No objects found in landing zone at {
-                StoragePaths.relative_raw_files_folder(dataset_id)
-            } for dataset {dataset_id}. Storage endpoint: {s3_client.url}"""
-        )
+def datablocks_fingerprint(objects: List[S3Storage.ListedObject]) -> str:
+    return StageMarkers.fingerprint(
+        Variables().ARCHIVER_TARGET_SIZE_GB, [(o.Name, o.Size, o.ETag) for o in objects]
+    )
 
-    raw_files_scratch_folder = StoragePaths.scratch_archival_raw_files_folder(dataset_id)
-    raw_files_scratch_folder.mkdir(parents=True, exist_ok=True)
 
-    progress_artifact_id = create_progress_artifact(
-        progress=0.0,
-        description="Download progress",
+def registration_fingerprint(datablocks: Iterable[DataBlock]) -> str:
+    return StageMarkers.fingerprint(
+        [(d.archiveId, d.packedSize, [(f.path, f.chk) for f in d.dataFileList or []]) for d in datablocks]
     )
 
-    total_file_count = 0
-    for b in origDataBlocks:
-        total_file_count += len(b.dataFileList)
 
-    def update_progress(p):
-        update_progress.last_progress = 0
-        progress = math.floor(100.0 * p / total_file_count)
-        if progress > update_progress.last_progress:
-            update_progress.last_progress = progress
-            update_progress_artifact(artifact_id=progress_artifact_id, progress=progress)
+def stage_cache_key(stage: str, fingerprint_fn: Callable[[Dict[str, Any]], str]):
+    """Creates a Prefect cache key function for the task of a stage, derived from the stage marker"""
+
+    def cache_key_fn(context, parameters: Dict[str, Any]) -> str:
+        markers = StageMarkers(get_s3_client(), parameters["dataset_id"])
+        return markers.cache_key(stage, fingerprint_fn(parameters))
+
+    return cache_key_fn
+
 
-    getLogger().info(f"Downloading {total_file_count} objects from bucket {Bucket.landingzone_bucket()}")
-    # files with full path are downloaded to scratch root
-    file_paths = datablocks_operations.download_objects_from_s3(
+@task(task_run_name=generate_task_name_dataset)
+def list_raw_files(dataset_id: str) -> ResultRef:
+    s3_client = get_s3_client()
+
+    objects = datablocks_operations.list_datablocks(
         s3_client,
-        prefix=StoragePaths.relative_raw_files_folder(dataset_id),
-        bucket=Bucket.landingzone_bucket(),
-        destination_folder=raw_files_scratch_folder,
-        progress_callback=update_progress,
+        StoragePaths.relative_raw_files_folder(dataset_id),
+        Bucket.landingzone_bucket(),
     )
-    getLogger().info(f"Downloaded {len(file_paths)} objects from {Bucket.landingzone_bucket()}")
-
-    return file_paths
+    if len(objects) == 0:
+        raise Exception(
+            f"""No objects found in landing zone at {
+                StoragePaths.relative_raw_files_folder(dataset_id)
+            } for dataset {dataset_id}. Storage endpoint: {s3_client.url}"""
+        )
+    return save_results(dataset_id, "raw_files", objects, S3Storage.ListedObject)
 
 
 @task(task_run_name=generate_task_name_dataset)
-def create_tarfiles(dataset_id: str) -> List[ArchiveInfo]:
-    datablocks_scratch_folder = StoragePaths.scratch_archival_datablocks_folder(dataset_id)
-    datablocks_scratch_folder.mkdir(parents=True, exist_ok=True)
+def create_and_upload_tarfiles(dataset_id: str, objects_ref: ResultRef) -> ResultRef:
+    """Prefect task downloading the raw files of a dataset from the landing zone, packing them into datablocks
+    and uploading these to the archival bucket. The three steps run as overlapping stages per datablock.
+    Skipped if an earlier run uploaded the datablocks of the same raw files.
+    """
+    s3_client = get_s3_client()
+    objects = load_results(objects_ref, S3Storage.ListedObject)
 
     GB_TO_B = 1024 * 1024 * 1024
+    target_size = Variables().ARCHIVER_TARGET_SIZE_GB * GB_TO_B
+    max_files = Variables().ARCHIVER_MAX_FILES_PER_DATABLOCK
+
+    markers = StageMarkers(s3_client, dataset_id)
+    fingerprint = datablocks_fingerprint(objects)
+    if markers.is_complete(StageMarkers.DATABLOCKS, fingerprint):
+        getLogger().info(f"Datablocks of dataset {dataset_id} already uploaded")
+        num_partitions = len(datablocks_operations.partition_objects(objects, target_size, max_files))
+        archive_infos = datablocks_operations.load_archive_infos(s3_client, dataset_id, num_partitions)
+        return save_results(dataset_id, "archive_infos", archive_infos, ArchiveInfo)
+
+    getLogger().info(f"Archiving {len(objects)} objects from bucket {Bucket.landingzone_bucket()}")
+    with ProgressReporter("Download, pack and upload datablocks", total=len(objects)) as progress:
+        archive_infos = datablocks_operations.create_datablocks_pipelined(
+            s3_client,
+            dataset_id=dataset_id,
+            objects=objects,
+            target_size=target_size,
+            progress_callback=progress,
+            max_files=max_files,
+        )
+    markers.complete(StageMarkers.DATABLOCKS, fingerprint)
+    return save_results(dataset_id, "archive_infos", archive_infos, ArchiveInfo)
 
-    raw_files_scratch_folder = StoragePaths.scratch_archival_raw_files_folder(dataset_id)
-    raw_files_scratch_folder.mkdir(parents=True, exist_ok=True)
 
-    progress_artifact_id = create_progress_artifact(
-        progress=0.0,
-        description="Creating tar files",
-    )
+def on_create_datablock_flow_failure(flow: Flow, flow_run: FlowRun, state: State):
+    dataset_id = flow_run.parameters["dataset_id"]
+    partition_index = flow_run.parameters["partition_index"]
+    try:
+        datablocks_operations.cleanup_partition_scratch(
+            dataset_id, partition_index, flow_run.parameters["object_names"]
+        )
+    except Exception as e:
+        getLogger().error(f"failed to cleanup scratch of datablock {partition_index}: {e}")
+    ScratchReservations.from_variables().release(f"{dataset_id}/partition-{partition_index}")
 
-    def update_progress(progress):
-        update_progress.last_progress = 0
-        progress = math.floor(100.0 * progress)
-        if progress > update_progress.last_progress:
-            update_progress.last_progress = progress
-            update_progress_artifact(artifact_id=progress_artifact_id, progress=progress)
 
-    return datablocks_operations.create_tarfiles(
-        dataset_id=dataset_id,
-        src_folder=raw_files_scratch_folder,
-        dst_folder=datablocks_scratch_folder,
-        target_size=Variables().ARCHIVER_TARGET_SIZE_GB * GB_TO_B,
-        progress_callback=update_progress,
-    )
+@flow(
+    name="create_datablock",
+    flow_run_name=generate_flow_name_partition,
+    on_failure=[on_create_datablock_flow_failure],
+    on_cancellation=[on_create_datablock_flow_failure],
+)
+def create_datablock_flow(dataset_id: str, partition_index: int, object_names: List[str], size: int) -> None:
+    """Prefect flow creating a single datablock of a dataset. Deployed separately, such that the partitions of
+    very large datasets are processed by all workers of the pool. The result is collected from the manifest
+    stored by `datablocks_operations.create_datablock`.
+
+    Args:
+        dataset_id (str): Dataset id
+        partition_index (int): index of the partition in the partition plan of the dataset
+        object_names (List[str]): raw file objects of the partition in the landing zone
+        size (int): size of the raw files of the partition in bytes
+    """
+    s3_client = get_s3_client()
+    markers = StageMarkers(s3_client, dataset_id)
+    stage = f"{StageMarkers.DATABLOCKS}-{partition_index}"
+    fingerprint = StageMarkers.fingerprint(object_names, size)
+    if markers.is_complete(stage, fingerprint):
+        getLogger().info(f"Datablock {partition_index} of dataset {dataset_id} already uploaded")
+        return
+
+    reservation_id = f"{dataset_id}/partition-{partition_index}"
+    reservations = ScratchReservations.from_variables()
+    reservations.reserve(reservation_id, 2 * size)
+    try:
+        datablocks_operations.create_datablock(s3_client, dataset_id, partition_index, object_names)
+    finally:
+        reservations.release(reservation_id)
+    markers.complete(stage, fingerprint)
+
+
+DATABLOCK_CREATION_DEPLOYMENT = "create_datablock/datablock_creation"
 
 
 @task(task_run_name=generate_task_name_dataset)
-def create_datablock_entries(
-    dataset_id: str, orig_datablocks: List[OrigDataBlock], tar_files: List[ArchiveInfo]
-) -> List[DataBlock]:
-    datablocks_scratch_folder = StoragePaths.scratch_archival_datablocks_folder(dataset_id)
-    progress_artifact_id = create_progress_artifact(
-        progress=0.0,
-        description="Creating tar files",
+def create_datablock_on_worker(
+    dataset_id: str, partition_index: int, object_names: List[str], size: int
+) -> ResultRef:
+    """Prefect task running `create_datablock_flow` for one partition on any worker of the pool"""
+    flow_run = run_deployment(
+        name=DATABLOCK_CREATION_DEPLOYMENT,
+        parameters={
+            "dataset_id": dataset_id,
+            "partition_index": partition_index,
+            "object_names": object_names,
+            "size": size,
+        },
+        timeout=None,
     )
+    if not flow_run.state.is_completed():
+        raise SystemError(
+            f"Creating datablock {partition_index} of dataset {dataset_id} failed: {flow_run.state}"
+        )
 
-    def update_progress(progress):
-        update_progress.last_progress = 0
-        progress = math.floor(100.0 * progress)
-        if progress > update_progress.last_progress:
-            update_progress.last_progress = progress
-            update_progress_artifact(artifact_id=progress_artifact_id, progress=progress)
-
-    return datablocks_operations.create_datablock_entries(
-        dataset_id, datablocks_scratch_folder, orig_datablocks, tar_files, update_progress
+    archive_info = datablocks_operations.load_archive_info(
+        get_s3_client(), dataset_id, datablocks_operations.datablock_name(dataset_id, partition_index)
     )
+    return save_results(dataset_id, f"archive_infos_{partition_index}", [archive_info], ArchiveInfo)
+
+
+def use_distributed_datablock_creation(partitions: List[List[S3Storage.ListedObject]]) -> bool:
+    GB_TO_B = 1024 * 1024 * 1024
+    min_size = Variables().ARCHIVER_DISTRIBUTED_MIN_SIZE_GB * GB_TO_B
+    size = sum(o.Size for p in partitions for o in p)
+    return min_size > 0 and size >= min_size and len(partitions) > 1
 
 
 @task(task_run_name=generate_task_name_dataset)
-def upload_datablocks_to_s3(dataset_id: str) -> List[Path]:
-    s3_client = get_s3_client()
-    prefix = StoragePaths.relative_datablocks_folder(dataset_id)
+def create_datablock_entries(
+    dataset_id: str, orig_datablocks: List[OrigDataBlock], tar_files_refs: List[ResultRef]
+) -> ResultRef:
     datablocks_scratch_folder = StoragePaths.scratch_archival_datablocks_folder(dataset_id)
-    progress_artifact_id = create_progress_artifact(
-        progress=0.0,
-        description="Upload datablocks to s3",
-    )
+    tar_files = [tar for ref in tar_files_refs for tar in iter_results(ref, ArchiveInfo)]
+    with ProgressReporter("Creating datablock entries") as progress:
+        # entries are written as they are created, only one datablock with its files is kept in memory
+        datablocks = datablocks_operations.create_datablock_entries(
+            dataset_id, datablocks_scratch_folder, orig_datablocks, tar_files, progress
+        )
+        return save_results(dataset_id, "datablocks", datablocks, DataBlock)
 
-    def update_progress(progress):
-        update_progress.last_progress = 0
-        progress = math.floor(100.0 * progress)
-        if progress > update_progress.last_progress:
-            update_progress.last_progress = progress
-            update_progress_artifact(artifact_id=progress_artifact_id, progress=progress)
 
-    return datablocks_operations.upload_objects_to_s3(
-        client=s3_client,
-        prefix=prefix,
-        bucket=Bucket.archival_bucket(),
-        source_folder=datablocks_scratch_folder,
-        ext=".tar",
-        progress_callback=update_progress,
-    )
+@task(task_run_name=generate_task_name_dataset)
+def upload_dataset_manifest(dataset_id: str, tar_files_refs: List[ResultRef]) -> None:
+    """Prefect task storing the binary manifest of the files of a dataset next to its datablocks"""
+    tar_files = (tar for ref in tar_files_refs for tar in iter_results(ref, ArchiveInfo))
+    datablocks_operations.upload_dataset_manifest(get_s3_client(), dataset_id, tar_files)
 
 
 @task(task_run_name=generate_task_name_dataset)
@@ -224,44 +290,86 @@ def verify_datablock_in_verification(dataset_id: str, datablock: DataBlock) -> N
     datablocks_operations.verify_datablock_in_verification(dataset_id=dataset_id, datablock=datablock)
 
 
+@task(
+    task_run_name=generate_task_name_dataset,
+    cache_key_fn=stage_cache_key(StageMarkers.REGISTER, lambda p: p["datablocks_ref"].sha256),
+)
+def register_datablocks_once(datablocks_ref: ResultRef, dataset_id: str, token: SecretStr) -> None:
+    """Prefect task registering datablocks in Scicat, unless an earlier run registered the same datablocks"""
+    markers = StageMarkers(get_s3_client(), dataset_id)
+    fingerprint = registration_fingerprint(iter_results(datablocks_ref, DataBlock))
+    if markers.is_complete(StageMarkers.REGISTER, fingerprint):
+        getLogger().info(f"Datablocks of dataset {dataset_id} already registered")
+        return
+
+    # the manifest is read a batch at a time, such that only the datablocks in flight are held in memory
+    batch_size = Variables().SCICAT_MAX_CONCURRENT_REQUESTS
+    for datablocks in batched(iter_results(datablocks_ref, DataBlock), batch_size):
+        register_datablocks.fn(datablocks=list(datablocks), dataset_id=dataset_id, token=token)
+    markers.complete(StageMarkers.REGISTER, fingerprint)
+
+
 @flow(name="create_datablocks", flow_run_name=generate_subflow_run_name_job_id_dataset_id)
-def create_datablocks_flow(dataset_id: str) -> List[DataBlock]:
-    """Prefect (sub-)flow to create datablocks (.tar files) for files of a dataset and register them in Scicat.
+def create_datablocks_flow(dataset_id: str) -> ResultRef:
+    """Prefect (sub-)flow to create datablocks (.tar files) for files of a dataset, upload them to the archival
+    bucket and register them in Scicat.
 
     Args:
         dataset_id (str): Dataset id
 
     Returns:
-        List[DataBlock]: List of created and registered datablocks
+        ResultRef: reference to the list of created and registered datablocks
     """
 
     scicat_token = get_scicat_access_token.submit()
 
-    dataset_update = update_scicat_archival_dataset_lifecycle.submit(
+    # sent in the background, superseded by the final state if the dataset is archived quickly
+    update_scicat_archival_dataset_lifecycle(
         dataset_id=dataset_id,
         status=SciCatClient.ARCHIVESTATUSMESSAGE.STARTED,
-        token=scicat_token,
     )
 
     orig_datablocks = get_origdatablocks.with_options(
         on_failure=[partial(on_get_origdatablocks_error, dataset_id)]
-    ).submit(dataset_id=dataset_id, token=scicat_token, wait_for=[dataset_update])  # type: ignore
+    ).submit(dataset_id=dataset_id, token=scicat_token)  # type: ignore
 
-    files = download_origdatablocks.submit(dataset_id=dataset_id, origDataBlocks=orig_datablocks)
+    objects_ref = list_raw_files.submit(dataset_id=dataset_id, wait_for=[orig_datablocks]).result()
 
-    tarfiles_future = create_tarfiles.submit(dataset_id, wait_for=[files])
-    datablocks_future = create_datablock_entries.submit(dataset_id, orig_datablocks, tarfiles_future)
+    GB_TO_B = 1024 * 1024 * 1024
+    partitions = datablocks_operations.partition_objects(
+        load_results(objects_ref, S3Storage.ListedObject),
+        Variables().ARCHIVER_TARGET_SIZE_GB * GB_TO_B,
+        Variables().ARCHIVER_MAX_FILES_PER_DATABLOCK,
+    )
+    if use_distributed_datablock_creation(partitions):
+        # every partition is downloaded, packed and uploaded by its own flow run on any worker
+        tarfiles = create_datablock_on_worker.map(
+            dataset_id=unmapped(dataset_id),
+            partition_index=list(range(len(partitions))),
+            object_names=[[o.Name for o in p] for p in partitions],
+            size=[sum(o.Size for o in p) for p in partitions],
+        )
+        tarfiles_futures = list(tarfiles)
+    else:
+        reservation = reserve_scratch.submit(dataset_id=dataset_id, origDataBlocks=orig_datablocks)
+        tarfiles = create_and_upload_tarfiles.submit(
+            dataset_id=dataset_id, objects_ref=objects_ref, wait_for=[reservation]
+        )
+        tarfiles_futures = [tarfiles]
+    datablocks_future = create_datablock_entries.submit(dataset_id, orig_datablocks, tarfiles_futures)
+    manifest_future = upload_dataset_manifest.submit(dataset_id, tarfiles_futures)
 
     # Prefect issue: https://github.com/PrefectHQ/prefect/issues/12028
     # Exceptions are not propagated correctly
-    files.result()
-    tarfiles_future.result()
+    for f in tarfiles_futures:
+        f.result()
     datablocks_future.result()
+    manifest_future.result()
 
     scicat_token = get_scicat_access_token.submit(wait_for=[datablocks_future])
 
-    register_future = register_datablocks.submit(
-        datablocks=datablocks_future,  # type: ignore
+    register_future = register_datablocks_once.submit(
+        datablocks_ref=datablocks_future,  # type: ignore
         dataset_id=dataset_id,
         token=scicat_token,
     )
@@ -272,15 +380,15 @@ def create_datablocks_flow(dataset_id: str) -> List[DataBlock]:
 
 
 def on_dataset_flow_failure(flow: Flow, flow_run: FlowRun, state: State):
-    scicat_token = get_scicat_access_token()
     report_archival_error(
         dataset_id=flow_run.parameters["dataset_id"],
         state=state,
         task_run=None,
-        token=scicat_token,
     )
     try:
+        scicat_token = get_scicat_access_token()
         reset_dataset(dataset_id=flow_run.parameters["dataset_id"], token=scicat_token)
+        StageMarkers(get_s3_client(), flow_run.parameters["dataset_id"]).invalidate(StageMarkers.REGISTER)
     except Exception as e:
         getLogger().error(f"failed to reset datablocks {e}")
     datablocks_operations.cleanup_scratch(flow_run.parameters["dataset_id"])
@@ -304,26 +412,29 @@ def cleanup_dataset(flow: Flow, flow_run: FlowRun, state: State):
     on_cancellation=[on_dataset_flow_failure],
 )
 def archive_single_dataset_flow(dataset_id: str):
-    datablocks = create_datablocks_flow(dataset_id)
-
-    upload = upload_datablocks_to_s3.submit(dataset_id=dataset_id)
+    create_datablocks_flow(dataset_id)
 
-    access_token = get_scicat_access_token.submit(wait_for=[upload])
-    update_scicat_archival_dataset_lifecycle.submit(
+    update_scicat_archival_dataset_lifecycle(
         dataset_id=dataset_id,
         status=SciCatClient.ARCHIVESTATUSMESSAGE.DATASET_ON_ARCHIVEDISK,
         archivable=False,
         retrievable=True,
-        token=access_token,
-    ).result()
+    )
+
+
+@task(task_run_name=generate_task_name_dataset)
+def archive_dataset(dataset_id: str, size: int) -> None:
+    """Prefect task running the archival of a single dataset as a subflow. Allows the datasets of a job to be
+    archived concurrently, while the scheduler decides by size and priority which datasets of all jobs run.
+    """
+    with DatasetScheduler.from_variables().slot(dataset_id, DatasetScheduler.ARCHIVAL, size):
+        archive_single_dataset_flow(dataset_id=dataset_id)
 
 
 def on_job_flow_failure(flow: Flow, flow_run: FlowRun, state: State):
-    token = get_scicat_access_token()
     # TODO: differrentiate user error
     report_job_failure_system_error(
         job_id=flow_run.parameters["job_id"],
-        token=token,
     )
 
 
@@ -333,11 +444,8 @@ def on_job_flow_cancellation(flow: Flow, flow_run: FlowRun, state: State):
     for dataset_id in dataset_ids:
         datablocks_operations.cleanup_scratch(dataset_id)
 
-    token = get_scicat_access_token()
-
     report_job_failure_system_error(
         job_id=flow_run.parameters["job_id"],
-        token=token,
     )
 
 
@@ -349,8 +457,9 @@ def on_job_flow_cancellation(flow: Flow, flow_run: FlowRun, state: State):
     on_cancellation=[on_job_flow_cancellation],
 )
 def archive_datasets_flow(job_id: UUID, dataset_ids: List[str] | None = None):
-    """Prefect flow to archive a list of datasets. Corresponds to a "Job" in Scicat. Runs the individual archivals of the single datasets as subflows and reports
-    the overall job status to Scicat.
+    """Prefect flow to archive a list of datasets. Corresponds to a "Job" in Scicat. Runs the individual archivals of the single datasets as
+    concurrent subflows and reports the overall job status to Scicat: finished successfully, finished with dataset errors if some
+    datasets failed or finished unsuccessfully if all of them failed.
 
     Args:
         dataset_ids (List[str]): _description_
@@ -362,23 +471,34 @@ def archive_datasets_flow(job_id: UUID, dataset_ids: List[str] | None = None):
     dataset_ids: List[str] = dataset_ids or []
     access_token = get_scicat_access_token.submit()
 
-    job_update = update_scicat_archival_job_status.submit(
+    update_scicat_archival_job_status(
         job_id=job_id,
         status_message=SciCatClient.STATUSMESSAGE.IN_PROGRESS,
-        token=access_token,
     )
-    job_update.result()
 
     dataset_ids_future = get_job_datasetlist.submit(job_id=job_id, token=access_token)
     dataset_ids = dataset_ids_future.result()
 
-    for id in dataset_ids:
-        archive_single_dataset_flow(dataset_id=id)
+    # smallest datasets first, such that they are not queued behind the large ones of the same job
+    sizes = get_dataset_sizes.submit(dataset_ids=dataset_ids, token=access_token).result()
+    dataset_ids = sorted(dataset_ids, key=lambda id: sizes[id])
 
-    access_token = get_scicat_access_token.submit()
+    dataset_futures = submit_bounded(
+        archive_dataset,
+        parameters=[{"dataset_id": id, "size": sizes[id]} for id in dataset_ids],
+        limit=dataset_archival_concurrency(len(dataset_ids)),
+    )
+    wait_for_futures(dataset_futures)
 
-    update_scicat_archival_job_status.submit(
+    failed_dataset_ids = [id for id, f in zip(dataset_ids, dataset_futures) if not f.state.is_completed()]
+    if len(failed_dataset_ids) > 0:
+        getLogger().error(f"Archival failed for datasets {failed_dataset_ids}")
+    if len(dataset_ids) > 0 and len(failed_dataset_ids) == len(dataset_ids):
+        raise SystemError(f"Archival failed for all {len(dataset_ids)} datasets of job {job_id}")
+
+    update_scicat_archival_job_status(
         job_id=job_id,
-        status_message=SciCatClient.STATUSMESSAGE.FINISHED_SUCCESSFULLY,
-        token=access_token,
-    ).result()
+        status_message=SciCatClient.STATUSMESSAGE.FINISHED_WITHDATASET_ERRORS
+        if len(failed_dataset_ids) > 0
+        else SciCatClient.STATUSMESSAGE.FINISHED_SUCCESSFULLY,
+    )
@@ -1,8 +1,15 @@
+from datetime import timedelta
 from pathlib import Path
-from pydantic import SecretStr
-
-from prefect import State
+import math
+import shutil
+import threading
+import time
+from typing import Any, Dict, List
+
+from prefect import State, Task
+from prefect.artifacts import create_progress_artifact, update_progress_artifact
 from prefect.client.schemas.objects import TaskRun
+from prefect.futures import PrefectFuture, as_completed
 
 from config.variables import Variables
 from scicat.scicat_tasks import (
@@ -24,7 +31,7 @@ class SystemError(Exception):
     pass
 
 
-def report_archival_error(dataset_id: str, state: State, task_run: TaskRun, token: SecretStr):
+def report_archival_error(dataset_id: str, state: State, task_run: TaskRun):
     """Report an error of an archival job of a dataset. Differntiates betwen "DatasetError" (User error, e.g. missing files)
     and SystemError (transient error).
 
@@ -36,15 +43,15 @@ def report_archival_error(dataset_id: str, state: State, task_run: TaskRun, toke
     try:
         state.result()
     except DatasetError:
-        report_dataset_user_error(dataset_id=dataset_id, token=token)
+        report_dataset_user_error(dataset_id=dataset_id)
     except SystemError:
-        report_dataset_system_error(dataset_id=dataset_id, token=token)
+        report_dataset_system_error(dataset_id=dataset_id)
     except Exception:
         # TODO: add some info about unknown errors
-        report_dataset_system_error(dataset_id=dataset_id, token=token)
+        report_dataset_system_error(dataset_id=dataset_id)
 
 
-def report_retrieval_error(dataset_id: str, state: State, task_run: TaskRun, token: SecretStr):
+def report_retrieval_error(dataset_id: str, state: State, task_run: TaskRun):
     """Report a retrieval error of a job of a dataset. Differentiates between "DatasetError" (User error, e.g. missing files)
     and SystemError (transient error).
 
@@ -54,7 +61,7 @@ def report_retrieval_error(dataset_id: str, state: State, task_run: TaskRun, tok
         task_run (TaskRun): task run
     """
 
-    report_dataset_retrieval_error(dataset_id=dataset_id, token=token)
+    report_dataset_retrieval_error(dataset_id=dataset_id)
 
 
 class StoragePaths:
@@ -68,12 +75,18 @@ class StoragePaths:
     def scratch_archival_root() -> Path:
         return Variables().ARCHIVER_SCRATCH_FOLDER / "archival"
 
+    @staticmethod
+    def scratch_trash_folder() -> Path:
+        return Variables().ARCHIVER_SCRATCH_FOLDER / ".trash"
+
     @staticmethod
     def _relative_dataset_folder(dataset_id: str) -> Path:
         return Path("openem-network") / "datasets" / dataset_id
 
     _relative_datablocks_folder: Path = Path("datablocks")
     _relative_raw_files_folder: Path = Path("raw_files")
+    _relative_manifests_folder: Path = Path("manifests")
+    _relative_stages_folder: Path = Path("stages")
 
     @staticmethod
     def relative_datablocks_folder(dataset_id: str):
@@ -83,6 +96,14 @@ class StoragePaths:
     def relative_raw_files_folder(dataset_id: str):
         return StoragePaths._relative_dataset_folder(dataset_id) / StoragePaths._relative_raw_files_folder
 
+    @staticmethod
+    def relative_manifests_folder(dataset_id: str):
+        return StoragePaths._relative_dataset_folder(dataset_id) / StoragePaths._relative_manifests_folder
+
+    @staticmethod
+    def relative_stages_folder(dataset_id: str):
+        return StoragePaths._relative_dataset_folder(dataset_id) / StoragePaths._relative_stages_folder
+
     @staticmethod
     def scratch_archival_datablocks_folder(dataset_id: str) -> Path:
         return StoragePaths.scratch_archival_root() / StoragePaths.relative_datablocks_folder(dataset_id)
@@ -90,3 +111,122 @@ class StoragePaths:
     @staticmethod
     def scratch_archival_raw_files_folder(dataset_id: str) -> Path:
         return StoragePaths.scratch_archival_root() / StoragePaths.relative_raw_files_folder(dataset_id)
+
+
+def submit_bounded(task: Task, parameters: List[Dict[str, Any]], limit: int) -> List[PrefectFuture]:
+    """Submits a task once for every set of parameters, with at most `limit` runs in flight at the same time.
+    Blocks until the last run is submitted.
+
+    Args:
+        task (Task): Prefect task to submit
+        parameters (List[Dict[str, Any]]): keyword arguments of each run
+        limit (int): maximum number of runs in flight
+
+    Returns:
+        List[PrefectFuture]: futures in the order of `parameters`
+    """
+    futures: List[PrefectFuture] = []
+    in_flight: List[PrefectFuture] = []
+    for p in parameters:
+        if len(in_flight) >= max(1, limit):
+            done = next(as_completed(in_flight))
+            in_flight.remove(done)
+        future = task.submit(**p)
+        futures.append(future)
+        in_flight.append(future)
+    return futures
+
+
+def dataset_archival_concurrency(num_datasets: int) -> int:
+    """Number of datasets of a job to archive concurrently. Bounded by the configured maximum and by the
+    scratch space, where each dataset in flight needs at least the raw files and the tar of one datablock.
+    """
+    GB_TO_B = 1024 * 1024 * 1024
+    min_footprint = 2 * Variables().ARCHIVER_TARGET_SIZE_GB * GB_TO_B
+
+    scratch_folder = Variables().ARCHIVER_SCRATCH_FOLDER
+    fitting_scratch = num_datasets
+    if scratch_folder.exists():
+        fitting_scratch = shutil.disk_usage(scratch_folder).free // min_footprint
+
+    return max(1, min(Variables().ARCHIVER_MAX_CONCURRENT_DATASETS, num_datasets, fitting_scratch))
+
+
+class ProgressReporter:
+    """Reports the progress of a task to a Prefect progress artifact.
+
+    Instances are called with the progress as a fraction in [0, 1], possibly from several worker threads.
+    Updates are aggregated and the artifact is only updated if the percentage changed and at least
+    `flush_interval_s` passed since the last update, such that tasks handling many files don't issue an API
+    call per file. The description of the artifact includes the throughput and an estimated time remaining.
+
+    Usage:
+        with ProgressReporter("Creating tar files", total=len(files), unit="files") as progress:
+            create_tarfiles(..., progress_callback=progress)
+    """
+
+    FLUSH_INTERVAL_S = 5.0
+
+    def __init__(
+        self,
+        description: str,
+        total: int | None = None,
+        unit: str = "files",
+        flush_interval_s: float | None = None,
+    ):
+        self._description = description
+        self._total = total
+        self._unit = unit
+        self._flush_interval_s = self.FLUSH_INTERVAL_S if flush_interval_s is None else flush_interval_s
+        self._lock = threading.Lock()
+        # held while the artifact is updated, such that updates are sent one at a time and in order
+        self._send_lock = threading.Lock()
+        self._start = time.monotonic()
+        self._last_flush = self._start
+        self._progress = 0.0
+        self._reported_percentage = 0
+        self._artifact_id = create_progress_artifact(progress=0.0, description=description)
+
+    def __call__(self, progress: float) -> None:
+        with self._lock:
+            self._progress = max(self._progress, min(1.0, progress))
+            due = time.monotonic() - self._last_flush >= self._flush_interval_s
+        if due:
+            # workers don't wait for an update in flight, the next call sends their progress
+            self._flush(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._flush(wait=True)
+
+    def _summary(self, elapsed_s: float) -> str:
+        parts = [self._description]
+        if self._total is not None and elapsed_s > 0:
+            parts.append(f"{self._progress * self._total / elapsed_s:.1f} {self._unit}/s")
+        if 0 < self._progress < 1:
+            remaining_s = elapsed_s * (1 - self._progress) / self._progress
+            parts.append(f"ETA {timedelta(seconds=round(remaining_s))}")
+        return ", ".join(parts)
+
+    def _flush(self, wait: bool) -> None:
+        """Updates the artifact with the current progress. The API call is made outside of `_lock`, such that
+        reporting progress never blocks on it.
+        """
+        if not self._send_lock.acquire(blocking=wait):
+            return
+        try:
+            with self._lock:
+                percentage = math.floor(100.0 * self._progress)
+                if percentage <= self._reported_percentage:
+                    return
+                now = time.monotonic()
+                self._last_flush = now
+                self._reported_percentage = percentage
+                description = self._summary(now - self._start)
+            update_progress_artifact(
+                artifact_id=self._artifact_id, progress=percentage, description=description
+            )
+        finally:
+            self._send_lock.release()
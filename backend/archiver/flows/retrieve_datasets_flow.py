@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List
 from functools import partial
 from uuid import UUID
 import uuid
@@ -8,6 +8,7 @@ from prefect.client.schemas.objects import TaskRun, FlowRun
 from prefect.client.schemas.sorting import FlowRunSort
 from prefect.client.schemas.filters import FlowRunFilter
 from prefect.flow_runs import wait_for_flow_run
+from prefect.futures import wait as wait_for_futures
 from prefect.context import get_run_context
 from utils.s3_storage_interface import get_s3_client
 from utils.s3_storage_interface import Bucket
@@ -19,13 +20,14 @@ from .task_utils import (
     generate_task_name_dataset,
     generate_task_name_datablock,
 )
-from .flow_utils import report_retrieval_error
+from .flow_utils import SystemError, report_retrieval_error
 from scicat.scicat_interface import SciCatClient
 from scicat.scicat_tasks import (
     update_scicat_retrieval_job_status,
     update_scicat_retrieval_dataset_lifecycle,
     get_scicat_access_token,
     get_job_datasetlist,
+    get_dataset_sizes,
     create_job_result_object_task,
 )
 from scicat.scicat_tasks import (
@@ -35,12 +37,12 @@ from scicat.scicat_tasks import (
 )
 from config.concurrency_limits import ConcurrencyLimits
 import utils.datablocks as datablocks_operations
+from utils.dataset_scheduler import DatasetScheduler
 from utils.model import DataBlock
 
 
 def on_get_datablocks_error(dataset_id: str, task: Task, task_run: TaskRun, state: State):
-    scicat_token = get_scicat_access_token()
-    report_dataset_user_error(dataset_id, token=scicat_token)
+    report_dataset_user_error(dataset_id)
 
 
 @task(
@@ -61,13 +63,10 @@ def upload_data_to_s3(dataset_id: str, datablock: DataBlock):
 def on_dataset_flow_failure(flow: Flow, flow_run: FlowRun, state: State):
     datablocks_operations.cleanup_scratch(flow_run.parameters["dataset_id"])
 
-    scicat_token = get_scicat_access_token()
-
     report_retrieval_error(
         dataset_id=flow_run.parameters["dataset_id"],
         state=state,
         task_run=None,
-        token=scicat_token,
     )
 
 
@@ -91,63 +90,97 @@ def restore_datablock(datablock: DataBlock) -> None:
 def retrieve_single_dataset_flow(dataset_id: str, job_id: UUID):
     scicat_token = get_scicat_access_token.submit()
 
-    dataset_update = update_scicat_retrieval_dataset_lifecycle.submit(
+    update_scicat_retrieval_dataset_lifecycle(
         dataset_id=dataset_id,
         status=SciCatClient.RETRIEVESTATUSMESSAGE.STARTED,
-        token=scicat_token,
     )
 
     datablocks = get_datablocks.with_options(
         on_failure=[partial(on_get_datablocks_error, dataset_id)]
-    ).submit(dataset_id=dataset_id, token=scicat_token, wait_for=[dataset_update])  # type: ignore
+    ).submit(dataset_id=dataset_id, token=scicat_token)  # type: ignore
 
     restore_tasks = []
     for datablock in datablocks.result():
         restore_task = restore_datablock.submit(datablock=datablock)
         restore_tasks.append(restore_task)
 
-    scicat_token = get_scicat_access_token.submit(wait_for=restore_tasks)
+    for restore_task in restore_tasks:
+        restore_task.result()
 
-    update_scicat_retrieval_dataset_lifecycle.submit(
+    update_scicat_retrieval_dataset_lifecycle(
         dataset_id=dataset_id,
         status=SciCatClient.RETRIEVESTATUSMESSAGE.DATASET_RETRIEVED,
-        token=scicat_token,
-        wait_for=restore_tasks,
-    ).result()  # type: ignore
+    )
 
 
 def on_job_flow_failure(flow: Flow, flow_run: FlowRun, state: State):
-    scicat_token = get_scicat_access_token()
     # TODO: differrentiate user error
     report_job_failure_system_error(
         job_id=flow_run.parameters["job_id"],
-        token=scicat_token,
     )
 
 
-def find_oldest_dataset_flow(
-    dataset_id: str, prefix: str = "retrieve_dataset", state: str = "Running"
-) -> List[FlowRun]:
+FLOW_RUN_QUERY_PAGE_SIZE = 200
+
+
+def find_dataset_flows_in_flight(
+    dataset_ids: List[str], prefix: str = "retrieve_dataset", state: str = "Running"
+) -> Dict[str, UUID]:
+    """Finds the flow runs in flight for a list of datasets with one paginated query, instead of a pattern
+    search per dataset.
+
+    Returns:
+        Dict[str, UUID]: index from dataset id to the id of the most recently started flow run of that dataset
+    """
     this_run_id = get_run_context().flow_run.id
+    run_names = {f"{prefix}-dataset_id-{id}": id for id in dataset_ids}
+    index: Dict[str, UUID] = {}
+    if len(run_names) == 0:
+        return index
+
     with get_client(sync_client=True) as client:
-        flow_runs = client.read_flow_runs(
-            flow_run_filter=FlowRunFilter(
-                id={"not_any_": [this_run_id]},
-                name={"like_": f"{prefix}-dataset_id-{dataset_id}"},
-                state=dict(name=dict(any_=[state, "Scheduled"])),
-            ),
-            sort=FlowRunSort.START_TIME_DESC,
-        )
-        return flow_runs[0].id if len(flow_runs) > 0 else None
-    return None
+        offset = 0
+        while True:
+            flow_runs = client.read_flow_runs(
+                flow_run_filter=FlowRunFilter(
+                    id={"not_any_": [this_run_id]},
+                    name={"any_": list(run_names.keys())},
+                    state=dict(name=dict(any_=[state, "Scheduled"])),
+                ),
+                sort=FlowRunSort.START_TIME_DESC,
+                limit=FLOW_RUN_QUERY_PAGE_SIZE,
+                offset=offset,
+            )
+            for flow_run in flow_runs:
+                index.setdefault(run_names[flow_run.name], flow_run.id)
+            if len(flow_runs) < FLOW_RUN_QUERY_PAGE_SIZE:
+                break
+            offset += len(flow_runs)
+    return index
 
 
 @flow(name="wait_for_retrieval_flow", log_prints=True)
 async def wait_for_retrieval_flow(flow_run_id: uuid.UUID):
-    flow_run: FlowRun = await wait_for_flow_run(flow_run_id, log_states=True, timeout=None, poll_interval=60)
+    # subscribes to the state change events of the flow run instead of polling its state
+    flow_run: FlowRun = await wait_for_flow_run(flow_run_id, log_states=True, timeout=None)
     flow_run.state.result()
 
 
+@task(task_run_name=generate_task_name_dataset)
+def retrieve_dataset(dataset_id: str, job_id: UUID, size: int) -> None:
+    """Prefect task running the retrieval of a single dataset as a subflow, such that the datasets of a job
+    are retrieved concurrently. Retrievals are scheduled ahead of archivals of the same size.
+    """
+    with DatasetScheduler.from_variables().slot(dataset_id, DatasetScheduler.RETRIEVAL, size):
+        retrieve_single_dataset_flow(dataset_id=dataset_id, job_id=job_id)
+
+
+@task(task_run_name=generate_task_name_dataset)
+async def join_retrieval(dataset_id: str, flow_run_id: uuid.UUID) -> None:
+    """Prefect task waiting for a retrieval of the dataset already in flight, started by another job"""
+    await wait_for_retrieval_flow(flow_run_id)
+
+
 @flow(
     name="retrieve_datasetlist",
     log_prints=True,
@@ -157,30 +190,37 @@ async def wait_for_retrieval_flow(flow_run_id: uuid.UUID):
 async def retrieve_datasets_flow(job_id: UUID):
     access_token = get_scicat_access_token.submit()
 
-    job_update = update_scicat_retrieval_job_status.submit(
+    update_scicat_retrieval_job_status(
         job_id=job_id,
         status_message=SciCatClient.STATUSMESSAGE.IN_PROGRESS,
         jobResultObject=None,
-        token=access_token,
     )
 
-    dataset_ids_future = get_job_datasetlist.submit(job_id=job_id, token=access_token, wait_for=[job_update])
+    dataset_ids_future = get_job_datasetlist.submit(job_id=job_id, token=access_token)
     dataset_ids = dataset_ids_future.result()
 
-    for id in dataset_ids:
-        existing_run_id = find_oldest_dataset_flow(dataset_id=id)
+    runs_in_flight = find_dataset_flows_in_flight(dataset_ids)
+    unique_ids = list(dict.fromkeys(dataset_ids))
+    sizes = get_dataset_sizes.submit(dataset_ids=unique_ids, token=access_token).result()
+
+    dataset_futures = []
+    # smallest datasets first, such that they are not queued behind the large ones of the same job
+    for id in sorted(unique_ids, key=lambda id: sizes[id]):
+        existing_run_id = runs_in_flight.get(id)
         if existing_run_id is None:
-            retrieve_single_dataset_flow(dataset_id=id, job_id=job_id)
+            dataset_futures.append(retrieve_dataset.submit(dataset_id=id, job_id=job_id, size=sizes[id]))
         else:
-            await wait_for_retrieval_flow(existing_run_id)
+            dataset_futures.append(join_retrieval.submit(dataset_id=id, flow_run_id=existing_run_id))
+    wait_for_futures(dataset_futures)
 
-    job_results_object = create_job_result_object_task.submit(dataset_ids=dataset_ids)
+    failed_futures = [f for f in dataset_futures if not f.state.is_completed()]
+    if len(failed_futures) > 0:
+        raise SystemError(f"Retrieval failed for {len(failed_futures)} of {len(dataset_futures)} datasets")
 
-    access_token = get_scicat_access_token.submit(wait_for=[job_results_object])
+    job_results_object = create_job_result_object_task.submit(dataset_ids=dataset_ids)
 
-    update_scicat_retrieval_job_status.submit(
+    update_scicat_retrieval_job_status(
         job_id=job_id,
         status_message=SciCatClient.STATUSMESSAGE.FINISHED_SUCCESSFULLY,
         jobResultObject=job_results_object.result(),
-        token=access_token,
-    ).wait()
+    )
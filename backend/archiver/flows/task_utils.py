@@ -47,3 +47,12 @@ def generate_subflow_run_name_job_id_dataset_id():
     dataset_id = parameters["dataset_id"]
 
     return f"{flow_name}-dataset_id-{dataset_id}"
+
+
+def generate_flow_name_partition():
+    flow_name = flow_run.get_flow_name()
+    parameters = flow_run.get_parameters()
+    dataset_id = parameters["dataset_id"]
+    partition_index = parameters["partition_index"]
+
+    return f"{flow_name}-dataset_id-{dataset_id}-partition-{partition_index}"
@@ -2,6 +2,7 @@ from moto import mock_aws
 import pytest
 import os
 from pathlib import Path
+from unittest.mock import patch
 
 
 @pytest.fixture(scope="function")
@@ -44,3 +45,12 @@ def config_fixture():
 
     for k, v in envs.items():
         os.environ.pop(k)
+
+
+@pytest.fixture(autouse=True)
+def status_updates_fixture():
+    """Status updates are sent right away, such that the mocked SciCat sees every state a flow reports"""
+    from scicat.status_updater import StatusUpdater
+
+    with patch.object(StatusUpdater, "COALESCE_WINDOW_S", 0):
+        yield
@@ -1,8 +1,10 @@
-from typing import List
-import requests_mock
+import json
+from typing import Any, List
 from uuid import UUID
 import urllib.parse
 
+import httpx
+
 from scicat.scicat_interface import SciCatClient
 from utils.model import OrigDataBlock, DataBlock
 from utils.model import DatasetListEntry, Job
@@ -18,13 +20,53 @@ def mock_scicat_client() -> SciCatClient:
         datasets_api_prefix=ScicatMock.API_PREFIX,
         api_prefix=ScicatMock.API_PREFIX,
         jobs_api_prefix=ScicatMock.JOBS_API_PREFIX,
+        transport=httpx.MockTransport(ScicatMock.handle),
     )
     setattr(scicat_instance, "get_token", mock_scicat_get_token)
     return scicat_instance
 
 
-class ScicatMock(requests_mock.Mocker):
-    ENDPOINT = "mock://scicat.example.com"
+class RecordedRequest:
+    def __init__(self, request: httpx.Request):
+        self.method = request.method
+        self.url = request.url
+        self.headers = request.headers
+        self.content = request.content
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+
+class Matcher:
+    """Responds to the requests of a method and url and records them"""
+
+    def __init__(self, method: str, url: str, json: Any = None, status_code: int = 200):
+        self.method = method
+        self.url = httpx.URL(url)
+        self.response_json = json
+        self.status_code = status_code
+        self.request_history: List[RecordedRequest] = []
+
+    def matches(self, request: httpx.Request) -> bool:
+        return request.method == self.method and request.url == self.url
+
+    def respond(self, request: httpx.Request) -> httpx.Response:
+        self.request_history.append(RecordedRequest(request))
+        return httpx.Response(self.status_code, json=self.response_json)
+
+    @property
+    def call_count(self) -> int:
+        return len(self.request_history)
+
+    @property
+    def called(self) -> bool:
+        return self.call_count > 0
+
+
+class ScicatMock:
+    """Mocked SciCat API for clients created with `mock_scicat_client`, active within a `with` block"""
+
+    ENDPOINT = "http://scicat.example.com"
     API_PREFIX = "/api/v1"
     JOBS_API_PREFIX = "/api/v4"
 
@@ -35,11 +77,11 @@ class ScicatMock(requests_mock.Mocker):
         origDataBlocks: List[OrigDataBlock],
         datablocks: List[DataBlock],
     ):
-        super().__init__()
+        self._matchers: List[Matcher] = []
 
         safe_dataset_url = urllib.parse.quote(dataset_id, safe="", encoding=None, errors=None)
 
-        self.matchers: dict[str, requests_mock.Request.matcher] = {}
+        self.matchers: dict[str, Any] = {}
 
         self.matchers["jobs"] = self.patch(f"{self.ENDPOINT}{self.JOBS_API_PREFIX}/jobs/{job_id}", json=None)
 
@@ -88,6 +130,41 @@ class ScicatMock(requests_mock.Mocker):
                 self.delete(f"{self.ENDPOINT}{self.API_PREFIX}/datasets/{safe_dataset_url}/datablocks/{d.id}")
             )
 
+    _active: "ScicatMock | None" = None
+
+    def __enter__(self) -> "ScicatMock":
+        ScicatMock._active = self
+        return self
+
+    def __exit__(self, *args) -> None:
+        ScicatMock._active = None
+
+    def _add(self, method: str, url: str, json: Any = None) -> Matcher:
+        matcher = Matcher(method, url, json=json)
+        self._matchers.append(matcher)
+        return matcher
+
+    def patch(self, url: str, json: Any = None) -> Matcher:
+        return self._add("PATCH", url, json)
+
+    def get(self, url: str, json: Any = None) -> Matcher:
+        return self._add("GET", url, json)
+
+    def post(self, url: str, json: Any = None) -> Matcher:
+        return self._add("POST", url, json)
+
+    def delete(self, url: str, json: Any = None) -> Matcher:
+        return self._add("DELETE", url, json)
+
+    @staticmethod
+    def handle(request: httpx.Request) -> httpx.Response:
+        if ScicatMock._active is None:
+            raise RuntimeError(f"No SciCat mock is active for {request.method} {request.url}")
+        for matcher in ScicatMock._active._matchers:
+            if matcher.matches(request):
+                return matcher.respond(request)
+        raise RuntimeError(f"No SciCat mock response for {request.method} {request.url}")
+
     @property
     def jobs_matcher(self):
         return self.matchers["jobs"]
@@ -1,4 +1,5 @@
 from pathlib import Path
+from typing import List
 from unittest.mock import patch, MagicMock
 from uuid import UUID, uuid4
 
@@ -10,6 +11,8 @@ from flows.archive_datasets_flow import archive_datasets_flow
 from scicat.scicat_interface import SciCatClient
 from flows.tests.scicat_unittest_mock import ScicatMock, mock_scicat_client
 from flows.flow_utils import DatasetError, SystemError
+from utils.s3_storage_interface import S3Storage
+from utils.stage_markers import StageMarkers
 from flows.tests.helpers import (
     mock_s3client,
     create_datablocks,
@@ -38,7 +41,20 @@ def mock_empty_list(*args, **kwargs):
 
 
 def mock_list(*args, **kwargs):
-    return [1]
+    return [S3Storage.ListedObject(Name="file", Size=1)]
+
+
+class MockStageMarkers(StageMarkers):
+    """Stage markers that never record completion, such that every test runs all stages"""
+
+    def get(self, stage):
+        return None
+
+    def _save(self, marker):
+        pass
+
+    def cache_key(self, stage, fingerprint):
+        return None
 
 
 def mock_archive_datablock(*args, **kwargs):
@@ -57,10 +73,11 @@ def mock_archive_file(file: Path):
 )
 @patch("scicat.scicat_tasks.scicat_client", mock_scicat_client)
 @patch("utils.datablocks.list_datablocks", mock_list)
-@patch("utils.datablocks.download_objects_from_s3", mock_list)
-@patch("utils.datablocks.create_tarfiles", mock_void_function)
+@patch("flows.archive_datasets_flow.StageMarkers", MockStageMarkers)
+@patch("utils.datablocks.reserve_scratch", mock_void_function)
+@patch("utils.datablocks.create_datablocks_pipelined", mock_empty_list)
 @patch("utils.datablocks.create_datablock_entries", mock_create_datablock_entries)
-@patch("utils.datablocks.upload_objects_to_s3", mock_void_function)
+@patch("utils.datablocks.upload_dataset_manifest", mock_void_function)
 @patch("utils.datablocks.verify_objects", mock_empty_list)
 @patch("utils.datablocks.calculate_checksum", mock_empty_list)
 @patch("utils.datablocks.verify_checksum", mock_void_function)
@@ -114,8 +131,9 @@ def test_scicat_api_archiving(
             SciCatClient.ARCHIVESTATUSMESSAGE.STARTED
         )
 
-        for i in range(num_expected_datablocks):
-            assert m.datablocks_post_matcher.request_history[i].json() == expected_datablocks(dataset_id, i)
+        # datablocks are registered concurrently
+        posted = sorted((r.json() for r in m.datablocks_post_matcher.request_history), key=lambda d: d["id"])
+        assert posted == [expected_datablocks(dataset_id, i) for i in range(num_expected_datablocks)]
 
         assert m.datasets_matcher.request_history[1].json() == expected_archival_dataset_lifecycle(
             SciCatClient.ARCHIVESTATUSMESSAGE.DATASET_ON_ARCHIVEDISK,
@@ -139,10 +157,11 @@ def test_scicat_api_archiving(
 )
 @patch("scicat.scicat_tasks.scicat_client", mock_scicat_client)
 @patch("utils.datablocks.list_datablocks", raise_user_error)
-@patch("utils.datablocks.download_objects_from_s3", mock_list)
-@patch("utils.datablocks.create_tarfiles", mock_void_function)
+@patch("flows.archive_datasets_flow.StageMarkers", MockStageMarkers)
+@patch("utils.datablocks.reserve_scratch", mock_void_function)
+@patch("utils.datablocks.create_datablocks_pipelined", mock_empty_list)
 @patch("utils.datablocks.create_datablock_entries", mock_create_datablock_entries)
-@patch("utils.datablocks.upload_objects_to_s3", mock_void_function)
+@patch("utils.datablocks.upload_dataset_manifest", mock_void_function)
 @patch("utils.datablocks.verify_objects", mock_empty_list)
 @patch("utils.datablocks.cleanup_scratch")
 @patch("utils.datablocks.cleanup_s3_landingzone")
@@ -217,11 +236,12 @@ def test_create_datablocks_user_error(
 )
 @patch("scicat.scicat_tasks.scicat_client", mock_scicat_client)
 @patch("utils.datablocks.list_datablocks", mock_list)
-@patch("utils.datablocks.download_objects_from_s3", mock_list)
-@patch("utils.datablocks.create_tarfiles", mock_void_function)
+@patch("flows.archive_datasets_flow.StageMarkers", MockStageMarkers)
+@patch("utils.datablocks.reserve_scratch", mock_void_function)
+@patch("utils.datablocks.create_datablocks_pipelined", raise_system_error)
 @patch("utils.datablocks.create_datablock_entries", mock_create_datablock_entries)
+@patch("utils.datablocks.upload_dataset_manifest", mock_void_function)
 @patch("utils.datablocks.verify_objects", mock_empty_list)
-@patch("utils.datablocks.upload_objects_to_s3", raise_system_error)
 @patch("utils.datablocks.cleanup_scratch")
 @patch("utils.datablocks.cleanup_s3_landingzone")
 def test_archive_datablock_failure(
@@ -235,7 +255,8 @@ def test_archive_datablock_failure(
     num_files_per_block = 10
     num_datablocks = 10
 
-    num_expected_datablocks = num_orig_datablocks
+    # datablocks are uploaded before they are registered
+    num_expected_datablocks = 0
 
     expected_s3_client = mock_s3client()
     origDataBlocks = create_orig_datablocks(
@@ -267,9 +288,6 @@ def test_archive_datablock_failure(
             SciCatClient.ARCHIVESTATUSMESSAGE.STARTED
         )
 
-        for i in range(num_expected_datablocks):
-            assert m.datablocks_post_matcher.request_history[i].json() == expected_datablocks(dataset_id, i)
-
         assert m.jobs_matcher.request_history[1].json() == expected_job_status(
             "archive", SciCatClient.STATUSMESSAGE.FINISHED_UNSUCCESSFULLY
         )
@@ -280,3 +298,112 @@ def test_archive_datablock_failure(
         # 6: cleanup
         mock_cleanup_s3_landingzone.assert_not_called()
         mock_cleanup_scratch.assert_called_once_with(dataset_id)
+
+
+@pytest.mark.parametrize(
+    "num_datasets,free_gb,expected_concurrency",
+    [
+        (10, 100, 3),  # configured maximum
+        (2, 100, 2),  # number of datasets
+        (10, 4, 2),  # scratch space for 2 datablocks of 1GB, raw and packed
+        (10, 0, 1),  # at least one
+    ],
+)
+def test_dataset_archival_concurrency(num_datasets: int, free_gb: int, expected_concurrency: int):
+    from collections import namedtuple
+    from flows.flow_utils import dataset_archival_concurrency
+
+    usage = namedtuple("usage", ["total", "used", "free"])
+    envs = {"ARCHIVER_MAX_CONCURRENT_DATASETS": "3", "ARCHIVER_TARGET_SIZE_GB": "1"}
+    with (
+        patch.dict("os.environ", envs),
+        patch("shutil.disk_usage", lambda _: usage(0, 0, free_gb * 1024 * 1024 * 1024)),
+    ):
+        assert dataset_archival_concurrency(num_datasets) == expected_concurrency
+
+
+@patch("flows.flow_utils.create_progress_artifact", lambda **kwargs: "artifact-id")
+@patch("flows.flow_utils.update_progress_artifact")
+def test_progress_reporter(mock_update_progress_artifact: MagicMock):
+    import threading
+    from flows.flow_utils import ProgressReporter
+
+    num_files = 10000
+
+    with ProgressReporter("Packing", total=num_files, flush_interval_s=0) as progress:
+
+        def report(offset: int):
+            for i in range(offset, num_files, 4):
+                progress((i + 1) / num_files)
+
+        threads = [threading.Thread(target=report, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    # one update per percent at most, not one per file
+    reported = [c.kwargs["progress"] for c in mock_update_progress_artifact.call_args_list]
+    assert len(reported) <= 100
+    assert reported == sorted(reported)
+    assert reported[-1] == 100
+    assert "files/s" in mock_update_progress_artifact.call_args_list[0].kwargs["description"]
+
+
+@patch("flows.flow_utils.create_progress_artifact", lambda **kwargs: "artifact-id")
+@patch("flows.flow_utils.update_progress_artifact")
+def test_progress_reporter_rate_limit(mock_update_progress_artifact: MagicMock):
+    from flows.flow_utils import ProgressReporter
+
+    with ProgressReporter("Packing", flush_interval_s=3600) as progress:
+        for i in range(100):
+            progress((i + 1) / 100)
+        mock_update_progress_artifact.assert_not_called()
+
+    # the final state is flushed on exit
+    mock_update_progress_artifact.assert_called_once()
+    assert mock_update_progress_artifact.call_args.kwargs["progress"] == 100
+
+
+@pytest.mark.parametrize(
+    "min_size_gb,sizes_gb,expected",
+    [
+        (0, [1, 1, 1], False),  # disabled
+        (2, [1, 1, 1], True),
+        (4, [1, 1, 1], False),  # dataset too small
+        (1, [3], False),  # single partition
+    ],
+)
+def test_use_distributed_datablock_creation(min_size_gb: int, sizes_gb: List[int], expected: bool):
+    from flows.archive_datasets_flow import use_distributed_datablock_creation
+
+    GB = 1024 * 1024 * 1024
+    partitions = [[S3Storage.ListedObject(Name=f"file_{i}", Size=s * GB)] for i, s in enumerate(sizes_gb)]
+    with patch.dict("os.environ", {"ARCHIVER_DISTRIBUTED_MIN_SIZE_GB": str(min_size_gb)}):
+        assert use_distributed_datablock_creation(partitions) == expected
+
+
+@patch("flows.archive_datasets_flow.get_s3_client", mock_s3client)
+@patch("utils.datablocks.load_archive_info")
+@patch("flows.archive_datasets_flow.run_deployment")
+def test_create_datablock_on_worker(mock_run_deployment: MagicMock, mock_load_archive_info: MagicMock):
+    from flows.archive_datasets_flow import create_datablock_on_worker, DATABLOCK_CREATION_DEPLOYMENT
+    from utils.datablocks import ArchiveInfo
+    from utils.result_manifests import load_results
+
+    archive_info = ArchiveInfo(unpackedSize=10, packedSize=12, path=Path("prefix-123_2.tar"), fileCount=2)
+    mock_load_archive_info.return_value = archive_info
+    mock_run_deployment.return_value.state.is_completed.return_value = True
+
+    archive_info_ref = create_datablock_on_worker.fn(
+        dataset_id="prefix/123", partition_index=2, object_names=["a", "b"], size=10
+    )
+
+    assert load_results(archive_info_ref, ArchiveInfo) == [archive_info]
+    assert mock_run_deployment.call_args.kwargs["name"] == DATABLOCK_CREATION_DEPLOYMENT
+    assert mock_run_deployment.call_args.kwargs["parameters"]["partition_index"] == 2
+    mock_load_archive_info.assert_called_once_with(mock_s3client(), "prefix/123", "prefix-123_2.tar")
+
+    mock_run_deployment.return_value.state.is_completed.return_value = False
+    with pytest.raises(SystemError):
+        create_datablock_on_worker.fn(dataset_id="prefix/123", partition_index=2, object_names=["a"], size=10)
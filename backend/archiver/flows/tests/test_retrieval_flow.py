@@ -1,4 +1,4 @@
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock, MagicMock
 import pytest
 from uuid import UUID, uuid4
 
@@ -184,3 +184,72 @@ async def test_datablock_not_found(
         mock_upload_datablock.assert_not_called()
         mock_cleanup_s3_landingzone.assert_not_called()
         mock_cleanup_scratch.assert_called_once_with(dataset_id)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "job_id,dataset_id",
+    [
+        (uuid4(), "somePrefix/456"),
+    ],
+)
+@patch("scicat.scicat_tasks.scicat_client", mock_scicat_client)
+@patch("scicat.scicat_tasks.create_presigned_url", mock_create_presigned_url)
+@patch("utils.datablocks.restore_datablock")
+@patch(
+    "flows.retrieve_datasets_flow.find_dataset_flows_in_flight",
+    lambda dataset_ids: {id: uuid4() for id in dataset_ids},
+)
+@patch("flows.retrieve_datasets_flow.wait_for_flow_run", new_callable=AsyncMock)
+async def test_join_retrieval_in_flight(
+    mock_wait_for_flow_run: AsyncMock,
+    mock_restore_datablock: MagicMock,
+    job_id: UUID,
+    dataset_id: str,
+    mocked_s3,
+):
+    datablocks = create_datablocks(num_blocks=2, num_files_per_block=1)
+
+    with (
+        ScicatMock(
+            job_id=job_id,
+            dataset_id=dataset_id,
+            origDataBlocks=create_orig_datablocks(num_blocks=2, num_files_per_block=1),
+            datablocks=datablocks,
+        ) as m,
+        prefect_test_harness(),
+    ):
+        await retrieve_datasets_flow(job_id=job_id)
+
+        # the dataset is not retrieved a second time, the job waits for the run in flight
+        mock_wait_for_flow_run.assert_awaited_once()
+        mock_restore_datablock.assert_not_called()
+        assert m.datasets_matcher.call_count == 0
+
+        assert m.jobs_matcher.call_count == 2
+        assert m.jobs_matcher.request_history[1].json()["jobStatusMessage"] == "finishedSuccessful"
+
+
+@patch("flows.retrieve_datasets_flow.FLOW_RUN_QUERY_PAGE_SIZE", 1)
+def test_find_dataset_flows_in_flight():
+    from prefect import flow, get_client
+    from prefect.states import Completed, Running
+
+    from flows.retrieve_datasets_flow import find_dataset_flows_in_flight
+
+    @flow
+    def find_in_flight(dataset_ids):
+        return find_dataset_flows_in_flight(dataset_ids)
+
+    with prefect_test_harness(), get_client(sync_client=True) as client:
+        running = {
+            id: client.create_flow_run(
+                find_in_flight, name=f"retrieve_dataset-dataset_id-{id}", state=Running()
+            ).id
+            for id in ["prefix/1", "prefix/2"]
+        }
+        client.create_flow_run(find_in_flight, name="retrieve_dataset-dataset_id-prefix/3", state=Completed())
+
+        index = find_in_flight(["prefix/1", "prefix/2", "prefix/3", "prefix/4"])
+
+    assert index == running
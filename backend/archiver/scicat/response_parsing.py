@@ -0,0 +1,98 @@
+from typing import Any, Dict, Iterator, List, Sequence, Type, TypeVar, overload
+
+import pydantic_core
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+from utils.model import DataBlock, DataFile, OrigDataBlock
+
+M = TypeVar("M", bound=BaseModel)
+
+_ADAPTERS: Dict[Type[BaseModel], TypeAdapter] = {
+    OrigDataBlock: TypeAdapter(List[OrigDataBlock]),
+    DataBlock: TypeAdapter(List[DataBlock]),
+}
+
+
+class CompactDataFileList(Sequence[DataFile]):
+    """Data file list stored as one column per field instead of one model per file. A `DataFile` is only
+    created when an entry is accessed, such that consumers that never iterate the files (e.g. summing the
+    sizes of datablocks) don't pay for millions of models.
+    """
+
+    def __init__(self, columns: Dict[str, List[Any]], length: int):
+        self._columns = columns
+        self._length = length
+
+    @staticmethod
+    def from_dicts(files: List[Dict[str, Any]]) -> "CompactDataFileList":
+        columns: Dict[str, List[Any]] = {}
+        for idx, f in enumerate(files):
+            for key, value in f.items():
+                column = columns.get(key)
+                if column is None:
+                    column = columns[key] = [None] * len(files)
+                column[idx] = value
+        return CompactDataFileList(columns, len(files))
+
+    def column(self, field: str) -> List[Any]:
+        """Raw values of a field of all files, None where a file lacks the field"""
+        return self._columns.get(field, [None] * self._length)
+
+    def __len__(self) -> int:
+        return self._length
+
+    @overload
+    def __getitem__(self, idx: int) -> DataFile: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[DataFile]: ...
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(self._length))]
+        if idx < 0:
+            idx += self._length
+        if not 0 <= idx < self._length:
+            raise IndexError(idx)
+        return DataFile.model_validate({k: c[idx] for k, c in self._columns.items() if c[idx] is not None})
+
+    def __iter__(self) -> Iterator[DataFile]:
+        return (self[i] for i in range(self._length))
+
+
+def parse_datablocks(content: bytes, model: Type[M]) -> List[M]:
+    """Validates a SciCat response listing (orig)datablocks in a single pass over the raw bytes
+
+    Entries encoded as JSON strings rather than objects are still accepted, through a slower path validating
+    them one by one.
+    """
+    try:
+        return _ADAPTERS[model].validate_json(content)
+    except ValidationError:
+        return [
+            model.model_validate_json(r) if isinstance(r, str) else model.model_validate(r)
+            for r in pydantic_core.from_json(content)
+        ]
+
+
+def parse_datablocks_lazy(content: bytes, model: Type[M]) -> List[M]:
+    """Like `parse_datablocks`, but the data file lists are kept as `CompactDataFileList`s. Meant for
+    consumers within a process: the datablocks must not be serialized, e.g. as results of Prefect tasks.
+
+    This only skips creating a model per file. The response is still decoded into plain dicts first, there
+    is no streaming JSON parser at hand, so parsing peaks at the memory of those dicts. The dicts of a
+    datablock are dropped once its columns are built, such that the columns are all that is kept afterwards.
+    """
+    datablocks: List[M] = []
+    raw: List[Any] = pydantic_core.from_json(content)
+    # consumed from the end, releasing the entries already converted
+    raw.reverse()
+    while len(raw) > 0:
+        r = raw.pop()
+        entry: Dict[str, Any] = pydantic_core.from_json(r) if isinstance(r, str) else r
+        files = entry.pop("dataFileList", None)
+        datablock = model.model_validate(entry)
+        if files is not None:
+            datablock.dataFileList = CompactDataFileList.from_dicts(files)  # type: ignore
+        datablocks.append(datablock)
+    return datablocks
@@ -1,8 +1,12 @@
+import asyncio
+import threading
+import zlib
+from dataclasses import dataclass
 from enum import StrEnum
-import requests
-from requests.adapters import HTTPAdapter, Retry
-from typing import List
+from typing import Any, AsyncIterator, Awaitable, Callable, Coroutine, Generator, List, TypeVar
 from uuid import UUID
+
+import httpx
 from pydantic import SecretStr
 
 import urllib.parse
@@ -15,11 +19,36 @@ from utils.model import (
     DatasetLifecycle,
     OrigDataBlock,
 )
-from utils.log import log
+from utils.log import getLogger, log
 from config.blocks import Blocks
+from scicat.response_parsing import parse_datablocks, parse_datablocks_lazy
+
+T = TypeVar("T")
+
+
+@dataclass
+class DatablockResult:
+    """Outcome of the request for a single datablock of a bulk operation"""
+
+    datablock: DataBlock
+    error: Exception | None = None
+
 
+class DatablockRequestError(Exception):
+    """Raised if the requests for some datablocks of a bulk operation failed after all attempts"""
+
+    def __init__(self, message: str, results: List[DatablockResult]):
+        super().__init__(message)
+        self.results = results
+
+    @property
+    def failed(self) -> List[DataBlock]:
+        return [r.datablock for r in self.results if r.error is not None]
+
+
+class SciCatClientBase:
+    """Status values and request helpers shared by the async and the sync SciCat client"""
 
-class SciCatClient:
     class STATUSMESSAGE(StrEnum):
         """These are the /api/v3 values for the job status."""
 
@@ -78,10 +107,6 @@ class SciCatClient:
         self._DATASETS_API_PREFIX = datasets_api_prefix
         self._JOBS_API_PREFIX = jobs_api_prefix
 
-        self._session = requests.Session()
-        retries = Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
-        self._session.mount("https://", HTTPAdapter(max_retries=retries))
-
     def _headers(self, token: SecretStr):
         return {
             "Authorization": f"Bearer {token.get_secret_value()}",
@@ -91,17 +116,6 @@ class SciCatClient:
     def _safe_dataset_id(self, dataset_id: str):
         return urllib.parse.quote(dataset_id, safe="", encoding=None, errors=None)
 
-    def get_token(self) -> str:
-        user = Blocks().SCICAT_USER
-        password = Blocks().SCICAT_PASSWORD
-
-        resp = self._session.post(
-            url=f"{self._ENDPOINT}{self._API_PREFIX}/auth/login",
-            data={"username": user, "password": password.get_secret_value()},
-        )
-        resp.raise_for_status()
-        return resp.json()["access_token"]
-
     @property
     def API(self):
         return self._API_PREFIX
@@ -114,33 +128,137 @@ class SciCatClient:
     def DATASETS_API_PREFIX(self):
         return self._DATASETS_API_PREFIX
 
-    @log
-    def update_job_status_v3(
+
+class AsyncSciCatClient(SciCatClientBase):
+    """Async SciCat client. Requests share a pool of keep-alive connections, optionally over HTTP/2, and
+    are retried uniformly: connection failures always, 502/503/504 responses and other transport errors only
+    for idempotent methods, with exponential backoff.
+
+    The underlying httpx client is bound to the event loop of its first request.
+    """
+
+    RETRY_STATUSES = frozenset([502, 503, 504])
+    IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "PUT", "DELETE", "OPTIONS"])
+    MAX_RETRIES = 5
+    BACKOFF_FACTOR_S = 1.0
+    TIMEOUT_S = 30.0
+    # rounds in which the datablocks whose requests failed are sent again
+    DATABLOCK_REQUEST_ATTEMPTS = 3
+    # data files serialized at a time when streaming the request body of a datablock
+    DATAFILES_PER_CHUNK = 1000
+
+    def __init__(
+        self,
+        endpoint: str = "http://scicat.example.com",
+        datasets_api_prefix: str = "",
+        api_prefix: str = "",
+        jobs_api_prefix: str = "",
+        max_concurrent_requests: int = 16,
+        datablocks_bulk_api: bool = False,
+        http2: bool = False,
+        gzip_requests: bool = False,
+        timeout_s: float | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        """
+        Args:
+            max_concurrent_requests (int): bound of the requests in flight for bulk operations, also the
+                size of the connection pool
+            datablocks_bulk_api (bool): register datablocks with a single request of the list of datablocks,
+                for SciCat versions accepting an array at the datablocks endpoint of a dataset
+            http2 (bool): use HTTP/2 if the server supports it
+            gzip_requests (bool): gzip the bodies of datablock registrations. Turned off if SciCat rejects
+                the encoding.
+            timeout_s (float | None): timeout of connecting, reading and writing, defaults to TIMEOUT_S
+            transport (httpx.AsyncBaseTransport | None): transport replacing the network, e.g. for tests
+        """
+        super().__init__(endpoint, datasets_api_prefix, api_prefix, jobs_api_prefix)
+        self._max_concurrent_requests = max(1, max_concurrent_requests)
+        self._datablocks_bulk_api = datablocks_bulk_api
+        self._http2 = http2
+        self._gzip_requests = gzip_requests
+        self._timeout_s = timeout_s or self.TIMEOUT_S
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self._http2,
+                timeout=self._timeout_s,
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrent_requests,
+                    max_keepalive_connections=self._max_concurrent_requests,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _request(
+        self, method: str, url: str, stream: Callable[[], AsyncIterator[bytes]] | None = None, **kwargs: Any
+    ) -> httpx.Response:
+        """Sends a request, retrying it as configured
+
+        Args:
+            stream (Callable[[], AsyncIterator[bytes]] | None): creates the chunks of a streamed request body,
+                called once per attempt
+        """
+        idempotent = method in self.IDEMPOTENT_METHODS
+        for attempt in range(self.MAX_RETRIES + 1):
+            try:
+                if stream is not None:
+                    kwargs["content"] = stream()
+                response = await self._http().request(method, url, **kwargs)
+                if response.status_code not in self.RETRY_STATUSES or not idempotent:
+                    return response
+                if attempt == self.MAX_RETRIES:
+                    return response
+            except httpx.TransportError as e:
+                # the request did not reach the server if connecting failed, so any method can be retried
+                if attempt == self.MAX_RETRIES or not (idempotent or isinstance(e, httpx.ConnectError)):
+                    raise
+            await asyncio.sleep(self.BACKOFF_FACTOR_S * 2**attempt)
+        raise AssertionError("unreachable")
+
+    async def get_token(self) -> str:
+        user = Blocks().SCICAT_USER
+        password = Blocks().SCICAT_PASSWORD
+
+        resp = await self._request(
+            "POST",
+            f"{self._ENDPOINT}{self._API_PREFIX}/auth/login",
+            data={"username": user, "password": password.get_secret_value()},
+        )
+        resp.raise_for_status()
+        return resp.json()["access_token"]
+
+    async def update_job_status_v3(
         self,
         job_id: UUID,
-        job_status_message: STATUSMESSAGE,
+        job_status_message: SciCatClientBase.STATUSMESSAGE,
         job_result_object: JobResultObject | None,
         token: SecretStr,
     ) -> None:
         job = Job(jobStatusMessage=str(job_status_message), jobResultObject=job_result_object)
 
-        headers = self._headers(token)
-
-        result = self._session.patch(
+        result = await self._request(
+            "PATCH",
             f"{self._ENDPOINT}{self.JOBS_API_PREFIX}/jobs/{job_id}",
-            data=job.model_dump_json(exclude_none=True),
-            headers=headers,
+            content=job.model_dump_json(exclude_none=True),
+            headers=self._headers(token),
         )
-
-        # returns none if status_code is 200
         result.raise_for_status()
 
-    @log
-    def update_job_status_v4(
+    async def update_job_status_v4(
         self,
         job_id: UUID,
-        status_code: JOBSTATUSCODE,
-        status_message: JOBSTATUSMESSAGE,
+        status_code: SciCatClientBase.JOBSTATUSCODE,
+        status_message: SciCatClientBase.JOBSTATUSMESSAGE,
         job_result_object: JobResultObject | None,
         token: SecretStr,
     ) -> None:
@@ -148,22 +266,28 @@ class SciCatClient:
             statusCode=str(status_code), statusMessage=str(status_message), jobResultObject=job_result_object
         )
 
-        headers = self._headers(token)
-
-        result = self._session.patch(
+        result = await self._request(
+            "PATCH",
             f"{self._ENDPOINT}{self.JOBS_API_PREFIX}/jobs/{job_id}",
-            data=job.model_dump_json(exclude_none=True),
-            headers=headers,
+            content=job.model_dump_json(exclude_none=True),
+            headers=self._headers(token),
         )
+        result.raise_for_status()
 
-        # returns none if status_code is 200
+    async def _update_dataset_lifecycle(self, dataset_id: str, dataset: Dataset, token: SecretStr) -> None:
+        safe_dataset_id = self._safe_dataset_id(dataset_id)
+        result = await self._request(
+            "PATCH",
+            f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}",
+            content=dataset.model_dump_json(exclude_none=True),
+            headers=self._headers(token),
+        )
         result.raise_for_status()
 
-    @log
-    def update_archival_dataset_lifecycle(
+    async def update_archival_dataset_lifecycle(
         self,
         dataset_id: str,
-        status: ARCHIVESTATUSMESSAGE,
+        status: SciCatClientBase.ARCHIVESTATUSMESSAGE,
         token: SecretStr,
         archivable: bool | None = None,
         retrievable: bool | None = None,
@@ -175,22 +299,12 @@ class SciCatClient:
                 retrievable=retrievable,
             )
         )
+        await self._update_dataset_lifecycle(dataset_id, dataset, token)
 
-        headers = self._headers(token)
-        safe_dataset_id = self._safe_dataset_id(dataset_id)
-        result = self._session.patch(
-            f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}",
-            data=dataset.model_dump_json(exclude_none=True),
-            headers=headers,
-        )
-        # returns none if status_code is 200
-        result.raise_for_status()
-
-    @log
-    def update_retrieval_dataset_lifecycle(
+    async def update_retrieval_dataset_lifecycle(
         self,
         dataset_id: str,
-        status: RETRIEVESTATUSMESSAGE,
+        status: SciCatClientBase.RETRIEVESTATUSMESSAGE,
         token: SecretStr,
         archivable: bool | None = None,
         retrievable: bool | None = None,
@@ -202,65 +316,201 @@ class SciCatClient:
                 retrievable=retrievable,
             )
         )
-        headers = self._headers(token)
-        safe_dataset_id = self._safe_dataset_id(dataset_id)
-        result = self._session.patch(
-            f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}",
-            data=dataset.model_dump_json(exclude_none=True),
-            headers=headers,
+        await self._update_dataset_lifecycle(dataset_id, dataset, token)
+
+    async def _for_each_datablock(
+        self,
+        operation: str,
+        data_blocks: List[DataBlock],
+        request: Callable[[DataBlock], Awaitable[None]],
+        applied: Callable[[List[DataBlock]], Awaitable[List[bool]]] | None = None,
+        check_first: bool = False,
+    ) -> List[DatablockResult]:
+        """Sends a request per datablock with bounded concurrency. Datablocks whose request failed are sent
+        again individually, up to `DATABLOCK_REQUEST_ATTEMPTS` times.
+
+        Args:
+            applied (Callable[[List[DataBlock]], Awaitable[List[bool]]] | None): for requests that are not
+                idempotent, tells which datablocks the server applied although their request failed, e.g.
+                timed out after the server processed it. Called before every retry round; those datablocks
+                are not sent again. If it fails, the round is skipped rather than sending blindly.
+            check_first (bool): call `applied` before the first round too, e.g. after a failed bulk request
+
+        Raises:
+            DatablockRequestError: if the request of any datablock failed in all attempts
+
+        Returns:
+            List[DatablockResult]: result per datablock, in the order of `data_blocks`
+        """
+        semaphore = asyncio.Semaphore(self._max_concurrent_requests)
+
+        async def send(d: DataBlock) -> DatablockResult:
+            async with semaphore:
+                try:
+                    await request(d)
+                    return DatablockResult(datablock=d)
+                except Exception as e:
+                    return DatablockResult(datablock=d, error=e)
+
+        results = [DatablockResult(datablock=d, error=Exception("not sent")) for d in data_blocks]
+        pending = list(range(len(data_blocks)))
+        for attempt in range(self.DATABLOCK_REQUEST_ATTEMPTS):
+            if applied is not None and (attempt > 0 or check_first):
+                try:
+                    done = await applied([data_blocks[i] for i in pending])
+                except Exception as e:
+                    getLogger().warning(f"Could not check the datablocks to {operation} again: {e}")
+                    continue
+                for idx in (i for i, d in zip(pending, done) if d):
+                    results[idx] = DatablockResult(datablock=data_blocks[idx])
+                pending = [i for i, d in zip(pending, done) if not d]
+                if len(pending) == 0:
+                    return results
+            sent = await asyncio.gather(*[send(data_blocks[i]) for i in pending])
+            for idx, result in zip(pending, sent):
+                results[idx] = result
+            pending = [i for i in pending if results[i].error is not None]
+            if len(pending) == 0:
+                return results
+            getLogger().warning(f"Failed to {operation} {len(pending)} of {len(data_blocks)} datablocks")
+
+        raise DatablockRequestError(
+            f"Failed to {operation} {len(pending)} of {len(data_blocks)} datablocks, "
+            f"first error: {results[pending[0]].error}",
+            results,
         )
-        # returns none if status_code is 200
-        result.raise_for_status()
 
-    @log
-    def register_datablocks(self, dataset_id: str, data_blocks: List[DataBlock], token: SecretStr) -> None:
+    @staticmethod
+    def datablock_json_chunks(
+        datablock: DataBlock, files_per_chunk: int = DATAFILES_PER_CHUNK
+    ) -> Generator[bytes, None, None]:
+        """Serializes a datablock like `model_dump_json(exclude_none=True)`, but the data file list a chunk
+        of files at a time, such that the JSON of a datablock with many files is never held in memory at once.
+        """
+        head = datablock.model_dump_json(exclude={"dataFileList"}, exclude_none=True).encode()
+        if datablock.dataFileList is None:
+            yield head
+            return
+        yield head[:-1] + (b',"dataFileList":[' if head != b"{}" else b'"dataFileList":[')
+        files = datablock.dataFileList
+        for start in range(0, len(files), files_per_chunk):
+            chunk = b",".join(
+                f.model_dump_json(exclude_none=True).encode() for f in files[start : start + files_per_chunk]
+            )
+            yield chunk if start == 0 else b"," + chunk
+        yield b"]}"
+
+    @staticmethod
+    async def _gzipped(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+        async for chunk in chunks:
+            if compressed := compressor.compress(chunk):
+                yield compressed
+        yield compressor.flush()
+
+    async def _post_datablocks(
+        self, url: str, data_blocks: List[DataBlock], as_list: bool, headers: dict[str, str]
+    ) -> httpx.Response:
+        """Posts one datablock, or a list of them, with a streamed body"""
+
+        async def chunks() -> AsyncIterator[bytes]:
+            if as_list:
+                yield b"["
+            for i, d in enumerate(data_blocks):
+                if i > 0:
+                    yield b","
+                for chunk in self.datablock_json_chunks(d):
+                    yield chunk
+            if as_list:
+                yield b"]"
+
+        gzip = self._gzip_requests
+        result = await self._request(
+            "POST",
+            url,
+            stream=(lambda: self._gzipped(chunks())) if gzip else chunks,
+            headers={**headers, "Content-Encoding": "gzip"} if gzip else headers,
+        )
+        if gzip and result.status_code == 415:
+            getLogger().warning("SciCat does not accept gzip encoded requests, sending them uncompressed")
+            self._gzip_requests = False
+            return await self._post_datablocks(url, data_blocks, as_list, headers)
+        return result
+
+    async def register_datablocks(
+        self, dataset_id: str, data_blocks: List[DataBlock], token: SecretStr
+    ) -> List[DatablockResult]:
         headers = self._headers(token)
         safe_dataset_id = self._safe_dataset_id(dataset_id)
-        for d in data_blocks:
-            result = self._session.post(
-                f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}/datablocks",
-                data=d.model_dump_json(exclude_none=True),
-                headers=headers,
+        url = f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}/datablocks"
+
+        bulk_failed = False
+        if self._datablocks_bulk_api and len(data_blocks) > 0:
+            try:
+                result = await self._post_datablocks(url, data_blocks, True, headers)
+                if result.is_success:
+                    return [DatablockResult(datablock=d) for d in data_blocks]
+                error = f"status {result.status_code}"
+            except httpx.TransportError as e:
+                # e.g. timed out on a large body, SciCat might have registered any of the datablocks
+                error = repr(e)
+            getLogger().warning(
+                f"Bulk registration of datablocks failed with {error}, registering them one by one"
             )
-            # returns none if status_code is 200
+            bulk_failed = True
+
+        async def register(d: DataBlock) -> None:
+            result = await self._post_datablocks(url, [d], False, headers)
             result.raise_for_status()
 
-    @log
-    def delete_datablocks(self, dataset_id: str, data_blocks: List[DataBlock], token: SecretStr) -> None:
+        async def registered(blocks: List[DataBlock]) -> List[bool]:
+            # a POST is not idempotent: a failed one may have created the datablock nonetheless
+            archive_ids = {d.archiveId for d in await self.get_datablocks(dataset_id, token, lazy=True)}
+            return [d.archiveId in archive_ids for d in blocks]
+
+        return await self._for_each_datablock(
+            "register", data_blocks, register, applied=registered, check_first=bulk_failed
+        )
+
+    async def delete_datablocks(
+        self, dataset_id: str, data_blocks: List[DataBlock], token: SecretStr
+    ) -> List[DatablockResult]:
         headers = self._headers(token)
         safe_dataset_id = self._safe_dataset_id(dataset_id)
-        for d in data_blocks:
-            result = self._session.delete(
+
+        async def delete(d: DataBlock) -> None:
+            result = await self._request(
+                "DELETE",
                 f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}/datablocks/{d.id}",
                 headers=headers,
             )
-            # returns none if status_code is 200
+            # a datablock deleted by an earlier attempt is gone already
+            if result.status_code == 404:
+                return
             result.raise_for_status()
 
-    @log
-    def get_origdatablocks(self, dataset_id: str, token: SecretStr) -> List[OrigDataBlock]:
-        headers = self._headers(token)
+        return await self._for_each_datablock("delete", data_blocks, delete)
+
+    async def get_origdatablocks(
+        self, dataset_id: str, token: SecretStr, lazy: bool = False
+    ) -> List[OrigDataBlock]:
+        """
+        Args:
+            lazy (bool): keep the file lists compact until they are iterated, see `parse_datablocks_lazy`
+        """
         safe_dataset_id = self._safe_dataset_id(dataset_id)
-        result = self._session.get(
+        result = await self._request(
+            "GET",
             f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}/origdatablocks",
-            headers=headers,
+            headers=self._headers(token),
         )
-        # returns none if status_code is 200
         result.raise_for_status()
+        return (parse_datablocks_lazy if lazy else parse_datablocks)(result.content, OrigDataBlock)
 
-        origdatablocks: List[OrigDataBlock] = []
-        for r in result.json():
-            try:
-                origdatablocks.append(OrigDataBlock.model_validate(r))
-            except Exception:
-                origdatablocks.append(OrigDataBlock.model_validate_json(r))
-        return origdatablocks
-
-    @log
-    def get_job_datasetlist(self, job_id: UUID, token: SecretStr) -> List[str]:
-        headers = self._headers(token)
-        result = self._session.get(f"{self._ENDPOINT}{self.JOBS_API_PREFIX}/jobs/{job_id}", headers=headers)
-        # returns none if status_code is 200
+    async def get_job_datasetlist(self, job_id: UUID, token: SecretStr) -> List[str]:
+        result = await self._request(
+            "GET", f"{self._ENDPOINT}{self.JOBS_API_PREFIX}/jobs/{job_id}", headers=self._headers(token)
+        )
         result.raise_for_status()
         # v3
         datasets = result.json().get("datasetList", [])
@@ -270,21 +520,167 @@ class SciCatClient:
         final_list = [d["pid"] for d in datasets]
         return final_list
 
-    @log
-    def get_datablocks(self, dataset_id: str, token: SecretStr) -> List[DataBlock]:
-        headers = self._headers(token)
+    async def get_datablocks(self, dataset_id: str, token: SecretStr, lazy: bool = False) -> List[DataBlock]:
+        """
+        Args:
+            lazy (bool): keep the file lists compact until they are iterated, see `parse_datablocks_lazy`
+        """
         safe_dataset_id = self._safe_dataset_id(dataset_id)
-        result = self._session.get(
+        result = await self._request(
+            "GET",
             f"{self._ENDPOINT}{self.DATASETS_API_PREFIX}/datasets/{safe_dataset_id}/datablocks",
-            headers=headers,
+            headers=self._headers(token),
         )
-        # returns none if status_code is 200
         result.raise_for_status()
+        return (parse_datablocks_lazy if lazy else parse_datablocks)(result.content, DataBlock)
 
-        datablocks: List[DataBlock] = []
-        for r in result.json():
-            try:
-                datablocks.append(DataBlock.model_validate(r))
-            except Exception:
-                datablocks.append(DataBlock.model_validate_json(r))
-        return datablocks
+
+class _EventLoopThread:
+    """Event loop running in a daemon thread, on which the sync client runs its requests. A single loop
+    keeps the pooled connections of the async clients alive between calls from any thread.
+    """
+
+    _instance: "_EventLoopThread | None" = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        threading.Thread(target=self._loop.run_forever, name="scicat-client", daemon=True).start()
+
+    @staticmethod
+    def shared() -> "_EventLoopThread":
+        with _EventLoopThread._instance_lock:
+            if _EventLoopThread._instance is None:
+                _EventLoopThread._instance = _EventLoopThread()
+            return _EventLoopThread._instance
+
+    def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+
+class SciCatClient(SciCatClientBase):
+    """Blocking SciCat client for Prefect tasks. Wraps an `AsyncSciCatClient`, whose requests run on a
+    shared event loop in a background thread.
+    """
+
+    DATABLOCK_REQUEST_ATTEMPTS = AsyncSciCatClient.DATABLOCK_REQUEST_ATTEMPTS
+
+    def __init__(
+        self,
+        endpoint: str = "http://scicat.example.com",
+        datasets_api_prefix: str = "",
+        api_prefix: str = "",
+        jobs_api_prefix: str = "",
+        max_concurrent_requests: int = 16,
+        datablocks_bulk_api: bool = False,
+        http2: bool = False,
+        gzip_requests: bool = False,
+        timeout_s: float | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        super().__init__(endpoint, datasets_api_prefix, api_prefix, jobs_api_prefix)
+        self._async_client = AsyncSciCatClient(
+            endpoint=endpoint,
+            datasets_api_prefix=datasets_api_prefix,
+            api_prefix=api_prefix,
+            jobs_api_prefix=jobs_api_prefix,
+            max_concurrent_requests=max_concurrent_requests,
+            datablocks_bulk_api=datablocks_bulk_api,
+            http2=http2,
+            gzip_requests=gzip_requests,
+            timeout_s=timeout_s,
+            transport=transport,
+        )
+
+    @property
+    def async_client(self) -> AsyncSciCatClient:
+        return self._async_client
+
+    def _run(self, coro: Coroutine[Any, Any, T]) -> T:
+        return _EventLoopThread.shared().run(coro)
+
+    def get_token(self) -> str:
+        return self._run(self._async_client.get_token())
+
+    @log
+    def update_job_status_v3(
+        self,
+        job_id: UUID,
+        job_status_message: SciCatClientBase.STATUSMESSAGE,
+        job_result_object: JobResultObject | None,
+        token: SecretStr,
+    ) -> None:
+        self._run(
+            self._async_client.update_job_status_v3(job_id, job_status_message, job_result_object, token)
+        )
+
+    @log
+    def update_job_status_v4(
+        self,
+        job_id: UUID,
+        status_code: SciCatClientBase.JOBSTATUSCODE,
+        status_message: SciCatClientBase.JOBSTATUSMESSAGE,
+        job_result_object: JobResultObject | None,
+        token: SecretStr,
+    ) -> None:
+        self._run(
+            self._async_client.update_job_status_v4(
+                job_id, status_code, status_message, job_result_object, token
+            )
+        )
+
+    @log
+    def update_archival_dataset_lifecycle(
+        self,
+        dataset_id: str,
+        status: SciCatClientBase.ARCHIVESTATUSMESSAGE,
+        token: SecretStr,
+        archivable: bool | None = None,
+        retrievable: bool | None = None,
+    ) -> None:
+        self._run(
+            self._async_client.update_archival_dataset_lifecycle(
+                dataset_id, status, token, archivable=archivable, retrievable=retrievable
+            )
+        )
+
+    @log
+    def update_retrieval_dataset_lifecycle(
+        self,
+        dataset_id: str,
+        status: SciCatClientBase.RETRIEVESTATUSMESSAGE,
+        token: SecretStr,
+        archivable: bool | None = None,
+        retrievable: bool | None = None,
+    ) -> None:
+        self._run(
+            self._async_client.update_retrieval_dataset_lifecycle(
+                dataset_id, status, token, archivable=archivable, retrievable=retrievable
+            )
+        )
+
+    @log
+    def register_datablocks(
+        self, dataset_id: str, data_blocks: List[DataBlock], token: SecretStr
+    ) -> List[DatablockResult]:
+        return self._run(self._async_client.register_datablocks(dataset_id, data_blocks, token))
+
+    @log
+    def delete_datablocks(
+        self, dataset_id: str, data_blocks: List[DataBlock], token: SecretStr
+    ) -> List[DatablockResult]:
+        return self._run(self._async_client.delete_datablocks(dataset_id, data_blocks, token))
+
+    @log
+    def get_origdatablocks(
+        self, dataset_id: str, token: SecretStr, lazy: bool = False
+    ) -> List[OrigDataBlock]:
+        return self._run(self._async_client.get_origdatablocks(dataset_id, token, lazy=lazy))
+
+    @log
+    def get_job_datasetlist(self, job_id: UUID, token: SecretStr) -> List[str]:
+        return self._run(self._async_client.get_job_datasetlist(job_id, token))
+
+    @log
+    def get_datablocks(self, dataset_id: str, token: SecretStr, lazy: bool = False) -> List[DataBlock]:
+        return self._run(self._async_client.get_datablocks(dataset_id, token, lazy=lazy))
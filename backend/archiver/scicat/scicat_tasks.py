@@ -1,12 +1,14 @@
 import base64
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 from prefect import task
 from uuid import UUID
 from pydantic import SecretStr
-from datetime import timedelta
 from pathlib import Path
 
 from scicat.scicat_interface import SciCatClient
+from scicat.status_updater import StatusUpdater
+from scicat.token_provider import TokenProvider
 from config.variables import Variables
 from utils.model import (
     DataBlock,
@@ -15,11 +17,11 @@ from utils.model import (
     JobResultObject,
 )
 from utils.log import log
-from flows.task_utils import generate_task_name_dataset, generate_task_name_job
+from flows.task_utils import generate_task_name_dataset
 from utils.s3_storage_interface import Bucket, S3Storage, get_s3_client
 
 
-from prefect.artifacts import create_link_artifact, create_markdown_artifact
+from prefect.artifacts import create_markdown_artifact, create_table_artifact
 from utils.script_generation import generate_download_script
 
 scicat_instance: SciCatClient | None = None
@@ -33,73 +35,129 @@ def scicat_client() -> SciCatClient:
             api_prefix=Variables().SCICAT_API_PREFIX,
             datasets_api_prefix=Variables().SCICAT_DATASETS_API_PREFIX,
             jobs_api_prefix=Variables().SCICAT_JOBS_API_PREFIX,
+            max_concurrent_requests=Variables().SCICAT_MAX_CONCURRENT_REQUESTS,
+            datablocks_bulk_api=Variables().SCICAT_DATABLOCKS_BULK_API,
+            http2=Variables().SCICAT_HTTP2,
+            gzip_requests=Variables().SCICAT_GZIP_REQUESTS,
         )
     return scicat_instance
 
 
-@task(cache_result_in_memory=True, cache_expiration=timedelta(seconds=3600))
+token_provider_instance: TokenProvider | None = None
+
+
+def scicat_token_provider() -> TokenProvider:
+    global token_provider_instance
+    if token_provider_instance is None:  # type: ignore
+        token_provider_instance = TokenProvider(
+            login=lambda: scicat_client().get_token(),
+            cache_file=Variables().ARCHIVER_SCRATCH_FOLDER / ".scicat-token",
+        )
+    return token_provider_instance
+
+
+status_updater_instance: StatusUpdater | None = None
+
+
+def scicat_status_updater() -> StatusUpdater:
+    global status_updater_instance
+    if status_updater_instance is None:  # type: ignore
+        status_updater_instance = StatusUpdater(scicat_token_provider())
+    return status_updater_instance
+
+
+@task
 def get_scicat_access_token() -> SecretStr:
-    token = scicat_client().get_token()
-    return SecretStr(token)
+    """Prefect task returning a SciCat access token. Logs in only if no valid token is cached on the node."""
+    return scicat_token_provider().token()
+
+
+# states after which no further update of a dataset lifecycle or job follows, these are flushed
+TERMINAL_STATUSES = frozenset(
+    [
+        SciCatClient.STATUSMESSAGE.FINISHED_SUCCESSFULLY,
+        SciCatClient.STATUSMESSAGE.FINISHED_UNSUCCESSFULLY,
+        SciCatClient.STATUSMESSAGE.FINISHED_WITHDATASET_ERRORS,
+        SciCatClient.ARCHIVESTATUSMESSAGE.DATASET_ON_ARCHIVEDISK,
+        SciCatClient.ARCHIVESTATUSMESSAGE.SCHEDULE_ARCHIVE_JOB_FAILED,
+        SciCatClient.ARCHIVESTATUSMESSAGE.MISSING_FILES,
+        SciCatClient.RETRIEVESTATUSMESSAGE.DATASET_RETRIEVED,
+        SciCatClient.RETRIEVESTATUSMESSAGE.DATASET_RETRIEVAL_FAILED,
+    ]
+)
 
 
-@task(task_run_name=generate_task_name_job)
-def update_scicat_archival_job_status(
-    job_id: UUID,
-    status_message: SciCatClient.STATUSMESSAGE,
-    token: SecretStr,
-) -> None:
-    scicat_client().update_job_status_v3(
-        job_id=job_id,
-        job_status_message=status_message,
-        job_result_object=None,
-        token=token,
+def update_scicat_archival_job_status(job_id: UUID, status_message: SciCatClient.STATUSMESSAGE) -> None:
+    """Queues a job status update, see `StatusUpdater`. Terminal states are delivered before returning."""
+    scicat_status_updater().submit(
+        ("job", str(job_id)),
+        lambda token: scicat_client().update_job_status_v3(
+            job_id=job_id,
+            job_status_message=status_message,
+            job_result_object=None,
+            token=token,
+        ),
+        flush=status_message in TERMINAL_STATUSES,
     )
 
 
-@task(task_run_name=generate_task_name_job)
 def update_scicat_retrieval_job_status(
     job_id: UUID,
     status_message: SciCatClient.STATUSMESSAGE,
     jobResultObject: JobResultObject | None,
-    token: SecretStr,
 ) -> None:
-    scicat_client().update_job_status_v3(
-        job_id=job_id,
-        job_status_message=status_message,
-        job_result_object=jobResultObject,
-        token=token,
+    """Queues a job status update, see `StatusUpdater`. Terminal states are delivered before returning."""
+    scicat_status_updater().submit(
+        ("job", str(job_id)),
+        lambda token: scicat_client().update_job_status_v3(
+            job_id=job_id,
+            job_status_message=status_message,
+            job_result_object=jobResultObject,
+            token=token,
+        ),
+        flush=status_message in TERMINAL_STATUSES,
     )
 
 
-@task(task_run_name=generate_task_name_dataset)
 def update_scicat_archival_dataset_lifecycle(
     dataset_id: str,
     status: SciCatClient.ARCHIVESTATUSMESSAGE,
-    token: SecretStr,
     archivable: bool | None = None,
     retrievable: bool | None = None,
 ) -> None:
-    scicat_client().update_archival_dataset_lifecycle(
-        dataset_id=dataset_id,
-        status=status,
-        archivable=archivable,
-        retrievable=retrievable,
-        token=token,
+    """Queues a dataset lifecycle update, see `StatusUpdater`. Terminal states are delivered before
+    returning.
+    """
+    scicat_status_updater().submit(
+        ("dataset", dataset_id),
+        lambda token: scicat_client().update_archival_dataset_lifecycle(
+            dataset_id=dataset_id,
+            status=status,
+            archivable=archivable,
+            retrievable=retrievable,
+            token=token,
+        ),
+        flush=status in TERMINAL_STATUSES,
     )
 
 
-@task(task_run_name=generate_task_name_dataset)
 def update_scicat_retrieval_dataset_lifecycle(
-    dataset_id: str, status: SciCatClient.RETRIEVESTATUSMESSAGE, token: SecretStr
+    dataset_id: str, status: SciCatClient.RETRIEVESTATUSMESSAGE
 ) -> None:
+    """Queues a dataset lifecycle update, see `StatusUpdater`. Terminal states are delivered before
+    returning.
+    """
     # Due to a bug in Scicat, archivable and retrievable need to passed as well to the patch request
-    scicat_client().update_retrieval_dataset_lifecycle(
-        dataset_id=dataset_id,
-        status=status,
-        token=token,
-        archivable=False,
-        retrievable=True,
+    scicat_status_updater().submit(
+        ("dataset", dataset_id),
+        lambda token: scicat_client().update_retrieval_dataset_lifecycle(
+            dataset_id=dataset_id,
+            status=status,
+            token=token,
+            archivable=False,
+            retrievable=True,
+        ),
+        flush=status in TERMINAL_STATUSES,
     )
 
 
@@ -108,6 +166,19 @@ def get_origdatablocks(dataset_id: str, token: SecretStr) -> List[OrigDataBlock]
     return scicat_client().get_origdatablocks(dataset_id=dataset_id, token=token)
 
 
+@task
+def get_dataset_sizes(dataset_ids: List[str], token: SecretStr) -> Dict[str, int]:
+    """Sizes of datasets in bytes, summed over their origdatablocks. Fetched concurrently."""
+
+    def dataset_size(dataset_id: str) -> int:
+        # only the sizes are needed, the file lists are never materialized
+        origdatablocks = scicat_client().get_origdatablocks(dataset_id=dataset_id, token=token, lazy=True)
+        return sum(o.size for o in origdatablocks)
+
+    with ThreadPoolExecutor(max_workers=Variables().ARCHIVER_NUM_WORKERS) as executor:
+        return dict(zip(dataset_ids, executor.map(dataset_size, dataset_ids)))
+
+
 @task
 def get_job_datasetlist(job_id: UUID, token: SecretStr) -> List[str]:
     return scicat_client().get_job_datasetlist(job_id=job_id, token=token)
@@ -126,64 +197,43 @@ def get_datablocks(dataset_id: str, token: SecretStr) -> List[DataBlock]:
     return datablocks
 
 
-def report_dataset_system_error(dataset_id: str, token: SecretStr, message: str | None = None):
-    scicat_client().update_archival_dataset_lifecycle(
-        dataset_id=dataset_id,
-        status=SciCatClient.ARCHIVESTATUSMESSAGE.SCHEDULE_ARCHIVE_JOB_FAILED,
-        archivable=None,
-        retrievable=None,
-        token=token,
+def report_dataset_system_error(dataset_id: str, message: str | None = None):
+    update_scicat_archival_dataset_lifecycle(
+        dataset_id=dataset_id, status=SciCatClient.ARCHIVESTATUSMESSAGE.SCHEDULE_ARCHIVE_JOB_FAILED
     )
 
 
-def report_dataset_user_error(dataset_id: str, token: SecretStr, message: str | None = None):
-    scicat_client().update_archival_dataset_lifecycle(
-        dataset_id=dataset_id,
-        status=SciCatClient.ARCHIVESTATUSMESSAGE.MISSING_FILES,
-        archivable=None,
-        retrievable=None,
-        token=token,
+def report_dataset_user_error(dataset_id: str, message: str | None = None):
+    update_scicat_archival_dataset_lifecycle(
+        dataset_id=dataset_id, status=SciCatClient.ARCHIVESTATUSMESSAGE.MISSING_FILES
     )
 
 
 def report_dataset_retrieval_error(
     dataset_id: str,
-    token: SecretStr,
     message: str | None = None,
 ):
     # TODO: correct error message
-    scicat_client().update_retrieval_dataset_lifecycle(
-        dataset_id=dataset_id,
-        status=SciCatClient.RETRIEVESTATUSMESSAGE.DATASET_RETRIEVAL_FAILED,
-        token=token,
-        archivable=False,
-        retrievable=True,
+    update_scicat_retrieval_dataset_lifecycle(
+        dataset_id=dataset_id, status=SciCatClient.RETRIEVESTATUSMESSAGE.DATASET_RETRIEVAL_FAILED
     )
 
 
 def report_job_failure_user_error(
     job_id: UUID,
-    token: SecretStr,
     message: str | None = None,
 ):
-    scicat_client().update_job_status_v3(
-        job_id=job_id,
-        job_status_message=SciCatClient.STATUSMESSAGE.FINISHED_UNSUCCESSFULLY,
-        job_result_object=None,
-        token=token,
+    update_scicat_archival_job_status(
+        job_id=job_id, status_message=SciCatClient.STATUSMESSAGE.FINISHED_UNSUCCESSFULLY
     )
 
 
 def report_job_failure_system_error(
     job_id: UUID,
-    token: SecretStr,
     message: str | None = None,
 ):
-    scicat_client().update_job_status_v3(
-        job_id=job_id,
-        job_status_message=SciCatClient.STATUSMESSAGE.FINISHED_UNSUCCESSFULLY,
-        job_result_object=None,
-        token=token,
+    update_scicat_archival_job_status(
+        job_id=job_id, status_message=SciCatClient.STATUSMESSAGE.FINISHED_UNSUCCESSFULLY
     )
 
 
@@ -197,17 +247,31 @@ def create_job_result_object_task(dataset_ids: List[str]) -> JobResultObject:
     access_token = get_scicat_access_token.submit()
     access_token.wait()
 
-    job_results: List[JobResultEntry] = []
+    # fetch the datablocks of all datasets concurrently, in the order of the dataset ids
+    datablocks_futures = [
+        get_datablocks.submit(dataset_id=dataset_id, token=access_token.result())
+        for dataset_id in dataset_ids
+    ]
 
-    for dataset_id in dataset_ids:
-        datablocks_future = get_datablocks.submit(dataset_id=dataset_id, token=access_token.result())
-
-        datablocks_future.wait()
-        datablocks = datablocks_future.result()
-
-        dataset_job_results = create_job_result_entries(dataset_id, datablocks)
+    job_results: List[JobResultEntry] = []
+    for dataset_id, datablocks_future in zip(dataset_ids, datablocks_futures):
+        dataset_job_results = create_job_result_entries(dataset_id, datablocks_future.result())
         job_results = job_results + dataset_job_results
 
+    create_table_artifact(
+        key="datablocks",
+        table=[
+            {
+                "dataset": r.datasetId,
+                "datablock": r.name,
+                "size": r.size,
+                "link": f"[download]({r.url})",
+            }
+            for r in job_results
+        ],
+        description=f"Links to the {len(job_results)} datablocks of this job",
+    )
+
     job_results_object = JobResultObject(result=job_results)
 
     script = create_download_script(job_results)
@@ -236,37 +300,21 @@ def create_presigned_url(client: S3Storage, datablock: DataBlock):
     return url
 
 
-def sanitize_name(name: str) -> str:
-    invalid_chars = ["/", ".", "_"]
-    sanitized_name = name
-    for c in invalid_chars:
-        sanitized_name = sanitized_name.replace(c, "-")
-    return sanitized_name
-
-
 @log
 def create_job_result_entries(dataset_id: str, datablocks: List[DataBlock]) -> List[JobResultEntry]:
+    """Creates the job result entries of the datablocks of a dataset. Presigning a url is a local computation
+    that does not involve the S3 service, so it is done in a plain loop.
+    """
     s3_client = get_s3_client()
-    job_result_entries: List[JobResultEntry] = []
-    for datablock in datablocks:
-        url = create_presigned_url(s3_client, datablock)
-
-        sanitized_name = sanitize_name(str(Path(datablock.archiveId).stem))
-
-        create_link_artifact(
-            key=sanitized_name,
-            link=url,
-            description=f"Link to a datablock {sanitized_name}",
-        )
-
-        job_result_entries.append(
-            JobResultEntry(
-                datasetId=dataset_id,
-                name=Path(datablock.archiveId).name,
-                size=datablock.size,
-                archiveId=datablock.archiveId,
-                url=url,
-            )
+    urls = [create_presigned_url(s3_client, datablock) for datablock in datablocks]
+
+    return [
+        JobResultEntry(
+            datasetId=dataset_id,
+            name=Path(datablock.archiveId).name,
+            size=datablock.size,
+            archiveId=datablock.archiveId,
+            url=url,
         )
-
-    return job_result_entries
+        for datablock, url in zip(datablocks, urls)
+    ]
@@ -0,0 +1,172 @@
+from __future__ import annotations
+import atexit
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Hashable, List, Set, Tuple
+
+import httpx
+from pydantic import SecretStr
+
+from scicat.token_provider import TokenProvider
+from utils.log import getLogger
+
+
+@dataclass
+class _Update:
+    send: Callable[[SecretStr], None]
+    queued_at: float
+    # failed updates are retried after this time
+    not_before: float = 0.0
+    attempts: int = 0
+
+
+class StatusUpdater:
+    """Sends status updates to SciCat in the background (write-behind).
+
+    Updates are queued per key, i.e. per dataset lifecycle or per job. An update replaces the pending one of
+    its key, such that intermediate states that are overwritten within `COALESCE_WINDOW_S` or while an earlier
+    update of the key is in flight are never sent. Updates of a key are sent one at a time and in the order
+    they were queued, so a superseded state never overwrites a newer one. Different keys are sent
+    concurrently by `SENDER_THREADS` threads, such that a slow or failing key does not hold back the others.
+    A failed update is queued again with a backoff, unless a newer one replaced it meanwhile, and given up
+    after `SEND_ATTEMPTS` attempts.
+
+    Terminal states are flushed: the caller blocks until the update is delivered and gets the error if it
+    could not be. Errors of updates nobody flushes are only logged.
+    """
+
+    # time a queued update waits for a newer one replacing it
+    COALESCE_WINDOW_S = 0.5
+    SEND_ATTEMPTS = 3
+    RETRY_BACKOFF_S = 1.0
+    SENDER_THREADS = 4
+    # time pending updates are given to be delivered when the process exits
+    EXIT_FLUSH_TIMEOUT_S = 30.0
+
+    def __init__(self, token_provider: TokenProvider):
+        self._token_provider = token_provider
+        self._cond = threading.Condition()
+        self._pending: Dict[Hashable, _Update] = {}
+        self._in_flight: Set[Hashable] = set()
+        self._urgent: Set[Hashable] = set()
+        self._flush_all = 0
+        # errors of updates given up, only kept for keys being flushed
+        self._errors: Dict[Hashable, Exception] = {}
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_threads(self) -> None:
+        if len(self._threads) == 0:
+            for idx in range(self.SENDER_THREADS):
+                thread = threading.Thread(target=self._run, name=f"scicat-status-updater-{idx}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            atexit.register(self.flush, timeout=self.EXIT_FLUSH_TIMEOUT_S)
+
+    def submit(self, key: Hashable, send: Callable[[SecretStr], None], flush: bool = False) -> None:
+        """Queues an update
+
+        Args:
+            key (Hashable): updates with the same key replace each other
+            send (Callable[[SecretStr], None]): sends the update with a SciCat token
+            flush (bool): block until the update is delivered
+
+        Raises:
+            Exception: if the update was flushed but could not be delivered
+        """
+        with self._cond:
+            if key in self._pending:
+                getLogger().debug(f"Coalesced pending SciCat update of {key}")
+            self._pending[key] = _Update(send=send, queued_at=time.monotonic())
+            if flush:
+                # before any sender sees the update, such that its error is kept for the caller
+                self._urgent.add(key)
+            self._ensure_threads()
+            self._cond.notify_all()
+        if flush:
+            self.flush(key)
+
+    def flush(self, key: Hashable | None = None, timeout: float | None = None) -> None:
+        """Blocks until the pending updates of a key, or of all keys, are delivered
+
+        Raises:
+            Exception: the error of the last update of the key that could not be delivered
+        """
+
+        def delivered() -> bool:
+            if key is None:
+                return len(self._pending) == 0 and len(self._in_flight) == 0
+            return key not in self._pending and key not in self._in_flight
+
+        with self._cond:
+            if key is None:
+                self._flush_all += 1
+            else:
+                self._urgent.add(key)
+            self._cond.notify_all()
+            try:
+                if not self._cond.wait_for(delivered, timeout):
+                    getLogger().warning("Timed out flushing SciCat status updates")
+            finally:
+                if key is None:
+                    self._flush_all -= 1
+                else:
+                    self._urgent.discard(key)
+            error = self._errors.pop(key, None) if key is not None else None
+        if error is not None:
+            raise error
+
+    def _next_due(self) -> Tuple[Hashable | None, float | None]:
+        """Key of a pending update to send now, or the time to wait for the next one otherwise"""
+        now = time.monotonic()
+        wait: float | None = None
+        for key, update in self._pending.items():
+            if key in self._in_flight:
+                continue
+            ready_at = update.not_before
+            if key not in self._urgent and self._flush_all == 0:
+                ready_at = max(ready_at, update.queued_at + self.COALESCE_WINDOW_S)
+            remaining = ready_at - now
+            if remaining <= 0:
+                return key, None
+            wait = remaining if wait is None else min(wait, remaining)
+        return None, wait
+
+    def _send(self, key: Hashable, update: _Update) -> Exception | None:
+        try:
+            update.send(self._token_provider.token())
+            return None
+        except Exception as e:
+            if isinstance(e, httpx.HTTPStatusError) and e.response.status_code == 401:
+                self._token_provider.invalidate()
+            getLogger().warning(f"SciCat update of {key} failed (attempt {update.attempts + 1}): {e}")
+            return e
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                key, wait = self._next_due()
+                while key is None:
+                    self._cond.wait(wait)
+                    key, wait = self._next_due()
+                update = self._pending.pop(key)
+                self._in_flight.add(key)
+
+            error = self._send(key, update)
+
+            with self._cond:
+                self._in_flight.discard(key)
+                update.attempts += 1
+                if error is None:
+                    self._errors.pop(key, None)
+                elif key in self._pending:
+                    # replaced by a newer update, which is sent instead
+                    pass
+                elif update.attempts < self.SEND_ATTEMPTS:
+                    update.not_before = time.monotonic() + self.RETRY_BACKOFF_S * 2 ** (update.attempts - 1)
+                    self._pending[key] = update
+                else:
+                    getLogger().error(f"Giving up SciCat update of {key}: {error}")
+                    if key in self._urgent:
+                        self._errors[key] = error
+                self._cond.notify_all()
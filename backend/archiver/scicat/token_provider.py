@@ -0,0 +1,121 @@
+from __future__ import annotations
+import base64
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Generator, Tuple
+
+from pydantic import SecretStr
+
+from utils.log import getLogger
+
+
+class TokenProvider:
+    """Provides a SciCat access token, logging in only when the current token is about to expire.
+
+    The expiry is read from the `exp` claim of the token. Tokens are shared by all threads of a process and,
+    through a cache file guarded by a file lock, by all processes of a node. Concurrent refreshes are
+    deduplicated: the first caller logs in while the others wait and then use the new token.
+    """
+
+    # tokens are refreshed this long before they expire
+    REFRESH_MARGIN_S = 300
+    # lifetime assumed for tokens without a readable expiry
+    DEFAULT_LIFETIME_S = 3600
+
+    def __init__(self, login: Callable[[], str], cache_file: Path | None = None):
+        self._login = login
+        self._cache_file = cache_file
+        self._lock = threading.Lock()
+        self._token: str | None = None
+        self._expiry = 0.0
+
+    @staticmethod
+    def expiry(token: str) -> float | None:
+        """Expiry of a JWT as a unix timestamp, None if the token has no readable `exp` claim"""
+        try:
+            payload = token.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+            return float(claims["exp"])
+        except (IndexError, ValueError, KeyError, TypeError):
+            return None
+
+    def _is_fresh(self, expiry: float) -> bool:
+        return time.time() < expiry - self.REFRESH_MARGIN_S
+
+    def _read_cache(self) -> Tuple[str, float] | None:
+        try:
+            cached = json.loads(self._cache_file.read_text())  # type: ignore
+            return cached["token"], float(cached["expiry"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def _write_cache(self, token: str, expiry: float) -> None:
+        assert self._cache_file is not None
+        tmp = self._cache_file.with_suffix(".tmp")
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"token": token, "expiry": expiry}, f)
+        os.replace(tmp, self._cache_file)
+
+    def _refresh(self) -> Tuple[str, float]:
+        getLogger().info("Logging in to SciCat")
+        token = self._login()
+        expiry = self.expiry(token)
+        if expiry is None:
+            expiry = time.time() + self.DEFAULT_LIFETIME_S
+        return token, expiry
+
+    @contextmanager
+    def _cache_lock(self) -> Generator[None, None, None]:
+        """Locks the cache file against the other processes of the node"""
+        assert self._cache_file is not None
+        self._cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self._cache_file.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+
+    def _refresh_shared(self) -> Tuple[str, float]:
+        with self._cache_lock():
+            # another process might have refreshed the token while this one waited for the lock
+            cached = self._read_cache()
+            if cached is not None and self._is_fresh(cached[1]):
+                return cached
+            token, expiry = self._refresh()
+            self._write_cache(token, expiry)
+            return token, expiry
+
+    def token(self) -> SecretStr:
+        if self._token is not None and self._is_fresh(self._expiry):
+            return SecretStr(self._token)
+
+        with self._lock:
+            # another thread might have refreshed the token while this one waited for the lock
+            if self._token is None or not self._is_fresh(self._expiry):
+                if self._cache_file is None:
+                    self._token, self._expiry = self._refresh()
+                else:
+                    self._token, self._expiry = self._refresh_shared()
+            return SecretStr(self._token)
+
+    def invalidate(self) -> None:
+        """Drops the current token, e.g. after SciCat rejected it. The cache file is only removed if it still
+        holds that token, not one another process refreshed meanwhile.
+        """
+        with self._lock:
+            token = self._token
+            self._token, self._expiry = None, 0.0
+            if self._cache_file is None or token is None:
+                return
+            with self._cache_lock():
+                cached = self._read_cache()
+                if cached is not None and cached[0] == token:
+                    self._cache_file.unlink(missing_ok=True)
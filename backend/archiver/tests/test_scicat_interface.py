@@ -0,0 +1,216 @@
+import gzip
+import json
+from typing import Callable
+from unittest.mock import patch
+
+import httpx
+import pytest
+from pydantic import SecretStr
+
+from scicat.scicat_interface import AsyncSciCatClient, DatablockRequestError, SciCatClient
+from utils.model import DataBlock, DataFile
+
+ENDPOINT = "http://scicat.example.com"
+DATABLOCKS_URL = f"{ENDPOINT}/api/v3/datasets/prefix%2F123/datablocks"
+TOKEN = SecretStr("token")
+
+
+def client(handler: Callable[[httpx.Request], httpx.Response], **kwargs) -> SciCatClient:
+    return SciCatClient(
+        endpoint=ENDPOINT,
+        datasets_api_prefix="/api/v3",
+        max_concurrent_requests=4,
+        transport=httpx.MockTransport(handler),
+        **kwargs,
+    )
+
+
+def datablocks(num: int):
+    return [
+        DataBlock(id=f"Block_{i}", archiveId=f"Block_{i}.tar", size=1, packedSize=1, version="1")
+        for i in range(num)
+    ]
+
+
+def test_register_datablocks_retries_failed_datablocks():
+    attempts = {}
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        assert request.url == httpx.URL(DATABLOCKS_URL)
+        if request.method == "GET":
+            return httpx.Response(200, json=[])
+        id = json.loads(request.content)["id"]
+        attempts[id] = attempts.get(id, 0) + 1
+        # the first request of every third datablock fails
+        return httpx.Response(500 if id in ["Block_0", "Block_3", "Block_6"] and attempts[id] == 1 else 201)
+
+    results = client(respond).register_datablocks("prefix/123", datablocks(10), TOKEN)
+
+    assert [r.datablock.id for r in results] == [f"Block_{i}" for i in range(10)]
+    assert all(r.error is None for r in results)
+    assert attempts == {f"Block_{i}": 2 if i in [0, 3, 6] else 1 for i in range(10)}
+
+
+def test_register_datablocks_skips_datablocks_created_by_failed_requests():
+    posted = []
+    stored = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json=stored)
+        d = json.loads(request.content)
+        posted.append(d["id"])
+        # the datablock is stored, but the response never reaches the client
+        stored.append(d)
+        return httpx.Response(504 if d["id"] == "Block_1" else 201)
+
+    results = client(respond).register_datablocks("prefix/123", datablocks(3), TOKEN)
+
+    assert all(r.error is None for r in results)
+    assert sorted(posted) == ["Block_0", "Block_1", "Block_2"]
+
+
+def test_delete_datablocks_reports_failed_datablocks():
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url == httpx.URL(f"{DATABLOCKS_URL}/Block_2"):
+            return httpx.Response(500)
+        # deleted already
+        if request.url == httpx.URL(f"{DATABLOCKS_URL}/Block_4"):
+            return httpx.Response(404)
+        return httpx.Response(200)
+
+    with pytest.raises(DatablockRequestError) as e:
+        client(respond).delete_datablocks("prefix/123", datablocks(5), TOKEN)
+
+    assert [d.id for d in e.value.failed] == ["Block_2"]
+    assert len(requests) == 4 + SciCatClient.DATABLOCK_REQUEST_ATTEMPTS
+
+
+def test_register_datablocks_bulk():
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(201)
+
+    scicat = client(respond, datablocks_bulk_api=True)
+    results = scicat.register_datablocks("prefix/123", datablocks(10), TOKEN)
+
+    assert len(requests) == 1
+    assert [d["id"] for d in json.loads(requests[0].content)] == [f"Block_{i}" for i in range(10)]
+    assert all(r.error is None for r in results)
+
+
+def test_register_datablocks_bulk_not_supported():
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json=[])
+        requests.append(request)
+        return httpx.Response(400 if len(requests) == 1 else 201)
+
+    scicat = client(respond, datablocks_bulk_api=True)
+    results = scicat.register_datablocks("prefix/123", datablocks(10), TOKEN)
+
+    # falls back to one request per datablock
+    assert len(requests) == 11
+    assert all(r.error is None for r in results)
+
+
+def test_register_datablocks_bulk_timed_out():
+    posted = []
+    stored = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        if request.method == "GET":
+            return httpx.Response(200, json=stored)
+        body = json.loads(request.content)
+        if isinstance(body, list):
+            # the first datablocks are stored before the request times out
+            stored.extend(body[:4])
+            raise httpx.ReadTimeout("timeout", request=request)
+        posted.append(body["id"])
+        return httpx.Response(201)
+
+    scicat = client(respond, datablocks_bulk_api=True)
+    results = scicat.register_datablocks("prefix/123", datablocks(10), TOKEN)
+
+    assert all(r.error is None for r in results)
+    assert sorted(posted) == sorted(f"Block_{i}" for i in range(4, 10))
+
+
+@patch.object(AsyncSciCatClient, "BACKOFF_FACTOR_S", 0)
+def test_requests_are_retried():
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.method == "GET" and len(requests) == 1:
+            raise httpx.ReadTimeout("timeout", request=request)
+        if request.method == "GET" and len(requests) == 2:
+            return httpx.Response(503)
+        if request.method == "GET":
+            return httpx.Response(200, json=[])
+        return httpx.Response(503)
+
+    scicat = client(respond)
+
+    assert scicat.get_datablocks("prefix/123", TOKEN) == []
+    assert len(requests) == 3
+
+    # non idempotent requests are not retried on server errors
+    requests.clear()
+    with pytest.raises(httpx.HTTPStatusError):
+        scicat.update_archival_dataset_lifecycle(
+            "prefix/123", SciCatClient.ARCHIVESTATUSMESSAGE.STARTED, TOKEN
+        )
+    assert len(requests) == 1
+
+
+@patch.object(AsyncSciCatClient, "BACKOFF_FACTOR_S", 0)
+def test_failed_connections_are_retried_for_any_method():
+    requests = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if len(requests) <= 2:
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(201)
+
+    client(respond).register_datablocks("prefix/123", datablocks(1), TOKEN)
+
+    assert len(requests) == 3
+
+
+def test_register_datablocks_gzip_encoded():
+    bodies = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        if request.headers.get("Content-Encoding") == "gzip":
+            bodies.append(json.loads(gzip.decompress(request.content)))
+            return httpx.Response(201)
+        return httpx.Response(500)
+
+    data_blocks = datablocks(2)
+    data_blocks[0].dataFileList = [DataFile(path=f"file_{i}", size=i) for i in range(2500)]
+
+    client(respond, gzip_requests=True).register_datablocks("prefix/123", data_blocks, TOKEN)
+
+    expected = [json.loads(d.model_dump_json(exclude_none=True)) for d in data_blocks]
+    assert sorted(bodies, key=lambda b: b["id"]) == expected
+
+
+def test_register_datablocks_gzip_not_supported():
+    encodings = []
+
+    def respond(request: httpx.Request) -> httpx.Response:
+        encodings.append(request.headers.get("Content-Encoding"))
+        return httpx.Response(415 if request.headers.get("Content-Encoding") == "gzip" else 201)
+
+    client(respond, gzip_requests=True).register_datablocks("prefix/123", datablocks(1), TOKEN)
+
+    assert encodings == ["gzip", None]
@@ -0,0 +1,81 @@
+import json
+import os
+import time
+
+import pytest
+
+from scicat.response_parsing import CompactDataFileList, parse_datablocks, parse_datablocks_lazy
+from utils.model import DataBlock, DataFile, OrigDataBlock
+
+
+def origdatablocks(num_blocks: int, num_files: int):
+    return [
+        OrigDataBlock(
+            id=f"Block_{b}",
+            size=num_files,
+            ownerGroup="group",
+            dataFileList=[
+                DataFile(path=f"folder/file_{b}_{i}", size=1, chk=f"{i:064x}", time="2024-01-01T00:00:00Z")
+                for i in range(num_files)
+            ],
+        )
+        for b in range(num_blocks)
+    ]
+
+
+def response(blocks) -> bytes:
+    return ("[" + ",".join(b.model_dump_json(exclude_none=True) for b in blocks) + "]").encode()
+
+
+def test_parse_datablocks():
+    blocks = origdatablocks(3, 10)
+
+    assert parse_datablocks(response(blocks), OrigDataBlock) == blocks
+
+
+def test_parse_datablocks_encoded_as_strings():
+    blocks = [
+        DataBlock(id="Block_0", archiveId="a.tar", size=1, version="1", dataFileList=[DataFile(path="a")])
+    ]
+    content = json.dumps([b.model_dump_json() for b in blocks]).encode()
+
+    assert parse_datablocks(content, DataBlock) == blocks
+    assert parse_datablocks_lazy(content, DataBlock)[0].id == "Block_0"
+
+
+def test_parse_datablocks_lazy():
+    blocks = origdatablocks(2, 10)
+    blocks[1].dataFileList[3].chk = None  # type: ignore
+
+    parsed = parse_datablocks_lazy(response(blocks), OrigDataBlock)
+
+    assert [b.size for b in parsed] == [10, 10]
+    file_list = parsed[1].dataFileList
+    assert isinstance(file_list, CompactDataFileList)
+    assert len(file_list) == 10
+    assert file_list.column("chk")[3] is None
+    assert list(file_list) == blocks[1].dataFileList
+    assert file_list[-1] == blocks[1].dataFileList[-1]  # type: ignore
+
+
+@pytest.mark.skipif(not os.environ.get("ARCHIVER_BENCHMARKS"), reason="set ARCHIVER_BENCHMARKS to run")
+def test_benchmark_parse_datablocks():
+    content = response(origdatablocks(10, 100_000))
+
+    def legacy():
+        return [OrigDataBlock.model_validate(r) for r in json.loads(content)]
+
+    def timed(parse):
+        start = time.perf_counter()
+        parse()
+        return time.perf_counter() - start
+
+    timings = {
+        "per entry": timed(legacy),
+        "bulk": timed(lambda: parse_datablocks(content, OrigDataBlock)),
+        "lazy": timed(lambda: parse_datablocks_lazy(content, OrigDataBlock)),
+        "lazy, sizes only": timed(lambda: sum(b.size for b in parse_datablocks_lazy(content, OrigDataBlock))),
+    }
+    print(f"\nParsing {len(content) / 1e6:.0f} MB, 1M files:")
+    for name, seconds in timings.items():
+        print(f"  {name:<20}{seconds:.2f} s")
@@ -1,15 +1,25 @@
-import re
-from scicat.scicat_tasks import sanitize_name
+from unittest.mock import patch
 
+from scicat.scicat_tasks import create_job_result_entries
+from utils.model import DataBlock
 
-def is_valid_string(input_string):
-    pattern = r"^[a-z0-9-]+$"  # Regex pattern
-    return bool(re.match(pattern, input_string))  # Check for a match
 
+@patch("scicat.scicat_tasks.get_s3_client", lambda: None)
+@patch("scicat.scicat_tasks.create_presigned_url", lambda client, datablock: f"url/{datablock.archiveId}")
+def test_create_job_result_entries():
+    datablocks = [
+        DataBlock(
+            archiveId=f"dataset/datablocks/block_{i}.tar",
+            size=i,
+            packedSize=i,
+            version="1",
+            dataFileList=[],
+        )
+        for i in range(10)
+    ]
 
-def test_sanitize_name():
-    dataset_id = "20.500.11935/71f11078-77bb-469d-90e6-dcb4a8fd7e93"
+    entries = create_job_result_entries("dataset", datablocks)
 
-    sanatized = sanitize_name(dataset_id)
-
-    assert is_valid_string(sanatized)
+    assert [e.url for e in entries] == [f"url/{d.archiveId}" for d in datablocks]
+    assert [e.name for e in entries] == [f"block_{i}.tar" for i in range(10)]
+    assert all(e.datasetId == "dataset" for e in entries)
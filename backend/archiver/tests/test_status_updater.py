@@ -0,0 +1,108 @@
+import threading
+from typing import List
+from unittest.mock import MagicMock, patch
+
+import pytest
+from pydantic import SecretStr
+
+from scicat.status_updater import StatusUpdater
+
+
+def updater() -> StatusUpdater:
+    token_provider = MagicMock()
+    token_provider.token.return_value = SecretStr("token")
+    return StatusUpdater(token_provider)
+
+
+def test_updates_are_coalesced():
+    sent: List[str] = []
+    status_updater = updater()
+
+    with patch.object(StatusUpdater, "COALESCE_WINDOW_S", 60):
+        status_updater.submit("dataset", lambda token: sent.append("started"))
+        status_updater.submit("dataset", lambda token: sent.append("packing"))
+        status_updater.submit("job", lambda token: sent.append("job in progress"))
+        status_updater.submit("dataset", lambda token: sent.append("on archive disk"), flush=True)
+
+        assert sent == ["on archive disk"]
+        status_updater.flush()
+
+    assert sorted(sent) == ["job in progress", "on archive disk"]
+
+
+def test_updates_of_a_key_are_sent_in_order():
+    sent: List[str] = []
+    in_flight = threading.Event()
+    proceed = threading.Event()
+    status_updater = updater()
+
+    def slow_update(token: SecretStr):
+        in_flight.set()
+        proceed.wait()
+        sent.append("started")
+
+    with patch.object(StatusUpdater, "COALESCE_WINDOW_S", 0):
+        status_updater.submit("dataset", slow_update)
+        in_flight.wait()
+        # queued behind the update in flight, never overtaken by it
+        status_updater.submit("dataset", lambda token: sent.append("packing"))
+        status_updater.submit("dataset", lambda token: sent.append("on archive disk"))
+        proceed.set()
+        status_updater.flush("dataset")
+
+    assert sent == ["started", "on archive disk"]
+
+
+@patch.object(StatusUpdater, "RETRY_BACKOFF_S", 0)
+def test_failed_updates_are_retried():
+    attempts: List[int] = []
+    status_updater = updater()
+
+    def flaky_update(token: SecretStr):
+        attempts.append(1)
+        if len(attempts) < StatusUpdater.SEND_ATTEMPTS:
+            raise ConnectionError("unreachable")
+
+    status_updater.submit("job", flaky_update, flush=True)
+    assert len(attempts) == StatusUpdater.SEND_ATTEMPTS
+
+    def failing_update(token: SecretStr):
+        raise ConnectionError("unreachable")
+
+    with pytest.raises(ConnectionError):
+        status_updater.submit("job", failing_update, flush=True)
+
+
+def test_keys_are_sent_independently():
+    sent: List[str] = []
+    proceed = threading.Event()
+    status_updater = updater()
+
+    def slow_update(token: SecretStr):
+        proceed.wait()
+        sent.append("job in progress")
+
+    with patch.object(StatusUpdater, "COALESCE_WINDOW_S", 0):
+        status_updater.submit("job", slow_update)
+        # not held back by the update of the job in flight
+        status_updater.submit("dataset", lambda token: sent.append("on archive disk"), flush=True)
+        assert sent == ["on archive disk"]
+        proceed.set()
+        status_updater.flush()
+
+    assert sent == ["on archive disk", "job in progress"]
+
+
+@patch.object(StatusUpdater, "RETRY_BACKOFF_S", 0)
+def test_errors_of_updates_not_flushed_are_dropped():
+    status_updater = updater()
+
+    def failing_update(token: SecretStr):
+        raise ConnectionError("unreachable")
+
+    with patch.object(StatusUpdater, "COALESCE_WINDOW_S", 0):
+        status_updater.submit("dataset", failing_update)
+        status_updater.flush()
+
+    assert status_updater._errors == {}
+    status_updater.flush("dataset")
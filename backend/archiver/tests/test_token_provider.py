@@ -0,0 +1,90 @@
+import base64
+import json
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+from scicat.token_provider import TokenProvider
+
+
+def jwt(exp: float) -> str:
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+class Login:
+    def __init__(self, lifetime_s: float = 3600):
+        self.calls = 0
+        self._lifetime_s = lifetime_s
+
+    def __call__(self) -> str:
+        self.calls += 1
+        time.sleep(0.01)
+        return jwt(time.time() + self._lifetime_s)
+
+
+def test_expiry():
+    assert TokenProvider.expiry(jwt(1234)) == 1234
+    assert TokenProvider.expiry("not-a-jwt") is None
+
+
+def test_token_refreshed_before_expiry():
+    login = Login()
+    provider = TokenProvider(login)
+
+    token = provider.token()
+    assert provider.token() == token
+    assert login.calls == 1
+
+    with patch("time.time", return_value=time.time() + 3600 - TokenProvider.REFRESH_MARGIN_S):
+        provider.token()
+    assert login.calls == 2
+
+
+def test_concurrent_refreshes_are_deduplicated():
+    login = Login()
+    provider = TokenProvider(login)
+
+    threads = [threading.Thread(target=provider.token) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert login.calls == 1
+
+
+def test_token_shared_through_cache_file(tmp_path: Path):
+    login = Login()
+    cache_file = tmp_path / ".scicat-token"
+
+    token = TokenProvider(login, cache_file).token()
+    # e.g. another worker process
+    assert TokenProvider(login, cache_file).token() == token
+    assert login.calls == 1
+    assert cache_file.stat().st_mode & 0o777 == 0o600
+
+    provider = TokenProvider(login, cache_file)
+    provider.token()
+    provider.invalidate()
+    TokenProvider(login, cache_file).token()
+    assert login.calls == 2
+
+
+def test_invalidate_keeps_token_refreshed_by_another_process(tmp_path: Path):
+    login = Login()
+    cache_file = tmp_path / ".scicat-token"
+    stale = TokenProvider(login, cache_file)
+    stale.token()
+
+    # e.g. another worker process got its token rejected first and logged in again
+    other = TokenProvider(login, cache_file)
+    other.token()
+    other.invalidate()
+    refreshed = other.token()
+    assert login.calls == 2
+
+    stale.invalidate()
+    assert stale.token() == refreshed
+    assert login.calls == 2
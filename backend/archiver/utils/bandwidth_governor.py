@@ -0,0 +1,119 @@
+from __future__ import annotations
+import fcntl
+import os
+import threading
+import time
+from pathlib import Path
+
+from config.variables import Variables
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `capacity` tokens.
+
+    Requests take their tokens as soon as they arrive and may leave the bucket in deficit. They then wait
+    until the deficit is refilled, i.e. until all requests that arrived before them are served. Requests
+    are therefore served in the order they arrive, and a large request is never starved by smaller ones.
+
+    If a `state_file` is given, the bucket state is kept in that file and guarded by a file lock, such
+    that all processes on a node using the same file share one budget. Otherwise the bucket is local to
+    the process. A rate of 0 disables the bucket.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None, state_file: Path | None = None):
+        self._rate = float(rate)
+        self._capacity = float(capacity if capacity is not None else rate)
+        self._state_file = state_file
+        self._lock = threading.Lock()
+        self._tokens = self._capacity
+        self._timestamp = time.time()
+
+        if self.enabled and self._state_file is not None:
+            self._state_file.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self._rate > 0
+
+    def _take(self, tokens: float, timestamp: float, amount: float) -> tuple[float, float, float]:
+        """Refills and takes `amount` from the bucket. Returns the new state and the time to wait until the
+        deficit left by this and all earlier requests is refilled, 0 if the tokens were available.
+        """
+        now = time.time()
+        tokens = min(self._capacity, tokens + max(0.0, now - timestamp) * self._rate) - amount
+        return tokens, now, max(0.0, -tokens) / self._rate
+
+    def _acquire_local(self, amount: float) -> float:
+        with self._lock:
+            self._tokens, self._timestamp, wait = self._take(self._tokens, self._timestamp, amount)
+            return wait
+
+    def _acquire_shared(self, amount: float) -> float:
+        assert self._state_file is not None
+        with self._lock:
+            fd = os.open(self._state_file, os.O_RDWR | os.O_CREAT, 0o666)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                content = os.read(fd, 128).decode()
+                try:
+                    tokens, timestamp = (float(v) for v in content.split())
+                except ValueError:
+                    tokens, timestamp = self._capacity, time.time()
+                tokens, timestamp, wait = self._take(tokens, timestamp, amount)
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, f"{tokens} {timestamp}".encode())
+                return wait
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+    def acquire(self, amount: float = 1) -> None:
+        """Blocks until `amount` tokens could be taken from the bucket"""
+        if not self.enabled or amount <= 0:
+            return
+        if self._state_file is not None:
+            wait = self._acquire_shared(amount)
+        else:
+            wait = self._acquire_local(amount)
+        if wait > 0:
+            time.sleep(wait)
+
+
+class S3Governor:
+    """Limits the bandwidth and request rate of all S3 transfers on a node.
+
+    Transfers take their budget in chunks, such that concurrent transfers get a fair share of the bandwidth
+    instead of all of them running into throttling by the S3 service at the same time.
+    """
+
+    def __init__(
+        self,
+        bytes_per_second: float = 0,
+        requests_per_second: float = 0,
+        state_folder: Path | None = None,
+    ):
+        self._bandwidth = TokenBucket(
+            rate=bytes_per_second,
+            state_file=state_folder / "bandwidth" if state_folder is not None else None,
+        )
+        self._requests = TokenBucket(
+            rate=requests_per_second,
+            state_file=state_folder / "requests" if state_folder is not None else None,
+        )
+
+    @staticmethod
+    def from_variables() -> S3Governor:
+        return S3Governor(
+            bytes_per_second=Variables().S3_MAX_BANDWIDTH_BYTES_PER_S,
+            requests_per_second=Variables().S3_MAX_REQUESTS_PER_S,
+            state_folder=Variables().ARCHIVER_SCRATCH_FOLDER / ".s3-governor",
+        )
+
+    def request(self) -> None:
+        """Blocks until a request to S3 may be sent"""
+        self._requests.acquire(1)
+
+    def transfer(self, num_bytes: int) -> None:
+        """Blocks until `num_bytes` may be transferred"""
+        self._bandwidth.acquire(num_bytes)
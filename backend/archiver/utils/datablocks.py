@@ -1,18 +1,23 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
+import queue
 import subprocess
 import tarfile
+import threading
 import os
-import shutil
 import asyncio
-import datetime
 import hashlib
+import json
 
-from typing import Callable, Dict, Generator, List
+from typing import Callable, Dict, Generator, Iterable, List
 from pathlib import Path
 
 from utils.s3_storage_interface import S3Storage, Bucket
-from utils.model import OrigDataBlock, DataBlock, DataFile
+from utils.scratch_reservations import ScratchReservations
+from utils.scratch_trash import ScratchTrash
+from utils.model import OrigDataBlock, DataBlock
+from utils.file_manifest import FileManifest
+from utils.dataset_manifest import DatasetManifest
 from utils.log import getLogger, log, log_debug
 from config.variables import Variables
 from flows.flow_utils import DatasetError, SystemError, StoragePaths
@@ -50,6 +55,8 @@ class ArchiveInfo:
     packedSize: int
     path: Path
     fileCount: int
+    # entries of the packed files, if they were created while packing
+    dataFiles: FileManifest | None = None
 
 
 def partition_files_flat(folder: Path, target_size_bytes: int) -> Generator[List[Path], None, None]:
@@ -115,26 +122,9 @@ def create_tarfiles(
     total_file_count = count_files(src_folder)
     current_file_count = 0
 
-    def create_tar(idx: int, files: List) -> ArchiveInfo:
-        current_tar_info = ArchiveInfo(
-            unpackedSize=0,
-            packedSize=0,
-            path=Path(dst_folder / Path(f"{tar_name}_{idx}.tar")),
-            fileCount=len(files),
-        )
-        current_tarfile: tarfile.TarFile = tarfile.open(current_tar_info.path, "w")
-        for relative_file_path in files:
-            full_path = src_folder.joinpath(relative_file_path)
-            current_tar_info.unpackedSize += full_path.stat().st_size
-            current_tarfile.add(name=full_path, arcname=relative_file_path)
-
-        current_tarfile.close()
-        current_tar_info.packedSize = current_tar_info.path.stat().st_size
-        return current_tar_info
-
     with ThreadPoolExecutor(max_workers=Variables().ARCHIVER_NUM_WORKERS) as executor:
         future_to_key = {
-            executor.submit(create_tar, idx, files): (idx, files)
+            executor.submit(create_tar, src_folder, dst_folder / f"{tar_name}_{idx}.tar", files): (idx, files)
             for (idx, files) in partition_files_flat(src_folder, target_size)
         }
         for future in as_completed(future_to_key):
@@ -152,6 +142,411 @@ def create_tarfiles(
     return tarballs
 
 
+class _HashingReader:
+    """File object wrapper calculating the md5 hash of everything read through it"""
+
+    def __init__(self, f):
+        self._f = f
+        self._md5 = hashlib.md5()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._f.read(size)
+        self._md5.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._md5.hexdigest()
+
+
+def create_tar(src_folder: Path, tar_path: Path, files: List[Path], checksums: bool = False) -> ArchiveInfo:
+    """Creates a tar file from files in a folder.
+
+    Args:
+        src_folder (Path): folder the files are relative to
+        tar_path (Path): tar file to create
+        files (List[Path]): files to add, relative to src_folder. The relative paths are kept in the tar.
+        checksums (bool, optional): Calculate the md5 checksums of the files while adding them and return
+            them as `dataFiles`. Files are only read once this way. Defaults to False.
+
+    Returns:
+        ArchiveInfo: info about the created tar file
+    """
+    archive_info = ArchiveInfo(
+        unpackedSize=0,
+        packedSize=0,
+        path=tar_path,
+        fileCount=len(files),
+        dataFiles=FileManifest() if checksums else None,
+    )
+    with tarfile.open(tar_path, "w") as tar:
+        for relative_file_path in files:
+            full_path = src_folder.joinpath(relative_file_path)
+            archive_info.unpackedSize += full_path.stat().st_size
+            if not checksums:
+                tar.add(name=full_path, arcname=relative_file_path)
+                continue
+
+            tar_info = tar.gettarinfo(name=full_path, arcname=str(relative_file_path))
+            checksum = None
+            if tar_info.isreg():
+                with open(full_path, "rb") as f:
+                    reader = _HashingReader(f)
+                    tar.addfile(tar_info, fileobj=reader)
+                checksum = reader.hexdigest()
+            else:
+                tar.addfile(tar_info)
+
+            # the data of the member ends at the current offset, padded to full blocks
+            offset = tar.offset - tarfile.BLOCKSIZE * -(-tar_info.size // tarfile.BLOCKSIZE)
+            archive_info.dataFiles.append_tar_info(tar_info, checksum, offset)  # type: ignore
+
+    archive_info.packedSize = tar_path.stat().st_size
+    return archive_info
+
+
+def partition_objects(
+    objects: List[S3Storage.ListedObject], target_size_bytes: int, max_files: int = 0
+) -> List[List[S3Storage.ListedObject]]:
+    """Partitions objects into groups such that all the objects in a group combined have a target_size_bytes
+    size at maximum, unless a single object is larger.
+
+    Args:
+        objects (List[S3Storage.ListedObject]): objects to partition
+        target_size_bytes (int): maximum size of grouped objects
+        max_files (int): maximum number of objects in a group, 0 for no limit. Bounds the size of the
+            registration of the datablock packed from a group.
+
+    Returns:
+        List[List[S3Storage.ListedObject]]: partitions
+    """
+    partitions: List[List[S3Storage.ListedObject]] = []
+    part: List[S3Storage.ListedObject] = []
+    size = 0
+    for obj in objects:
+        if len(part) > 0 and (size + obj.Size > target_size_bytes or len(part) == max_files):
+            partitions.append(part)
+            part = []
+            size = 0
+        part.append(obj)
+        size += obj.Size
+    if len(part) > 0:
+        partitions.append(part)
+    return partitions
+
+
+def datablock_name(dataset_id: str, partition_index: int) -> str:
+    return f"{dataset_id.replace('/', '-')}_{partition_index}.tar"
+
+
+def dataset_manifest_name(dataset_id: str) -> str:
+    return f"{dataset_id.replace('/', '-')}.manifest"
+
+
+def download_partition(client: S3Storage, dataset_id: str, object_names: List[str]) -> List[Path]:
+    """Downloads the raw files of a partition to scratch
+
+    Returns:
+        List[Path]: downloaded files, relative to the raw files folder of the dataset
+    """
+    raw_prefix = StoragePaths.relative_raw_files_folder(dataset_id)
+    raw_files_folder = StoragePaths.scratch_archival_raw_files_folder(dataset_id)
+    with ThreadPoolExecutor(max_workers=Variables().ARCHIVER_NUM_WORKERS) as executor:
+        futures = [
+            executor.submit(
+                client.download_file, name, raw_prefix, raw_files_folder, Bucket.landingzone_bucket()
+            )
+            for name in object_names
+        ]
+        for future in as_completed(futures):
+            future.result()
+    return [Path(name).relative_to(raw_prefix) for name in object_names]
+
+
+def _start_pipeline_stage(
+    fn: Callable,
+    inbox: queue.Queue,
+    outbox: queue.Queue | None,
+    num_workers: int,
+    failed: threading.Event,
+    errors: List[Exception],
+) -> threading.Thread:
+    """Starts `num_workers` threads applying `fn` to the items of `inbox` until None is received and putting
+    the results into `outbox`, followed by None once all workers are done. After a failure in any stage,
+    items are only drained such that no stage blocks on a full queue.
+
+    Returns:
+        threading.Thread: thread to join for the stage to be done
+    """
+
+    def work():
+        while (item := inbox.get()) is not None:
+            if failed.is_set():
+                continue
+            try:
+                result = fn(item)
+                if outbox is not None:
+                    outbox.put(result)
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+        # let the other workers of this stage finish as well
+        inbox.put(None)
+
+    workers = [threading.Thread(target=work, daemon=True) for _ in range(max(1, num_workers))]
+    for w in workers:
+        w.start()
+
+    def close():
+        for w in workers:
+            w.join()
+        if outbox is not None:
+            outbox.put(None)
+
+    closer = threading.Thread(target=close, daemon=True)
+    closer.start()
+    return closer
+
+
+@log
+def estimate_scratch_footprint(
+    orig_datablocks: List[OrigDataBlock],
+    target_size: int,
+    queue_size: int = 2,
+    num_packers: int = 2,
+    num_uploaders: int = 2,
+) -> int:
+    """Estimates the scratch space needed to archive a dataset: the raw files plus the tar files they are
+    packed into. Since `create_datablocks_pipelined` removes raw files and datablocks as they are consumed,
+    the estimate is capped at the partitions that can be on scratch at the same time.
+
+    Args:
+        orig_datablocks (List[OrigDataBlock]): original datablocks of the dataset
+        target_size (int): target size of a datablock. This is the unpacked size of the files.
+
+    Returns:
+        int: estimated footprint in bytes
+    """
+    raw_size = sum(o.size for o in orig_datablocks)
+    max_partitions_on_scratch = 2 * queue_size + num_packers + num_uploaders + 1
+    return min(2 * raw_size, 2 * max_partitions_on_scratch * target_size)
+
+
+@log
+def reserve_scratch(dataset_id: str, orig_datablocks: List[OrigDataBlock], target_size: int) -> None:
+    """Blocks until the estimated scratch footprint of a dataset is reserved, see `ScratchReservations`.
+    The reservation is released by `cleanup_scratch`.
+    """
+    footprint = estimate_scratch_footprint(orig_datablocks, target_size)
+    ScratchReservations.from_variables().reserve(dataset_id, footprint)
+
+
+def create_datablocks_pipelined(
+    client: S3Storage,
+    dataset_id: str,
+    objects: List[S3Storage.ListedObject],
+    target_size: int,
+    queue_size: int = 2,
+    num_packers: int = 2,
+    num_uploaders: int = 2,
+    progress_callback: Callable[[float], None] | None = None,
+    max_files: int = 0,
+) -> List[ArchiveInfo]:
+    """Downloads the raw files of a dataset from the landing zone, packs them into datablocks (.tar files)
+    and uploads these to the archival bucket in overlapping stages: the partition plan is derived from
+    the listed objects, each partition is packed as soon as its objects are on scratch and each datablock
+    is uploaded as soon as it is closed.
+
+    The checksums of the raw files are calculated while packing (see `create_tar`), after which the raw
+    files are removed. Uploaded datablocks are removed as well and their archive info is stored as a manifest
+    (see `save_archive_info`). Bounded queues between the stages limit the number of partitions on scratch to
+    about `2 * queue_size + num_packers + num_uploaders + 1`.
+
+    Args:
+        client (S3Storage): s3 client
+        dataset_id (str): dataset identifier
+        objects (List[S3Storage.ListedObject]): raw file objects of the dataset in the landing zone
+        target_size (int): target size of a datablock. This is the unpacked size of the files.
+        max_files (int): maximum number of files in a datablock, 0 for no limit
+
+    Returns:
+        List[ArchiveInfo]: uploaded datablocks, including the entries of the packed files
+    """
+    if len(objects) == 0:
+        raise SystemError(f"No files found for dataset {dataset_id}")
+
+    raw_files_folder = StoragePaths.scratch_archival_raw_files_folder(dataset_id)
+    datablocks_folder = StoragePaths.scratch_archival_datablocks_folder(dataset_id)
+    raw_files_folder.mkdir(parents=True, exist_ok=True)
+    datablocks_folder.mkdir(parents=True, exist_ok=True)
+
+    partitions = partition_objects(objects, target_size, max_files)
+    total_file_count = len(objects)
+
+    client.restore_objects(bucket=Bucket.landingzone_bucket(), objects=[o.Name for o in objects])
+
+    def pack(item) -> tuple[int, ArchiveInfo]:
+        idx, files = item
+        archive_info = create_tar(
+            raw_files_folder, datablocks_folder / datablock_name(dataset_id, idx), files, True
+        )
+        for f in files:
+            (raw_files_folder / f).unlink()
+        return idx, archive_info
+
+    results: List[tuple[int, ArchiveInfo]] = []
+    results_lock = threading.Lock()
+
+    def upload(item) -> None:
+        idx, archive_info = item
+        client.fput_object(
+            source_file=archive_info.path,
+            destination_file=StoragePaths.relative_datablocks_folder(dataset_id) / archive_info.path.name,
+            bucket=Bucket.archival_bucket(),
+        )
+        save_archive_info(client, dataset_id, archive_info)
+        archive_info.path.unlink()
+        with results_lock:
+            results.append((idx, archive_info))
+            uploaded_file_count = sum(a.fileCount for _, a in results)
+        if progress_callback:
+            progress_callback(uploaded_file_count / total_file_count)
+
+    failed = threading.Event()
+    errors: List[Exception] = []
+    packing_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    upload_queue: queue.Queue = queue.Queue(maxsize=queue_size)
+    packers = _start_pipeline_stage(pack, packing_queue, upload_queue, num_packers, failed, errors)
+    uploaders = _start_pipeline_stage(upload, upload_queue, None, num_uploaders, failed, errors)
+
+    try:
+        for idx, partition in enumerate(partitions):
+            if failed.is_set():
+                break
+            packing_queue.put((idx, download_partition(client, dataset_id, [o.Name for o in partition])))
+    except Exception as e:
+        errors.append(e)
+        failed.set()
+    finally:
+        packing_queue.put(None)
+        packers.join()
+        uploaders.join()
+
+    if len(errors) > 0:
+        raise errors[0]
+
+    return [archive_info for _, archive_info in sorted(results, key=lambda r: r[0])]
+
+
+@log
+def create_datablock(
+    client: S3Storage, dataset_id: str, partition_index: int, object_names: List[str]
+) -> ArchiveInfo:
+    """Creates a single datablock of a dataset: downloads the raw files of a partition, packs them and uploads
+    the datablock to the archival bucket. The archive info is stored as a manifest in the landing zone, such
+    that it can be collected by a flow running on another worker (see `load_archive_info`).
+
+    Args:
+        client (S3Storage): s3 client
+        dataset_id (str): dataset identifier
+        partition_index (int): index of the partition in the partition plan of the dataset
+        object_names (List[str]): raw file objects of the partition in the landing zone
+
+    Returns:
+        ArchiveInfo: uploaded datablock, including the entries of the packed files
+    """
+    raw_files_folder = StoragePaths.scratch_archival_raw_files_folder(dataset_id)
+    datablocks_folder = StoragePaths.scratch_archival_datablocks_folder(dataset_id)
+    raw_files_folder.mkdir(parents=True, exist_ok=True)
+    datablocks_folder.mkdir(parents=True, exist_ok=True)
+
+    client.restore_objects(bucket=Bucket.landingzone_bucket(), objects=object_names)
+    files = download_partition(client, dataset_id, object_names)
+
+    archive_info = create_tar(
+        raw_files_folder, datablocks_folder / datablock_name(dataset_id, partition_index), files, True
+    )
+    for f in files:
+        (raw_files_folder / f).unlink()
+
+    client.fput_object(
+        source_file=archive_info.path,
+        destination_file=StoragePaths.relative_datablocks_folder(dataset_id) / archive_info.path.name,
+        bucket=Bucket.archival_bucket(),
+    )
+    save_archive_info(client, dataset_id, archive_info)
+    archive_info.path.unlink()
+    return archive_info
+
+
+def load_archive_infos(client: S3Storage, dataset_id: str, num_partitions: int) -> List[ArchiveInfo]:
+    """Loads the manifests of all datablocks of a dataset, in the order of the partitions"""
+    return [
+        load_archive_info(client, dataset_id, datablock_name(dataset_id, idx))
+        for idx in range(num_partitions)
+    ]
+
+
+def save_archive_info(client: S3Storage, dataset_id: str, archive_info: ArchiveInfo) -> None:
+    manifest = {
+        "unpackedSize": archive_info.unpackedSize,
+        "packedSize": archive_info.packedSize,
+        "name": archive_info.path.name,
+        "fileCount": archive_info.fileCount,
+        "dataFiles": (archive_info.dataFiles or FileManifest()).to_columns(),
+    }
+    client.put_bytes(
+        Bucket.landingzone_bucket(),
+        str(StoragePaths.relative_manifests_folder(dataset_id) / f"{archive_info.path.name}.json"),
+        json.dumps(manifest).encode(),
+        # read back right away by the flow collecting the datablocks, without restoring it
+        storage_class="STANDARD",
+    )
+
+
+def load_archive_info(client: S3Storage, dataset_id: str, name: str) -> ArchiveInfo:
+    manifest = json.loads(
+        client.get_bytes(
+            Bucket.landingzone_bucket(),
+            str(StoragePaths.relative_manifests_folder(dataset_id) / f"{name}.json"),
+            restore=False,
+        )
+    )
+    return ArchiveInfo(
+        unpackedSize=manifest["unpackedSize"],
+        packedSize=manifest["packedSize"],
+        path=StoragePaths.scratch_archival_datablocks_folder(dataset_id) / manifest["name"],
+        fileCount=manifest["fileCount"],
+        dataFiles=FileManifest.parse(manifest["dataFiles"]),
+    )
+
+
+@log
+def upload_dataset_manifest(client: S3Storage, dataset_id: str, archive_infos: Iterable[ArchiveInfo]) -> None:
+    """Stores the `DatasetManifest` of a dataset next to its datablocks in the archival bucket. It is kept in
+    the STANDARD storage class, such that it can be read without restoring it.
+    """
+    manifest = DatasetManifest.from_file_manifests(
+        (a.path.name, a.dataFiles if a.dataFiles is not None else FileManifest()) for a in archive_infos
+    )
+    client.put_bytes(
+        Bucket.archival_bucket(),
+        str(StoragePaths.relative_datablocks_folder(dataset_id) / dataset_manifest_name(dataset_id)),
+        manifest.to_bytes(),
+        storage_class="STANDARD",
+    )
+    getLogger().info(f"Stored manifest of {len(manifest)} files of dataset {dataset_id}")
+
+
+def load_dataset_manifest(client: S3Storage, dataset_id: str) -> DatasetManifest:
+    return DatasetManifest.from_bytes(
+        client.get_bytes(
+            Bucket.archival_bucket(),
+            str(StoragePaths.relative_datablocks_folder(dataset_id) / dataset_manifest_name(dataset_id)),
+            restore=False,
+        )
+    )
+
+
 def calculate_md5_checksum(filename: Path, chunksize: int = 2**20) -> str:
     """Calculate an md5 hash of a file
 
@@ -283,17 +678,20 @@ def create_datablock_entries(
     origDataBlocks: List[OrigDataBlock],
     tar_infos: List[ArchiveInfo],
     progress_callback: Callable[[float], None] = None,
-) -> List[DataBlock]:
+) -> Generator[DataBlock, None, None]:
     """Create datablock entries compliant with schema provided by scicat
 
+    The entries are yielded one datablock at a time, such that only the `DataFile`s of a single datablock are
+    in memory while they are written out.
+
     Args:
         dataset_id (str): Dataset identifier
         folder (Path): _description_
         origDataBlocks (List[OrigDataBlock]): _description_
         tarballs (List[Path]): _description_
 
-    Returns:
-        List[DataBlock]: _description_
+    Yields:
+        DataBlock: entry of each tar file
     """
 
     version = 1.0
@@ -304,65 +702,56 @@ def create_datablock_entries(
 
     file_count = 0
 
-    datablocks: List[DataBlock] = []
-
     for idx, tar in enumerate(tar_infos):
         # TODO: is it necessary to use any datablock information?
         o = origDataBlocks[0]
 
-        data_file_list: List[DataFile] = []
-
         tar_path = folder / tar.path
 
-        tarball = tarfile.open(tar_path)
-
-        def create_datafile_list_entry(tar_info: tarfile.TarInfo) -> DataFile:
-            checksum = calculate_md5_checksum(
-                StoragePaths.scratch_archival_raw_files_folder(dataset_id) / tar_info.path
-            )
-
-            return DataFile(
-                path=tar_info.path,
-                size=tar_info.size,
-                chk=checksum,
-                uid=str(tar_info.uid),
-                gid=str(tar_info.gid),
-                perm=str(tar_info.mode),
-                time=str(datetime.datetime.now(datetime.UTC).isoformat()),
-            )
-
-        with ThreadPoolExecutor(max_workers=Variables().ARCHIVER_NUM_WORKERS) as executor:
-            future_to_key = {
-                executor.submit(create_datafile_list_entry, tar_info): tar_info
-                for tar_info in tarball.getmembers()
-            }
-
-            for future in as_completed(future_to_key):
-                exception = future.exception()
-
-                if not exception:
-                    data_file_list.append(future.result())
-                    file_count += 1
-                    if progress_callback:
-                        progress_callback(file_count / total_file_count)
-                else:
-                    raise exception
-
-        datablocks.append(
-            DataBlock(
-                archiveId=str(StoragePaths.relative_datablocks_folder(dataset_id) / tar_path.name),
-                size=tar.unpackedSize,
-                packedSize=tar.packedSize,
-                chkAlg="md5",
-                version=str(version),
-                dataFileList=data_file_list,
-                rawDatasetId=o.rawdatasetId,
-                derivedDatasetId=o.derivedDatasetId,
-            )
+        if tar.dataFiles is not None:
+            # entries were created while packing
+            manifest = tar.dataFiles
+            file_count += len(manifest)
+            if progress_callback:
+                progress_callback(file_count / total_file_count)
+        else:
+            manifest = FileManifest()
+            tarball = tarfile.open(tar_path)
+
+            def checksum(tar_info: tarfile.TarInfo) -> str:
+                return calculate_md5_checksum(
+                    StoragePaths.scratch_archival_raw_files_folder(dataset_id) / tar_info.path
+                )
+
+            with ThreadPoolExecutor(max_workers=Variables().ARCHIVER_NUM_WORKERS) as executor:
+                future_to_key = {
+                    executor.submit(checksum, tar_info): tar_info for tar_info in tarball.getmembers()
+                }
+
+                for future in as_completed(future_to_key):
+                    exception = future.exception()
+
+                    if not exception:
+                        tar_info = future_to_key[future]
+                        manifest.append_tar_info(tar_info, future.result(), tar_info.offset_data)
+                        file_count += 1
+                        if progress_callback:
+                            progress_callback(file_count / total_file_count)
+                    else:
+                        raise exception
+
+        yield DataBlock(
+            archiveId=str(StoragePaths.relative_datablocks_folder(dataset_id) / tar_path.name),
+            size=tar.unpackedSize,
+            packedSize=tar.packedSize,
+            chkAlg="md5",
+            version=str(version),
+            # entries are only created as models for the SciCat registration
+            dataFileList=manifest.to_datafiles(),
+            rawDatasetId=o.rawdatasetId,
+            derivedDatasetId=o.derivedDatasetId,
         )
 
-    return datablocks
-
 
 @log
 def find_object_in_s3(client: S3Storage, dataset_id, datablock_name):
@@ -447,6 +836,16 @@ def cleanup_s3_landingzone(client: S3Storage, dataset_id: str) -> None:
         prefix=StoragePaths.relative_raw_files_folder(dataset_id),
         bucket=Bucket.landingzone_bucket(),
     )
+    delete_objects_from_s3(
+        client,
+        prefix=StoragePaths.relative_manifests_folder(dataset_id),
+        bucket=Bucket.landingzone_bucket(),
+    )
+    delete_objects_from_s3(
+        client,
+        prefix=StoragePaths.relative_stages_folder(dataset_id),
+        bucket=Bucket.landingzone_bucket(),
+    )
 
 
 @log
@@ -468,13 +867,33 @@ def on_rmtree_error(func, path, _):
 
 
 @log
-def cleanup_scratch(dataset_id: str):
+def cleanup_scratch(dataset_id: str) -> threading.Thread:
+    """Removes the scratch folder of a dataset without waiting for the deletion.
+
+    The folder is moved to the trash, which frees its path right away, and deleted in the background. The
+    scratch space reserved for the dataset is released in steps while files are deleted.
+
+    Returns:
+        threading.Thread: thread deleting the trash
+    """
     getLogger().info(f"Cleaning up objects in scratch folder: {StoragePaths.scratch_folder(dataset_id)}")
-    shutil.rmtree(
-        StoragePaths.scratch_folder(dataset_id),
-        ignore_errors=True,
-        onexc=on_rmtree_error,
-    )
+    trash = ScratchTrash.from_variables()
+    trash.move(StoragePaths.scratch_folder(dataset_id), reservation_id=dataset_id)
+    return trash.empty()
+
+
+@log
+def cleanup_partition_scratch(dataset_id: str, partition_index: int, object_names: List[str]) -> None:
+    """Removes the files a partition left on scratch, i.e. its raw files and its datablock. Other partitions
+    of the dataset may be processed on the same node, so the scratch folder of the dataset is kept.
+    """
+    raw_prefix = StoragePaths.relative_raw_files_folder(dataset_id)
+    raw_files_folder = StoragePaths.scratch_archival_raw_files_folder(dataset_id)
+    datablocks_folder = StoragePaths.scratch_archival_datablocks_folder(dataset_id)
+    getLogger().info(f"Cleaning up datablock {partition_index} of dataset {dataset_id} on scratch")
+    for name in object_names:
+        (raw_files_folder / Path(name).relative_to(raw_prefix)).unlink(missing_ok=True)
+    (datablocks_folder / datablock_name(dataset_id, partition_index)).unlink(missing_ok=True)
 
 
 @log
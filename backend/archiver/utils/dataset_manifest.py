@@ -0,0 +1,178 @@
+import struct
+import sys
+import zlib
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from utils.file_manifest import FileManifest
+
+
+@dataclass(frozen=True)
+class ManifestEntry:
+    path: str
+    # name of the datablock (tar file) containing the file
+    datablock: str
+    # offset of the data of the file within the datablock, -1 if unknown
+    offset: int
+    size: int
+    chk: str | None
+
+
+class DatasetManifest:
+    """Binary index of an archived dataset, mapping every file to its datablock, the offset of its data within
+    the datablock, its size and its md5 checksum.
+
+    Stored next to the datablocks, such that the content of an archived dataset is known without SciCat or
+    the datablocks themselves. The format is a fixed header followed by a zlib compressed body of columns:
+    the datablock names and the file paths as NUL separated strings, then the datablock indices, offsets and
+    sizes as little-endian arrays and the raw checksum digests. Loading it is a decompression and a few
+    array copies.
+    """
+
+    MAGIC = b"SADM"
+    VERSION = 1
+    # magic, version, number of datablocks, number of files
+    _HEADER = struct.Struct("<4sHIQ")
+    _SECTION_LENGTH = struct.Struct("<Q")
+    _DIGEST_SIZE = 16
+    # digest of files without checksum, e.g. directories
+    _NO_DIGEST = bytes(_DIGEST_SIZE)
+
+    def __init__(
+        self,
+        datablocks: List[str],
+        paths: List[str],
+        datablock_indices: array,
+        offsets: array,
+        sizes: array,
+        digests: bytes,
+    ):
+        self.datablocks = datablocks
+        self.paths = paths
+        self.datablock_indices = datablock_indices
+        self.offsets = offsets
+        self.sizes = sizes
+        self._digests = digests
+        self._index: Dict[str, int] | None = None
+
+    @staticmethod
+    def from_file_manifests(datablocks: Iterable[Tuple[str, FileManifest]]) -> "DatasetManifest":
+        """Creates the manifest of a dataset from the manifests of its datablocks
+
+        Args:
+            datablocks (Iterable[Tuple[str, FileManifest]]): name and files of every datablock
+
+        Raises:
+            ValueError: if a checksum is not an md5 digest
+        """
+        names: List[str] = []
+        paths: List[str] = []
+        datablock_indices = array("I")
+        offsets = array("q")
+        sizes = array("q")
+        digests = bytearray()
+        for idx, (name, files) in enumerate(datablocks):
+            names.append(name)
+            paths.extend(files.paths)
+            datablock_indices.extend([idx] * len(files))
+            offsets.extend(files.offsets)
+            sizes.extend(files.sizes)
+            for path, chk in zip(files.paths, files.checksums):
+                digest = DatasetManifest._NO_DIGEST if chk is None else bytes.fromhex(chk)
+                if len(digest) != DatasetManifest._DIGEST_SIZE:
+                    raise ValueError(f"Checksum of {path} is not an md5 digest")
+                digests += digest
+        return DatasetManifest(names, paths, datablock_indices, offsets, sizes, bytes(digests))
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __getitem__(self, idx: int) -> ManifestEntry:
+        return ManifestEntry(
+            path=self.paths[idx],
+            datablock=self.datablocks[self.datablock_indices[idx]],
+            offset=self.offsets[idx],
+            size=self.sizes[idx],
+            chk=self.checksum(idx),
+        )
+
+    def checksum(self, idx: int) -> str | None:
+        if idx < 0:
+            idx += len(self)
+        digest = self._digests[idx * self._DIGEST_SIZE : (idx + 1) * self._DIGEST_SIZE]
+        return None if digest == self._NO_DIGEST else digest.hex()
+
+    def find(self, path: str) -> ManifestEntry | None:
+        """Entry of a file by its path within the dataset"""
+        if self._index is None:
+            self._index = {p: idx for idx, p in enumerate(self.paths)}
+        idx = self._index.get(path)
+        return None if idx is None else self[idx]
+
+    def files_of(self, datablock: str) -> List[ManifestEntry]:
+        idx = self.datablocks.index(datablock)
+        return [self[i] for i, d in enumerate(self.datablock_indices) if d == idx]
+
+    def total_size(self) -> int:
+        return sum(s for s in self.sizes if s > 0)
+
+    @staticmethod
+    def _little_endian(a: array) -> bytes:
+        if sys.byteorder == "big":
+            a = array(a.typecode, a)
+            a.byteswap()
+        return a.tobytes()
+
+    def to_bytes(self) -> bytes:
+        sections = [
+            "\0".join(self.datablocks).encode(),
+            "\0".join(self.paths).encode(),
+            self._little_endian(self.datablock_indices),
+            self._little_endian(self.offsets),
+            self._little_endian(self.sizes),
+            self._digests,
+        ]
+        body = b"".join(self._SECTION_LENGTH.pack(len(s)) + s for s in sections)
+        header = self._HEADER.pack(self.MAGIC, self.VERSION, len(self.datablocks), len(self.paths))
+        return header + zlib.compress(body)
+
+    @staticmethod
+    def from_bytes(data: bytes) -> "DatasetManifest":
+        """Loads a manifest written by `to_bytes`
+
+        Raises:
+            ValueError: if the data is not a manifest of a supported version
+        """
+        magic, version, num_datablocks, num_files = DatasetManifest._HEADER.unpack_from(data)
+        if magic != DatasetManifest.MAGIC or version != DatasetManifest.VERSION:
+            raise ValueError(f"Unsupported dataset manifest (magic {magic!r}, version {version})")
+        body = memoryview(zlib.decompress(data[DatasetManifest._HEADER.size :]))
+
+        sections: List[bytes] = []
+        pos = 0
+        while pos < len(body):
+            (length,) = DatasetManifest._SECTION_LENGTH.unpack_from(body, pos)
+            pos += DatasetManifest._SECTION_LENGTH.size
+            sections.append(bytes(body[pos : pos + length]))
+            pos += length
+        names, paths, indices_bytes, offsets_bytes, sizes_bytes, digests = sections
+
+        def column(typecode: str, raw: bytes) -> array:
+            a = array(typecode)
+            a.frombytes(raw)
+            if sys.byteorder == "big":
+                a.byteswap()
+            return a
+
+        manifest = DatasetManifest(
+            datablocks=names.decode().split("\0") if num_datablocks > 0 else [],
+            paths=paths.decode().split("\0") if num_files > 0 else [],
+            datablock_indices=column("I", indices_bytes),
+            offsets=column("q", offsets_bytes),
+            sizes=column("q", sizes_bytes),
+            digests=digests,
+        )
+        if len(manifest.paths) != num_files or len(manifest.datablocks) != num_datablocks:
+            raise ValueError("Dataset manifest is corrupted")
+        return manifest
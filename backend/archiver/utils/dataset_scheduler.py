@@ -0,0 +1,179 @@
+from __future__ import annotations
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Generator
+
+from config.variables import Variables
+from utils.json_ledger import locked_json_ledger
+from utils.log import getLogger
+
+
+class DatasetScheduler:
+    """Decides which of the datasets waiting on a node is archived or retrieved next.
+
+    Datasets are split into two size lanes with their own slots, such that a few large datasets never occupy
+    all slots and small datasets keep flowing past them. Small datasets may use an idle slot of the large lane
+    as long as no large dataset is waiting. Within a lane, waiting datasets are ordered by a virtual deadline:
+    the time they started waiting plus the time to transfer them at `seconds_per_byte`, minus a bonus for
+    their priority. Smaller and higher priority datasets therefore go first, while every dataset ages towards
+    the front of the queue as newer ones arrive behind it.
+
+    The state is kept in a file in the scratch folder and guarded by a file lock, such that all worker
+    processes of a node share the slots. Flow runs live in separate containers, so a slot is a lease that its
+    holder refreshes while it runs (see `slot`). Slots not refreshed within `STALE_HOLDER_S` are reclaimed.
+    """
+
+    ARCHIVAL = "archival"
+    RETRIEVAL = "retrieval"
+    # how much earlier a dataset is scheduled than an archival of the same size started at the same time
+    PRIORITY_BONUS_S = {RETRIEVAL: 3600.0, ARCHIVAL: 0.0}
+
+    SMALL = "small"
+    LARGE = "large"
+
+    POLL_INTERVAL_S = 10
+    # waiting entries not refreshed within this time are considered abandoned
+    STALE_WAITER_S = 5 * POLL_INTERVAL_S
+    # running entries not refreshed within this time are considered abandoned, e.g. of a killed container
+    HEARTBEAT_INTERVAL_S = POLL_INTERVAL_S
+    STALE_HOLDER_S = 5 * HEARTBEAT_INTERVAL_S
+
+    def __init__(
+        self,
+        ledger_file: Path,
+        slots: int,
+        large_slots: int,
+        large_size: int,
+        seconds_per_byte: float,
+    ):
+        self._ledger_file = ledger_file
+        self._slots = {
+            DatasetScheduler.SMALL: max(1, slots - large_slots),
+            DatasetScheduler.LARGE: max(1, min(large_slots, slots - 1)),
+        }
+        self._large_size = large_size
+        self._seconds_per_byte = seconds_per_byte
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_variables() -> DatasetScheduler:
+        GB_TO_B = 1024 * 1024 * 1024
+        MB_TO_B = 1024 * 1024
+        return DatasetScheduler(
+            ledger_file=Variables().ARCHIVER_SCRATCH_FOLDER / ".dataset-schedule",
+            slots=Variables().ARCHIVER_MAX_CONCURRENT_DATASETS,
+            large_slots=Variables().ARCHIVER_LARGE_DATASET_SLOTS,
+            large_size=Variables().ARCHIVER_LARGE_DATASET_SIZE_GB * GB_TO_B,
+            seconds_per_byte=1.0 / (Variables().ARCHIVER_SCHEDULING_THROUGHPUT_MB_S * MB_TO_B),
+        )
+
+    @contextmanager
+    def _ledger(self) -> Generator[Dict[str, Any], None, None]:
+        with self._lock, locked_json_ledger(self._ledger_file, {"running": {}, "waiting": {}}) as ledger:
+            yield ledger
+
+    def lane(self, size: int) -> str:
+        return DatasetScheduler.LARGE if size >= self._large_size else DatasetScheduler.SMALL
+
+    def deadline(self, kind: str, size: int, waiting_since: float) -> float:
+        """Virtual deadline of a dataset, waiting datasets are started in increasing order"""
+        return waiting_since + size * self._seconds_per_byte - self.PRIORITY_BONUS_S[kind]
+
+    def try_acquire(self, dataset_id: str, kind: str, size: int) -> bool:
+        """Starts a dataset if a slot is free and no waiting dataset with an earlier deadline would take it.
+        Otherwise the dataset is queued (or its place in the queue is kept) and False is returned.
+        """
+        now = time.time()
+        with self._ledger() as ledger:
+            running: Dict[str, Dict[str, Any]] = ledger["running"]
+            if dataset_id in running:
+                return True
+            # slots of holders that stopped refreshing them without releasing them
+            for id in [id for id, r in running.items() if now - r.get("refreshed", 0) >= self.STALE_HOLDER_S]:
+                getLogger().warning(f"Reclaiming the slot of dataset {id}, its lease expired")
+                del running[id]
+
+            waiting: Dict[str, Dict[str, Any]] = {
+                id: w for id, w in ledger["waiting"].items() if now - w["refreshed"] < self.STALE_WAITER_S
+            }
+            entry = ledger["waiting"].get(dataset_id, {"since": now})
+            waiting[dataset_id] = {"kind": kind, "size": size, "since": entry["since"], "refreshed": now}
+            ledger["waiting"] = waiting
+
+            free = {lane: num_slots for lane, num_slots in self._slots.items()}
+            for r in running.values():
+                free[r["lane"]] -= 1
+            large_waiting = any(self.lane(w["size"]) == DatasetScheduler.LARGE for w in waiting.values())
+
+            def deadline(id: str) -> float:
+                return self.deadline(waiting[id]["kind"], waiting[id]["size"], waiting[id]["since"])
+
+            for id in sorted(waiting, key=deadline):
+                lane = self.lane(waiting[id]["size"])
+                if free[lane] <= 0 and lane == DatasetScheduler.SMALL and not large_waiting:
+                    lane = DatasetScheduler.LARGE
+                if free[lane] <= 0:
+                    continue
+                if id == dataset_id:
+                    del waiting[id]
+                    running[id] = {"kind": kind, "size": size, "lane": lane, "refreshed": now}
+                    return True
+                # the slot is left to the dataset with the earlier deadline
+                free[lane] -= 1
+            return False
+
+    def acquire(self, dataset_id: str, kind: str, size: int) -> None:
+        """Blocks until the dataset is scheduled"""
+        waiting = False
+        while not self.try_acquire(dataset_id, kind, size):
+            if not waiting:
+                getLogger().info(f"Dataset {dataset_id} ({kind}, {size} B) is waiting for a slot")
+                waiting = True
+            time.sleep(self.POLL_INTERVAL_S)
+        getLogger().info(f"Scheduled {kind} of dataset {dataset_id} ({size} B)")
+
+    def heartbeat(self, dataset_id: str) -> None:
+        """Refreshes the lease of a running dataset"""
+        with self._ledger() as ledger:
+            if dataset_id in ledger["running"]:
+                ledger["running"][dataset_id]["refreshed"] = time.time()
+
+    def release(self, dataset_id: str) -> None:
+        with self._ledger() as ledger:
+            ledger["running"].pop(dataset_id, None)
+            ledger["waiting"].pop(dataset_id, None)
+
+    @contextmanager
+    def slot(self, dataset_id: str, kind: str, size: int):
+        """Holds a slot of the scheduler while the block runs, refreshing its lease in the background
+
+        Usage:
+            with DatasetScheduler.from_variables().slot(dataset_id, DatasetScheduler.ARCHIVAL, size):
+                archive_single_dataset_flow(dataset_id=dataset_id)
+        """
+        stop = threading.Event()
+
+        def refresh():
+            while not stop.wait(self.HEARTBEAT_INTERVAL_S):
+                try:
+                    self.heartbeat(dataset_id)
+                except Exception as e:
+                    getLogger().warning(f"Failed to refresh the slot of dataset {dataset_id}: {e}")
+
+        heartbeat = threading.Thread(target=refresh, name=f"slot-heartbeat-{dataset_id}", daemon=True)
+        try:
+            self.acquire(dataset_id, kind, size)
+            heartbeat.start()
+            yield
+        finally:
+            stop.set()
+            if heartbeat.is_alive():
+                heartbeat.join()
+            self.release(dataset_id)
+
+    def running(self) -> Dict[str, str]:
+        """Lanes of the datasets currently holding a slot"""
+        with self._ledger() as ledger:
+            return {id: r["lane"] for id, r in ledger["running"].items()}
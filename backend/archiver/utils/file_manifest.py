@@ -0,0 +1,192 @@
+import datetime
+import itertools
+import math
+import tarfile
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Sequence, overload
+
+from pydantic import GetCoreSchemaHandler
+from pydantic_core import core_schema
+
+from utils.model import DataFile
+
+# marks a missing size, uid, gid or perm in the integer columns
+_MISSING = -1
+
+
+class FileManifest(Sequence[DataFile]):
+    """Entries of packed files stored as parallel arrays, one per field, instead of one `DataFile` per file.
+    Besides the fields of a `DataFile`, the offset of the data of a file within its tar file is kept.
+
+    Filtering, sorting and summing sizes work on the columns; `DataFile`s are only created when entries are
+    accessed, i.e. when datablocks are built for SciCat. Serialized as one JSON list per column.
+    """
+
+    def __init__(self):
+        self.paths: List[str] = []
+        self.checksums: List[str | None] = []
+        self.sizes = array("q")
+        self.uids = array("q")
+        self.gids = array("q")
+        self.perms = array("q")
+        # modification times in seconds since the epoch, nan if unknown
+        self.mtimes = array("d")
+        # offsets of the data of the files within the tar file, -1 if unknown
+        self.offsets = array("q")
+
+    def append(
+        self,
+        path: str,
+        size: int | None = None,
+        chk: str | None = None,
+        uid: int | None = None,
+        gid: int | None = None,
+        perm: int | None = None,
+        mtime: float | None = None,
+        offset: int | None = None,
+    ) -> None:
+        self.paths.append(path)
+        self.checksums.append(chk)
+        self.sizes.append(_MISSING if size is None else size)
+        self.uids.append(_MISSING if uid is None else uid)
+        self.gids.append(_MISSING if gid is None else gid)
+        self.perms.append(_MISSING if perm is None else perm)
+        self.mtimes.append(math.nan if mtime is None else mtime)
+        self.offsets.append(_MISSING if offset is None else offset)
+
+    def append_tar_info(
+        self, tar_info: tarfile.TarInfo, chk: str | None, offset: int | None = None
+    ) -> None:
+        self.append(
+            tar_info.path,
+            tar_info.size,
+            chk,
+            uid=tar_info.uid,
+            gid=tar_info.gid,
+            perm=tar_info.mode,
+            mtime=tar_info.mtime,
+            offset=offset,
+        )
+
+    @staticmethod
+    def from_datafiles(files: Iterable[DataFile | Dict[str, Any]]) -> "FileManifest":
+        manifest = FileManifest()
+        for f in files:
+            if not isinstance(f, DataFile):
+                f = DataFile.model_validate(f)
+            manifest.append(
+                f.path,
+                f.size,
+                f.chk,
+                None if f.uid is None else int(f.uid),
+                None if f.gid is None else int(f.gid),
+                None if f.perm is None else int(f.perm),
+                None if f.time is None else datetime.datetime.fromisoformat(f.time).timestamp(),
+            )
+        return manifest
+
+    def total_size(self) -> int:
+        """Sum of the sizes of all files, files of unknown size excluded"""
+        return sum(self.sizes) + self.sizes.count(_MISSING)
+
+    def take(self, indices: Iterable[int]) -> "FileManifest":
+        """Manifest of the entries at the given indices, in their order"""
+        indices = list(indices)
+        manifest = FileManifest()
+        manifest.paths = [self.paths[i] for i in indices]
+        manifest.checksums = [self.checksums[i] for i in indices]
+        for name in ("sizes", "uids", "gids", "perms", "mtimes", "offsets"):
+            column: array = getattr(self, name)
+            setattr(manifest, name, array(column.typecode, (column[i] for i in indices)))
+        return manifest
+
+    def filter(self, mask: Iterable[bool]) -> "FileManifest":
+        """Manifest of the entries where the mask is true, e.g. `m.filter(s > 0 for s in m.sizes)`"""
+        return self.take(itertools.compress(range(len(self)), mask))
+
+    def sorted_by(self, column: Sequence[Any], reverse: bool = False) -> "FileManifest":
+        """Manifest sorted by one of its columns, e.g. `manifest.sorted_by(manifest.paths)`"""
+        return self.take(sorted(range(len(self)), key=column.__getitem__, reverse=reverse))
+
+    def to_datafiles(self) -> List[DataFile]:
+        return list(self)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    @overload
+    def __getitem__(self, idx: int) -> DataFile: ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[DataFile]: ...
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        mtime = self.mtimes[idx]
+        time = None if math.isnan(mtime) else datetime.datetime.fromtimestamp(mtime, datetime.UTC)
+        return DataFile(
+            path=self.paths[idx],
+            size=None if self.sizes[idx] == _MISSING else self.sizes[idx],
+            chk=self.checksums[idx],
+            uid=None if self.uids[idx] == _MISSING else str(self.uids[idx]),
+            gid=None if self.gids[idx] == _MISSING else str(self.gids[idx]),
+            perm=None if self.perms[idx] == _MISSING else str(self.perms[idx]),
+            time=None if time is None else time.isoformat(),
+        )
+
+    def __iter__(self) -> Iterator[DataFile]:
+        return (self[i] for i in range(len(self)))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FileManifest):
+            return NotImplemented
+        return self.to_columns() == other.to_columns()
+
+    def __repr__(self) -> str:
+        return f"FileManifest({len(self)} files, {self.total_size()} bytes)"
+
+    def to_columns(self) -> Dict[str, List[Any]]:
+        return {
+            "path": self.paths,
+            "chk": self.checksums,
+            "size": self.sizes.tolist(),
+            "uid": self.uids.tolist(),
+            "gid": self.gids.tolist(),
+            "perm": self.perms.tolist(),
+            # nan is not valid JSON
+            "mtime": [None if math.isnan(t) else t for t in self.mtimes],
+            "offset": self.offsets.tolist(),
+        }
+
+    @staticmethod
+    def from_columns(columns: Dict[str, List[Any]]) -> "FileManifest":
+        manifest = FileManifest()
+        manifest.paths = list(columns["path"])
+        manifest.checksums = list(columns["chk"])
+        manifest.sizes = array("q", columns["size"])
+        manifest.uids = array("q", columns["uid"])
+        manifest.gids = array("q", columns["gid"])
+        manifest.perms = array("q", columns["perm"])
+        manifest.mtimes = array("d", (math.nan if t is None else t for t in columns["mtime"]))
+        manifest.offsets = array("q", columns.get("offset", [_MISSING] * len(manifest.paths)))
+        if any(len(c) != len(manifest.paths) for c in columns.values()):
+            raise ValueError("Columns of the file manifest differ in length")
+        return manifest
+
+    @classmethod
+    def parse(cls, value: Any) -> "FileManifest":
+        """Manifest from its columns, or from a list of data files as stored before manifests were columnar"""
+        if isinstance(value, FileManifest):
+            return value
+        if isinstance(value, dict):
+            return cls.from_columns(value)
+        return cls.from_datafiles(value)
+
+    @classmethod
+    def __get_pydantic_core_schema__(
+        cls, source: Any, handler: GetCoreSchemaHandler
+    ) -> core_schema.CoreSchema:
+        return core_schema.no_info_plain_validator_function(
+            cls.parse, serialization=core_schema.plain_serializer_function_ser_schema(cls.to_columns)
+        )
@@ -0,0 +1,45 @@
+import copy
+import fcntl
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Generator
+
+
+@contextmanager
+def locked_json_ledger(ledger_file: Path, defaults: Dict[str, Any]) -> Generator[Dict[str, Any], None, None]:
+    """Opens a JSON ledger shared by the processes of a node, under an exclusive file lock.
+
+    The ledger is read when the block is entered and written back when it exits without an error. An empty
+    or unreadable file is read as an empty ledger. Missing keys are set to (copies of) their `defaults`.
+    The file lock does not exclude the threads of a process, callers hold a thread lock around it.
+
+    Usage:
+        with locked_json_ledger(path, {"running": {}}) as ledger:
+            ledger["running"][dataset_id] = ...
+    """
+    ledger_file.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(ledger_file, os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        content = b""
+        while chunk := os.read(fd, 1 << 16):
+            content += chunk
+        try:
+            ledger = json.loads(content)
+        except ValueError:
+            ledger = {}
+        if not isinstance(ledger, dict):
+            ledger = {}
+        for key, default in defaults.items():
+            ledger.setdefault(key, copy.deepcopy(default))
+
+        yield ledger
+
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.ftruncate(fd, 0)
+        os.write(fd, json.dumps(ledger).encode())
+    finally:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
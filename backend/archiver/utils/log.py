@@ -1,9 +1,16 @@
 import prefect
+import dataclasses
 import logging
 import functools
 import os
+import reprlib
+import threading
 
-from prefect.context import MissingContextError
+from prefect.context import FlowRunContext, TaskRunContext
+from pydantic import BaseModel
+
+
+_cache = threading.local()
 
 
 def getLogger():
@@ -13,47 +20,106 @@ def getLogger():
     - Prefect Flow: returns the logger from the prefect flow run context
     - Prefect error callback: there might not be a logger available, falls back to
         a logger from logging package
+
+    The logger of a run is cached per thread by the id of the run, such that the cache does not keep the
+    context of a finished run alive.
     """
     if "PYTEST_CURRENT_TEST" in os.environ:
         return logging.getLogger(name="TestLogger")
-    else:
-        try:
-            prefect_logger = prefect.get_run_logger()
-            return prefect_logger
-        except MissingContextError:
-            return logging.getLogger(name="FallbackLogger")
-        except Exception:
-            return logging.getLogger(name="FallbackLogger")
+
+    context = TaskRunContext.get() or FlowRunContext.get()
+    if context is None:
+        return logging.getLogger(name="FallbackLogger")
+    run = context.task_run if isinstance(context, TaskRunContext) else context.flow_run
+    run_id = getattr(run, "id", None)
+    if run_id is not None and getattr(_cache, "run_id", None) == run_id:
+        return _cache.logger
+    try:
+        logger = prefect.get_run_logger()
+    except Exception:
+        return logging.getLogger(name="FallbackLogger")
+    _cache.run_id = run_id
+    _cache.logger = logger
+    return logger
 
 
 __attributes__ = ["getLogger"]
 
 
-def log(func):
-    @functools.wraps(func)
-    def wrapper_decorator(*args, **kwargs):
-        args_repr = [repr(a) for a in args]
-        kwargs_repr = [f"{k}={repr(v)}" for k, v in kwargs.items()]
-        signature = ", ".join(args_repr + kwargs_repr)
-        getLogger().info(f"Function {func.__name__}({signature[:500]})")
-        value = func(*args, **kwargs)
-        value_repr = str(value)[:200]
-        getLogger().info(f"Function {func.__name__}() - returned {value_repr}")
-        return value
+class _BoundedRepr(reprlib.Repr):
+    """Repr limiting the number of items and the length of strings shown, also of the fields of pydantic
+    models and dataclasses, such that large arguments (e.g. datablocks with all their files) are never
+    formatted in full.
+    """
 
-    return wrapper_decorator
+    def __init__(self):
+        super().__init__()
+        self.maxlevel = 3
+        self.maxlist = self.maxtuple = self.maxset = self.maxdict = 10
+        self.maxstring = self.maxother = 100
 
+    def repr_instance(self, x, level):
+        if isinstance(x, BaseModel):
+            fields = x.__dict__
+        elif dataclasses.is_dataclass(x) and not isinstance(x, type):
+            fields = {f.name: getattr(x, f.name) for f in dataclasses.fields(x)}
+        else:
+            return super().repr_instance(x, level)
+        if level <= 0:
+            return f"{type(x).__name__}(...)"
+        shown = [f"{k}={self.repr1(v, level - 1)}" for k, v in list(fields.items())[: self.maxdict]]
+        if len(fields) > self.maxdict:
+            shown.append("...")
+        return f"{type(x).__name__}({', '.join(shown)})"
 
-def log_debug(func):
+
+_bounded_repr = _BoundedRepr()
+
+
+class _Call:
+    """Formats the arguments of a call only when the log record is emitted"""
+
+    MAX_LENGTH = 500
+
+    def __init__(self, args, kwargs):
+        self._args = args
+        self._kwargs = kwargs
+
+    def __str__(self) -> str:
+        args_repr = [_bounded_repr.repr(a) for a in self._args]
+        kwargs_repr = [f"{k}={_bounded_repr.repr(v)}" for k, v in self._kwargs.items()]
+        return ", ".join(args_repr + kwargs_repr)[: self.MAX_LENGTH]
+
+
+class _Value:
+    """Formats a return value only when the log record is emitted"""
+
+    MAX_LENGTH = 200
+
+    def __init__(self, value):
+        self._value = value
+
+    def __str__(self) -> str:
+        return _bounded_repr.repr(self._value)[: self.MAX_LENGTH]
+
+
+def _logged(func, level: int):
     @functools.wraps(func)
     def wrapper_decorator(*args, **kwargs):
-        args_repr = [repr(a) for a in args]
-        kwargs_repr = [f"{k}={repr(v)}" for k, v in kwargs.items()]
-        signature = ", ".join(args_repr + kwargs_repr)
-        getLogger().debug(f"Function {func.__name__}({signature[:500]})")
+        logger = getLogger()
+        if not logger.isEnabledFor(level):
+            return func(*args, **kwargs)
+        logger.log(level, "Function %s(%s)", func.__name__, _Call(args, kwargs))
         value = func(*args, **kwargs)
-        value_repr = str(value)[:200]
-        getLogger().debug(f"Function {func.__name__}() - returned {value_repr}")
+        logger.log(level, "Function %s() - returned %s", func.__name__, _Value(value))
         return value
 
     return wrapper_decorator
+
+
+def log(func):
+    return _logged(func, logging.INFO)
+
+
+def log_debug(func):
+    return _logged(func, logging.DEBUG)
@@ -0,0 +1,77 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Generator, Iterable, List, Type, TypeVar
+
+from pydantic import BaseModel, TypeAdapter
+
+from flows.flow_utils import StoragePaths, SystemError
+
+T = TypeVar("T")
+
+
+class ResultRef(BaseModel):
+    """Reference to a list of task results stored as a manifest on scratch. Returned by tasks with large
+    results instead of the results themselves, such that Prefect only stores and passes around the reference.
+    """
+
+    path: Path
+    count: int
+    sha256: str
+
+
+def result_manifest_path(dataset_id: str, name: str) -> Path:
+    return StoragePaths.scratch_folder(dataset_id) / ".results" / f"{name}.jsonl"
+
+
+def save_results(dataset_id: str, name: str, items: Iterable[T], item_type: Type[T]) -> ResultRef:
+    """Writes results to a manifest on scratch, one json document per line
+
+    Args:
+        dataset_id (str): dataset the results belong to
+        name (str): name of the manifest, unique within the dataset
+        items (Iterable[T]): results, pydantic models or dataclasses
+        item_type (Type[T]): type of the results
+
+    Returns:
+        ResultRef: reference to the manifest
+    """
+    adapter = TypeAdapter(item_type)
+    path = result_manifest_path(dataset_id, name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+
+    sha256 = hashlib.sha256()
+    count = 0
+    with open(tmp, "wb") as f:
+        for item in items:
+            line = adapter.dump_json(item) + b"\n"
+            sha256.update(line)
+            f.write(line)
+            count += 1
+    os.replace(tmp, path)
+    return ResultRef(path=path, count=count, sha256=sha256.hexdigest())
+
+
+def iter_results(ref: ResultRef, item_type: Type[T]) -> Generator[T, None, None]:
+    """Reads the results of a manifest one at a time
+
+    Raises:
+        SystemError: if the manifest is missing or its content does not match the checksum of the reference.
+            A mismatch is only detected once all results are read.
+    """
+    adapter = TypeAdapter(item_type)
+    if not ref.path.exists():
+        raise SystemError(f"Result manifest {ref.path} does not exist")
+
+    sha256 = hashlib.sha256()
+    with open(ref.path, "rb") as f:
+        for line in f:
+            sha256.update(line)
+            yield adapter.validate_json(line)
+    if sha256.hexdigest() != ref.sha256:
+        raise SystemError(f"Result manifest {ref.path} does not match its checksum")
+
+
+def load_results(ref: ResultRef, item_type: Type[T]) -> List[T]:
+    return list(iter_results(ref, item_type))
@@ -1,19 +1,23 @@
 from __future__ import annotations
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import functools
+import json
+import math
+import os
+import threading
 import time
-from typing import Callable, List
+from typing import Callable, Dict, List
 import boto3
-from boto3.s3.transfer import TransferConfig
 from botocore.client import Config
 
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
 from pathlib import Path
 
 from pydantic import SecretStr
 
 from .log import log_debug, log, getLogger
+from .bandwidth_governor import S3Governor
 
 from config.variables import Variables
 from config.blocks import Blocks
@@ -33,11 +37,14 @@ class Bucket:
 
 
 class S3Storage:
-    def __init__(self, url: str, user: str, password: SecretStr, region: str):
+    def __init__(
+        self, url: str, user: str, password: SecretStr, region: str, governor: S3Governor | None = None
+    ):
         self._URL = url
         self._USER = user
         self._PASSWORD = password
         self._REGION = region
+        self._governor = governor or S3Governor()
 
         self._client = boto3.client(
             "s3",
@@ -62,13 +69,18 @@ class S3Storage:
 
         self._client.meta.events.register("before-send.s3.PutObject", remove_expect_header)
 
-        def force_standard_storage_class(params, **kwargs):
-            params["StorageClass"] = "GLACIER"
+        def throttle_request(**kwargs):
+            self._governor.request()
 
-        self._client.meta.events.register("provide-client-params.s3.PutObject", force_standard_storage_class)
+        self._client.meta.events.register("before-send.s3", throttle_request)
+
+        def default_glacier_storage_class(params, **kwargs):
+            params.setdefault("StorageClass", "GLACIER")
+
+        self._client.meta.events.register("provide-client-params.s3.PutObject", default_glacier_storage_class)
         self._client.meta.events.register(
             "provide-client-params.s3.CreateMultipartUpload",
-            force_standard_storage_class,
+            default_glacier_storage_class,
         )
         self._external_s3_client = boto3.client(
             "s3",
@@ -121,15 +133,41 @@ class S3Storage:
     @dataclass
     class StatInfo:
         Size: int
+        Metadata: Dict[str, str] = field(default_factory=dict)
 
     @log_debug
     def stat_object(self, bucket: Bucket, filename: str) -> StatInfo | None:
         try:
             object = self._client.head_object(Bucket=bucket.name, Key=filename)
-            return S3Storage.StatInfo(Size=object["ContentLength"])
+            return S3Storage.StatInfo(Size=object["ContentLength"], Metadata=object.get("Metadata", {}))
         except Exception:
             return None
 
+    @log_debug
+    def put_bytes(
+        self,
+        bucket: Bucket,
+        key: str,
+        data: bytes,
+        metadata: Dict[str, str] | None = None,
+        storage_class: str | None = None,
+    ) -> None:
+        """Stores a small object, e.g. a manifest, without going through a file. Objects are stored in the
+        GLACIER storage class unless another one is given.
+        """
+        extra_args = {"StorageClass": storage_class} if storage_class is not None else {}
+        self._client.put_object(Bucket=bucket.name, Key=key, Body=data, Metadata=metadata or {}, **extra_args)
+
+    @log_debug
+    def get_bytes(self, bucket: Bucket, key: str, restore: bool = True) -> bytes:
+        """Reads a small object. Objects stored in another storage class than GLACIER are read without
+        restoring them, with `restore=False`.
+        """
+        if restore:
+            self.restore_objects(bucket=bucket, objects=[key])
+            self.check_restore(bucket=bucket, object=key)
+        return self._client.get_object(Bucket=bucket.name, Key=key)["Body"].read()
+
     @log_debug
     def fget_object(self, bucket: Bucket, folder: str, object_name: str, target_path: Path) -> None:
         self.restore_objects(bucket=Bucket, objects=[object_name])
@@ -151,6 +189,8 @@ class S3Storage:
                 },
             )
 
+    RESTORE_POLL_INTERVAL_S = 60
+
     @log
     def check_restore(self, bucket: Bucket, object: str) -> None:
         while True:
@@ -160,13 +200,49 @@ class S3Storage:
             if 'ongoing-request="false"' in restore_status:
                 getLogger().info("Restore complete, ready to download")
                 break
-            getLogger().debug("Still restoring, waiting 60s...")
-            time.sleep(60)
+            getLogger().debug(f"Still restoring, waiting {S3Storage.RESTORE_POLL_INTERVAL_S}s...")
+            time.sleep(S3Storage.RESTORE_POLL_INTERVAL_S)
+
+    @dataclass
+    class PartialDownload:
+        """State of an interrupted download, persisted in a sidecar file next to the `.part` file.
+        Ranges are inclusive byte ranges that have been completely written to the `.part` file.
+        """
+
+        ETag: str
+        Size: int
+        Ranges: List[List[int]] = field(default_factory=list)
+
+        @staticmethod
+        def load(sidecar: Path) -> S3Storage.PartialDownload | None:
+            try:
+                return S3Storage.PartialDownload(**json.loads(sidecar.read_text()))
+            except Exception:
+                return None
+
+        def save(self, sidecar: Path) -> None:
+            tmp = sidecar.with_name(sidecar.name + ".tmp")
+            tmp.write_text(json.dumps(asdict(self)))
+            os.replace(tmp, sidecar)
+
+        def missing_ranges(self, chunk_size: int):
+            for start in range(0, self.Size, chunk_size):
+                end = min(start + chunk_size, self.Size) - 1
+                if not any(s <= start and end <= e for s, e in self.Ranges):
+                    yield start, end
+
+    DOWNLOAD_CHUNK_SIZE = 100 * 1024 * 1024
 
     @log_debug
-    def download_file(self, obj, prefix, destination_folder, bucket):
-        item_name = Path(obj.key).name
-        item_dir = Path(obj.key).parent
+    def download_file(self, key: str, prefix: Path, destination_folder: Path, bucket: Bucket) -> Path:
+        """Downloads an object to `destination_folder`, keeping its path relative to `prefix`.
+
+        Data is written to a `.part` file first and only renamed to the final name once complete. The
+        completed byte ranges are recorded in a `.part.json` sidecar such that a retried download only
+        fetches the missing ranges, as long as the ETag of the object did not change in between.
+        """
+        item_name = Path(key).name
+        item_dir = Path(key).parent
         item_parent_dirs = item_dir.relative_to(prefix)
         local_filedir = destination_folder / item_parent_dirs
         local_filedir.mkdir(parents=True, exist_ok=True)
@@ -175,15 +251,46 @@ class S3Storage:
         if local_filepath.exists():
             return local_filepath
 
-        self.check_restore(bucket, obj.key)
-
-        config = TransferConfig(
-            multipart_threshold=100 * 1024 * 1024,
-            max_concurrency=2,
-            multipart_chunksize=100 * 1024 * 1024,
-        )
+        self.check_restore(bucket, key)
+
+        part_filepath = local_filedir / f"{item_name}.part"
+        sidecar_filepath = local_filedir / f"{item_name}.part.json"
+
+        head = self._client.head_object(Bucket=bucket.name, Key=key)
+        etag = head["ETag"]
+        size = head["ContentLength"]
+
+        state = S3Storage.PartialDownload.load(sidecar_filepath)
+        if state is None or state.ETag != etag or state.Size != size or not part_filepath.exists():
+            if state is not None:
+                getLogger().info(f"Discarding partial download of {key}, object changed")
+            state = S3Storage.PartialDownload(ETag=etag, Size=size)
+            part_filepath.write_bytes(b"")
+            state.save(sidecar_filepath)
+        elif len(state.Ranges) > 0:
+            getLogger().info(f"Resuming download of {key}")
+
+        with open(part_filepath, "r+b") as f:
+            for start, end in list(state.missing_ranges(S3Storage.DOWNLOAD_CHUNK_SIZE)):
+                response = self._client.get_object(
+                    Bucket=bucket.name, Key=key, Range=f"bytes={start}-{end}", IfMatch=etag
+                )
+                f.seek(start)
+                for chunk in response["Body"].iter_chunks(chunk_size=1024 * 1024):
+                    self._governor.transfer(len(chunk))
+                    f.write(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+                state.Ranges.append([start, end])
+                state.save(sidecar_filepath)
+
+        if part_filepath.stat().st_size != size:
+            raise IOError(
+                f"Downloaded {part_filepath.stat().st_size} bytes of {key}, expected {size} bytes"
+            )
 
-        self._client.download_file(bucket.name, obj.key, local_filepath, Config=config)
+        os.replace(part_filepath, local_filepath)
+        sidecar_filepath.unlink(missing_ok=True)
         return local_filepath
 
     @log
@@ -195,7 +302,7 @@ class S3Storage:
         progress_callback: Callable[[float], None] | None = None,
     ) -> List[Path]:
         remote_bucket = self._resource.Bucket(bucket.name)
-        objs = remote_bucket.objects.filter(Prefix=str(prefix))
+        objs = list(remote_bucket.objects.filter(Prefix=str(prefix)))
 
         self.restore_objects(bucket=bucket, objects=[obj.key for obj in objs])
 
@@ -208,18 +315,18 @@ class S3Storage:
                 executor.submit(
                     S3Storage.download_file,
                     self,
-                    key,
+                    obj.key,
                     prefix,
                     destination_folder,
                     bucket,
-                ): key
-                for key in objs
+                ): obj.key
+                for obj in objs
             }
 
             for future in as_completed(future_to_key):
                 count = count + 1
                 if progress_callback:
-                    progress_callback(count)
+                    progress_callback(count / len(objs))
                 exception = future.exception()
 
                 if not exception:
@@ -232,6 +339,8 @@ class S3Storage:
     @dataclass
     class ListedObject:
         Name: str
+        Size: int = 0
+        ETag: str = ""
 
     @log_debug
     def list_objects(self, bucket: Bucket, folder: str | None = None) -> List[S3Storage.ListedObject]:
@@ -242,22 +351,173 @@ class S3Storage:
 
         objects: List[S3Storage.ListedObject] = []
         for obj in objs:
-            objects.append(S3Storage.ListedObject(Name=obj.key))
+            objects.append(S3Storage.ListedObject(Name=obj.key, Size=obj.size, ETag=obj.e_tag))
 
         return objects
 
+    @dataclass
+    class MultipartUpload:
+        """State of a multipart upload, persisted in a sidecar file next to the uploaded file such that
+        an upload can be resumed after the process died.
+        """
+
+        Key: str
+        UploadId: str
+        Size: int
+        PartSize: int
+        # identity of the uploaded file, such that parts of an earlier version of it are never resumed
+        MTimeNs: int = 0
+        Inode: int = 0
+        Parts: Dict[str, str] = field(default_factory=dict)  # part number -> ETag
+
+        @staticmethod
+        def load(sidecar: Path) -> S3Storage.MultipartUpload | None:
+            try:
+                return S3Storage.MultipartUpload(**json.loads(sidecar.read_text()))
+            except Exception:
+                return None
+
+        def save(self, sidecar: Path) -> None:
+            tmp = sidecar.with_name(sidecar.name + ".tmp")
+            tmp.write_text(json.dumps(asdict(self)))
+            os.replace(tmp, sidecar)
+
+    UPLOAD_PART_SIZE = 64 * 1024 * 1024
+    UPLOAD_MAX_PARTS = 10000
+    UPLOAD_CONCURRENCY = 4
+
     @log
     def fput_object(self, source_file: Path, destination_file: Path, bucket: Bucket):
-        self._client.upload_file(
+        """Uploads a file. Files larger than a single part are uploaded as a resumable multipart upload,
+        see `multipart_upload`.
+        """
+        if source_file.stat().st_size <= S3Storage.UPLOAD_PART_SIZE:
+            self._governor.transfer(source_file.stat().st_size)
+            self._client.upload_file(
+                Bucket=bucket.name,
+                Key=str(destination_file),
+                Filename=str(source_file),
+                ExtraArgs={"StorageClass": "GLACIER"},
+            )
+            return
+
+        self.multipart_upload(source_file=source_file, destination_file=destination_file, bucket=bucket)
+
+    def _list_uploaded_parts(self, bucket: Bucket, key: str, upload_id: str) -> Dict[str, str] | None:
+        """Returns part number -> ETag of the parts uploaded so far, None if the upload does not exist"""
+        parts: Dict[str, str] = {}
+        try:
+            paginator = self._client.get_paginator("list_parts")
+            for page in paginator.paginate(Bucket=bucket.name, Key=key, UploadId=upload_id):
+                for part in page.get("Parts", []):
+                    parts[str(part["PartNumber"])] = part["ETag"]
+        except self._client.exceptions.NoSuchUpload:
+            return None
+        return parts
+
+    def _abort_stale_uploads(self, bucket: Bucket, key: str, keep_upload_id: str | None) -> None:
+        paginator = self._client.get_paginator("list_multipart_uploads")
+        for page in paginator.paginate(Bucket=bucket.name, Prefix=key):
+            for upload in page.get("Uploads", []):
+                if upload["Key"] != key or upload["UploadId"] == keep_upload_id:
+                    continue
+                getLogger().info(f"Aborting stale multipart upload {upload['UploadId']} of {key}")
+                self._client.abort_multipart_upload(Bucket=bucket.name, Key=key, UploadId=upload["UploadId"])
+
+    @log
+    def multipart_upload(self, source_file: Path, destination_file: Path, bucket: Bucket):
+        """Uploads a file in parts. The upload id and the ETags of completed parts are persisted in a
+        `.upload.json` sidecar next to the source file. A retried upload checks the parts that are actually
+        present on the server, only uploads the missing ones and aborts other pending uploads of the same key.
+        The upload is only resumed if the source file is the same, i.e. not re-created with the same size.
+        """
+        key = str(destination_file)
+        stat = source_file.stat()
+        size = stat.st_size
+        sidecar = source_file.with_name(f"{source_file.name}.upload.json")
+
+        state = S3Storage.MultipartUpload.load(sidecar)
+        completed: Dict[str, str] = {}
+        if state is not None and (
+            state.Key != key
+            or state.Size != size
+            or state.MTimeNs != stat.st_mtime_ns
+            or state.Inode != stat.st_ino
+        ):
+            state = None
+        if state is not None:
+            uploaded = self._list_uploaded_parts(bucket, key, state.UploadId)
+            if uploaded is None:
+                state = None
+            else:
+                # only trust parts the server has and that were recorded as completed by us
+                completed = {n: e for n, e in uploaded.items() if state.Parts.get(n) == e}
+                getLogger().info(f"Resuming upload of {key}, {len(completed)} parts already uploaded")
+
+        self._abort_stale_uploads(bucket, key, keep_upload_id=state.UploadId if state else None)
+
+        if state is None:
+            part_size = max(S3Storage.UPLOAD_PART_SIZE, math.ceil(size / S3Storage.UPLOAD_MAX_PARTS))
+            upload = self._client.create_multipart_upload(Bucket=bucket.name, Key=key, StorageClass="GLACIER")
+            state = S3Storage.MultipartUpload(
+                Key=key,
+                UploadId=upload["UploadId"],
+                Size=size,
+                PartSize=part_size,
+                MTimeNs=stat.st_mtime_ns,
+                Inode=stat.st_ino,
+            )
+
+        state.Parts = completed
+        state.save(sidecar)
+
+        lock = threading.Lock()
+        failed = threading.Event()
+
+        def upload_part(part_number: int) -> None:
+            if failed.is_set():
+                return
+            offset = (part_number - 1) * state.PartSize
+            with open(source_file, "rb") as f:
+                f.seek(offset)
+                data = f.read(state.PartSize)
+            self._governor.transfer(len(data))
+            try:
+                response = self._client.upload_part(
+                    Bucket=bucket.name,
+                    Key=key,
+                    UploadId=state.UploadId,
+                    PartNumber=part_number,
+                    Body=data,
+                )
+            except Exception:
+                # set right away, such that no worker starts another part before the failure is seen
+                failed.set()
+                raise
+            with lock:
+                state.Parts[str(part_number)] = response["ETag"]
+                state.save(sidecar)
+
+        num_parts = math.ceil(size / state.PartSize)
+        missing_parts = [n for n in range(1, num_parts + 1) if str(n) not in state.Parts]
+
+        with ThreadPoolExecutor(max_workers=S3Storage.UPLOAD_CONCURRENCY) as executor:
+            for future in as_completed([executor.submit(upload_part, n) for n in missing_parts]):
+                exception = future.exception()
+                if exception:
+                    # a failed upload stops sending parts, the remaining ones are sent when it is resumed
+                    executor.shutdown(wait=True, cancel_futures=True)
+                    raise exception
+
+        self._client.complete_multipart_upload(
             Bucket=bucket.name,
-            Key=str(destination_file),
-            Filename=str(source_file),
-            ExtraArgs={"StorageClass": "GLACIER"},
-            Config=TransferConfig(
-                multipart_threshold=64 * 1024 * 1024,
-                multipart_chunksize=64 * 1024 * 1024,
-            ),
+            Key=key,
+            UploadId=state.UploadId,
+            MultipartUpload={
+                "Parts": [{"PartNumber": n, "ETag": state.Parts[str(n)]} for n in range(1, num_parts + 1)]
+            },
         )
+        sidecar.unlink(missing_ok=True)
 
     @log
     def delete_objects(self, prefix: Path, bucket: Bucket) -> None:
@@ -291,4 +551,5 @@ def get_s3_client() -> S3Storage:
         user=Blocks().S3_USER,
         password=Blocks().S3_PASSWORD,
         region=Variables().S3_REGION,
+        governor=S3Governor.from_variables(),
     )
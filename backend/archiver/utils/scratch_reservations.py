@@ -0,0 +1,225 @@
+from __future__ import annotations
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Generator, Set, Tuple
+
+from config.variables import Variables
+from utils.json_ledger import locked_json_ledger
+from utils.log import getLogger
+from flows.flow_utils import StoragePaths, SystemError
+
+
+class ScratchReservations:
+    """Ledger of the scratch space reserved by the datasets in flight on a node.
+
+    The ledger is kept in a file next to the data and guarded by a file lock, such that all worker processes
+    sharing the scratch folder reserve space atomically. A reservation is granted if it fits into the free
+    space plus the space already written by the datasets holding a reservation, i.e. what is reserved but not
+    yet used counts as taken. Reservations that don't fit are queued and granted in the order they were
+    requested.
+
+    A reservation is a lease: the process holding it refreshes it from a heartbeat thread until it is
+    released. Reservations not refreshed within `STALE_HOLDER_S`, e.g. of a pod that was killed before
+    releasing them, are dropped.
+    """
+
+    POLL_INTERVAL_S = 30
+    # waiting entries not refreshed within this time are considered abandoned
+    STALE_WAITER_S = 5 * POLL_INTERVAL_S
+    HEARTBEAT_INTERVAL_S = POLL_INTERVAL_S
+    # reservations not refreshed within this time are considered abandoned
+    STALE_HOLDER_S = 5 * HEARTBEAT_INTERVAL_S
+    # reservations of folders moved to the trash are kept under this prefix until they are deleted
+    TRASH_PREFIX = ".trash/"
+
+    # reservations held by this process per ledger, refreshed by the heartbeat thread
+    _held: Dict[Path, Tuple[ScratchReservations, Set[str]]] = {}
+    _held_lock = threading.Lock()
+    _heartbeat: threading.Thread | None = None
+
+    def __init__(self, scratch_folder: Path, ledger_file: Path, folder_of: Callable[[str], Path]):
+        self._scratch_folder = scratch_folder
+        self._ledger_file = ledger_file
+        self._folder_of = folder_of
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_variables() -> ScratchReservations:
+        return ScratchReservations(
+            scratch_folder=Variables().ARCHIVER_SCRATCH_FOLDER,
+            ledger_file=Variables().ARCHIVER_SCRATCH_FOLDER / ".scratch-reservations",
+            folder_of=ScratchReservations._scratch_folder_of,
+        )
+
+    @staticmethod
+    def _scratch_folder_of(reservation_id: str) -> Path:
+        prefix = ScratchReservations.TRASH_PREFIX
+        if reservation_id.startswith(prefix):
+            return StoragePaths.scratch_trash_folder() / reservation_id.removeprefix(prefix)
+        return StoragePaths.scratch_folder(reservation_id)
+
+    @staticmethod
+    def trash_reservation_id(entry_name: str) -> str:
+        return f"{ScratchReservations.TRASH_PREFIX}{entry_name}"
+
+    @contextmanager
+    def _ledger(self) -> Generator[Dict[str, Any], None, None]:
+        with self._lock, locked_json_ledger(self._ledger_file, {"reserved": {}, "waiting": []}) as ledger:
+            # reservations written before they were leases
+            for id, r in ledger["reserved"].items():
+                if isinstance(r, int):
+                    ledger["reserved"][id] = {"bytes": r, "refreshed": time.time()}
+            yield ledger
+
+    def _hold(self, reservation_id: str) -> None:
+        with ScratchReservations._held_lock:
+            _, held = ScratchReservations._held.setdefault(self._ledger_file, (self, set()))
+            held.add(reservation_id)
+            if ScratchReservations._heartbeat is None:
+                ScratchReservations._heartbeat = threading.Thread(
+                    target=ScratchReservations._refresh_held,
+                    name="scratch-reservations-heartbeat",
+                    daemon=True,
+                )
+                ScratchReservations._heartbeat.start()
+
+    def _unhold(self, reservation_id: str) -> None:
+        with ScratchReservations._held_lock:
+            if self._ledger_file in ScratchReservations._held:
+                ScratchReservations._held[self._ledger_file][1].discard(reservation_id)
+
+    @staticmethod
+    def _refresh_held() -> None:
+        while True:
+            time.sleep(ScratchReservations.HEARTBEAT_INTERVAL_S)
+            with ScratchReservations._held_lock:
+                held = [(r, set(ids)) for r, ids in ScratchReservations._held.values() if len(ids) > 0]
+            for reservations, ids in held:
+                try:
+                    reservations.refresh(ids)
+                except Exception as e:
+                    getLogger().warning(f"Failed to refresh scratch reservations {ids}: {e}")
+
+    def refresh(self, reservation_ids: Set[str]) -> None:
+        """Extends the leases of reservations"""
+        now = time.time()
+        with self._ledger() as ledger:
+            for id in reservation_ids:
+                if id in ledger["reserved"]:
+                    ledger["reserved"][id]["refreshed"] = now
+
+    def _current_reservations(self, ledger: Dict[str, Any], now: float) -> Dict[str, Dict[str, Any]]:
+        """Reservations of the ledger, without the abandoned ones"""
+        reserved: Dict[str, Dict[str, Any]] = {}
+        for id, r in ledger["reserved"].items():
+            if now - r["refreshed"] < self.STALE_HOLDER_S:
+                reserved[id] = r
+            else:
+                getLogger().warning(f"Dropping scratch reservation of {id}, its lease expired")
+        ledger["reserved"] = reserved
+        return reserved
+
+    def _used_bytes(self, dataset_id: str) -> int:
+        total = 0
+        for root, _, files in os.walk(self._folder_of(dataset_id)):
+            for f in files:
+                try:
+                    total += (Path(root) / f).stat().st_size
+                except OSError:
+                    pass
+        return total
+
+    def try_reserve(self, dataset_id: str, num_bytes: int) -> bool:
+        """Reserves `num_bytes` for a dataset if they are available and no earlier request is waiting.
+        Otherwise the request is queued (or its place in the queue is kept) and False is returned.
+        """
+        now = time.time()
+        with self._ledger() as ledger:
+            reserved = self._current_reservations(ledger, now)
+            if dataset_id in reserved:
+                reserved[dataset_id]["bytes"] = max(reserved[dataset_id]["bytes"], num_bytes)
+                reserved[dataset_id]["refreshed"] = now
+                self._hold(dataset_id)
+                return True
+
+            waiting = [w for w in ledger["waiting"] if now - w[2] < self.STALE_WAITER_S or w[0] == dataset_id]
+            if not any(w[0] == dataset_id for w in waiting):
+                waiting.append([dataset_id, num_bytes, now])
+            for w in waiting:
+                if w[0] == dataset_id:
+                    w[1], w[2] = num_bytes, now
+            ledger["waiting"] = waiting
+            if waiting[0][0] != dataset_id:
+                return False
+            snapshot = list(reserved)
+
+        # walking the folders of the reservations takes long on large datasets, so it is done without blocking
+        # the other processes of the node. Reservations granted meanwhile are counted in full.
+        used = {id: self._used_bytes(id) for id in snapshot}
+        free = shutil.disk_usage(self._scratch_folder).free
+
+        with self._ledger() as ledger:
+            reserved = self._current_reservations(ledger, time.time())
+            waiting = ledger["waiting"]
+            if len(waiting) == 0 or waiting[0][0] != dataset_id:
+                return False
+            outstanding = sum(max(0, r["bytes"] - used.get(id, 0)) for id, r in reserved.items())
+            if free - outstanding < num_bytes:
+                return False
+
+            ledger["waiting"] = waiting[1:]
+            reserved[dataset_id] = {"bytes": num_bytes, "refreshed": time.time()}
+            self._hold(dataset_id)
+            return True
+
+    def reserve(self, dataset_id: str, num_bytes: int) -> None:
+        """Blocks until `num_bytes` of scratch space are reserved for a dataset
+
+        Raises:
+            SystemError: if the scratch space could never fit the reservation
+        """
+        total = shutil.disk_usage(self._scratch_folder).total
+        if num_bytes > total:
+            raise SystemError(
+                f"Dataset {dataset_id} needs {num_bytes} B of scratch space, but only {total} B exist"
+            )
+
+        while not self.try_reserve(dataset_id, num_bytes):
+            getLogger().info(
+                f"Not enough scratch space for {num_bytes} B of dataset {dataset_id}. "
+                f"Trying again in {self.POLL_INTERVAL_S} seconds."
+            )
+            time.sleep(self.POLL_INTERVAL_S)
+        getLogger().info(f"Reserved {num_bytes} B of scratch space for dataset {dataset_id}")
+
+    def release(self, dataset_id: str, num_bytes: int | None = None) -> None:
+        """Releases `num_bytes` of the reservation of a dataset, or all of it if `num_bytes` is None"""
+        with self._ledger() as ledger:
+            reserved: Dict[str, Dict[str, Any]] = ledger["reserved"]
+            if dataset_id not in reserved:
+                return
+            if num_bytes is None or reserved[dataset_id]["bytes"] <= num_bytes:
+                del reserved[dataset_id]
+                self._unhold(dataset_id)
+            else:
+                reserved[dataset_id]["bytes"] -= num_bytes
+
+    def transfer(self, from_id: str, to_id: str) -> None:
+        """Moves the reservation of `from_id` to `to_id`, e.g. when its folder is moved"""
+        with self._ledger() as ledger:
+            reserved: Dict[str, Dict[str, Any]] = ledger["reserved"]
+            if from_id in reserved:
+                num_bytes = reserved.pop(from_id)["bytes"]
+                if to_id in reserved:
+                    num_bytes += reserved[to_id]["bytes"]
+                reserved[to_id] = {"bytes": num_bytes, "refreshed": time.time()}
+                self._unhold(from_id)
+                self._hold(to_id)
+
+    def reserved(self, dataset_id: str) -> int:
+        with self._ledger() as ledger:
+            return ledger["reserved"].get(dataset_id, {"bytes": 0})["bytes"]
@@ -0,0 +1,139 @@
+from __future__ import annotations
+import os
+import shutil
+import subprocess
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Set
+
+from config.variables import Variables
+from flows.flow_utils import StoragePaths
+from utils.log import getLogger
+from utils.scratch_reservations import ScratchReservations
+
+
+class ScratchTrash:
+    """Removes folders from scratch without blocking the caller.
+
+    A folder is first renamed into the trash folder, which frees its path immediately since the trash is on
+    the same file system. The content of the trash is then deleted by a background thread using a pool of
+    unlink workers at idle I/O priority. The scratch reservation of the folder moves to the trash entry and
+    is released in steps as files are deleted. Entries left behind by a process that exited before the deletion
+    finished are picked up the next time the trash is emptied.
+    """
+
+    RELEASE_STEP_BYTES = 1024 * 1024 * 1024
+    UNLINK_BATCH_SIZE = 1000
+
+    _emptying_lock = threading.Lock()
+    _emptying: threading.Thread | None = None
+
+    def __init__(self, trash_folder: Path, reservations: ScratchReservations, num_workers: int = 4):
+        self._trash_folder = trash_folder
+        self._reservations = reservations
+        self._num_workers = num_workers
+
+    @staticmethod
+    def from_variables() -> ScratchTrash:
+        return ScratchTrash(
+            trash_folder=StoragePaths.scratch_trash_folder(),
+            reservations=ScratchReservations.from_variables(),
+            num_workers=Variables().ARCHIVER_NUM_WORKERS,
+        )
+
+    def move(self, folder: Path, reservation_id: str) -> Path | None:
+        """Moves a folder into the trash, together with its scratch reservation
+
+        Returns:
+            Path | None: trash entry, None if the folder does not exist
+        """
+        entry = self._trash_folder / uuid.uuid4().hex
+        self._trash_folder.mkdir(parents=True, exist_ok=True)
+        try:
+            folder.rename(entry)
+        except FileNotFoundError:
+            self._reservations.release(reservation_id)
+            return None
+        self._reservations.transfer(reservation_id, ScratchReservations.trash_reservation_id(entry.name))
+        return entry
+
+    def empty(self) -> threading.Thread:
+        """Starts deleting the content of the trash in the background, unless this is already in progress
+
+        Returns:
+            threading.Thread: thread deleting the trash
+        """
+        with ScratchTrash._emptying_lock:
+            if ScratchTrash._emptying is None:
+                # not a daemon, such that the process finishes the deletion before exiting if it can
+                ScratchTrash._emptying = threading.Thread(target=self._empty, name="scratch-trash")
+                ScratchTrash._emptying.start()
+            return ScratchTrash._emptying
+
+    def _empty(self) -> None:
+        # entries moved to the trash while deleting are picked up by the next pass; entries that could not be
+        # deleted are left for the next time the trash is emptied
+        failed: Set[Path] = set()
+        while True:
+            with ScratchTrash._emptying_lock:
+                entries = [e for e in self._trash_folder.glob("*") if e.is_dir() and e not in failed]
+                if not entries:
+                    ScratchTrash._emptying = None
+                    return
+            for entry in entries:
+                self._delete(entry)
+                if entry.exists():
+                    failed.add(entry)
+
+    @staticmethod
+    def _lower_io_priority() -> None:
+        try:
+            subprocess.run(
+                ["ionice", "-c", "3", "-p", str(threading.get_native_id())],
+                check=False,
+                capture_output=True,
+            )
+        except OSError:
+            pass
+
+    def _unlink(self, files: List[Path]) -> int:
+        freed = 0
+        for file in files:
+            try:
+                size = file.stat().st_size
+                file.unlink()
+                freed += size
+            except FileNotFoundError:
+                pass
+            except OSError:
+                getLogger().error(f"Failed to remove: {file}")
+        return freed
+
+    def _delete(self, entry: Path) -> None:
+        getLogger().info(f"Deleting {entry} from trash")
+        reservation_id = ScratchReservations.trash_reservation_id(entry.name)
+
+        with ThreadPoolExecutor(
+            max_workers=self._num_workers, initializer=self._lower_io_priority
+        ) as executor:
+            batches = []
+            batch: List[Path] = []
+            for root, _, files in os.walk(entry):
+                for f in files:
+                    batch.append(Path(root) / f)
+                    if len(batch) >= self.UNLINK_BATCH_SIZE:
+                        batches.append(executor.submit(self._unlink, batch))
+                        batch = []
+            batches.append(executor.submit(self._unlink, batch))
+
+            freed = 0
+            for batch_future in batches:
+                freed += batch_future.result()
+                if freed >= self.RELEASE_STEP_BYTES:
+                    self._reservations.release(reservation_id, freed)
+                    freed = 0
+
+        shutil.rmtree(entry, ignore_errors=True)
+        self._reservations.release(reservation_id)
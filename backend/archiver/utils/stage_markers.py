@@ -0,0 +1,108 @@
+from __future__ import annotations
+import hashlib
+import json
+import os
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Any
+
+from flows.flow_utils import StoragePaths
+from utils.log import getLogger
+from utils.s3_storage_interface import Bucket, S3Storage
+
+
+@dataclass
+class StageMarker:
+    stage: str
+    fingerprint: str
+    complete: bool
+    # incremented whenever the stage is invalidated, such that cache keys derived from the marker change
+    epoch: int = 0
+
+
+class StageMarkers:
+    """Durable completion markers of the stages of a dataset flow.
+
+    A marker records that a stage completed for inputs with a given fingerprint. Markers are stored on scratch
+    and mirrored to the metadata of an object in the landing zone, such that they survive the cleanup of the
+    scratch folder after a failed run. A rerun of the flow checks the markers and skips the stages that
+    completed for the same inputs.
+    """
+
+    DATABLOCKS = "datablocks"
+    REGISTER = "register"
+
+    def __init__(self, client: S3Storage, dataset_id: str):
+        self._client = client
+        self._dataset_id = dataset_id
+
+    @staticmethod
+    def fingerprint(*values: Any) -> str:
+        """Fingerprint of the inputs of a stage. Values need to be serializable to json."""
+        return hashlib.sha256(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _scratch_file(self, stage: str) -> Path:
+        return StoragePaths.scratch_folder(self._dataset_id) / ".stages" / f"{stage}.json"
+
+    def _object_key(self, stage: str) -> str:
+        return str(StoragePaths.relative_stages_folder(self._dataset_id) / stage)
+
+    def get(self, stage: str) -> StageMarker | None:
+        scratch_file = self._scratch_file(stage)
+        if scratch_file.exists():
+            return StageMarker(**json.loads(scratch_file.read_text()))
+
+        stat = self._client.stat_object(Bucket.landingzone_bucket(), self._object_key(stage))
+        if stat is None or "fingerprint" not in stat.Metadata:
+            return None
+        metadata = stat.Metadata
+        marker = StageMarker(
+            stage=stage,
+            fingerprint=metadata["fingerprint"],
+            complete=metadata["complete"] == "true",
+            epoch=int(metadata["epoch"]),
+        )
+        self._save_scratch(marker)
+        return marker
+
+    def _save_scratch(self, marker: StageMarker) -> None:
+        scratch_file = self._scratch_file(marker.stage)
+        scratch_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = scratch_file.with_suffix(".tmp")
+        tmp.write_text(json.dumps(asdict(marker)))
+        os.replace(tmp, scratch_file)
+
+    def _save(self, marker: StageMarker) -> None:
+        self._save_scratch(marker)
+        self._client.put_bytes(
+            Bucket.landingzone_bucket(),
+            self._object_key(marker.stage),
+            b"",
+            metadata={
+                "fingerprint": marker.fingerprint,
+                "complete": "true" if marker.complete else "false",
+                "epoch": str(marker.epoch),
+            },
+        )
+
+    def is_complete(self, stage: str, fingerprint: str) -> bool:
+        marker = self.get(stage)
+        return marker is not None and marker.complete and marker.fingerprint == fingerprint
+
+    def complete(self, stage: str, fingerprint: str) -> None:
+        marker = self.get(stage)
+        self._save(StageMarker(stage, fingerprint, complete=True, epoch=marker.epoch if marker else 0))
+        getLogger().info(f"Stage {stage} of dataset {self._dataset_id} completed")
+
+    def invalidate(self, stage: str) -> None:
+        """Marks a stage as not completed, e.g. after its effects were reverted"""
+        marker = self.get(stage)
+        if marker is None:
+            return
+        self._save(StageMarker(stage, marker.fingerprint, complete=False, epoch=marker.epoch + 1))
+
+    def cache_key(self, stage: str, fingerprint: str) -> str:
+        """Prefect cache key of a stage. Changes with the inputs and whenever the stage is invalidated."""
+        marker = self.get(stage)
+        epoch = marker.epoch if marker is not None else 0
+        return f"{self._dataset_id}-{stage}-{fingerprint}-{epoch}"
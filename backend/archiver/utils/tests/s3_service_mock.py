@@ -0,0 +1,149 @@
+"""In-process stand-in for the S3 service used by `S3Storage`.
+
+The S3 API itself (multipart, range requests, restore, head_object with `Restore` headers) is provided
+by moto. On top of that, the traffic of an `S3Storage` attached to the mock is shaped using botocore
+event hooks: per-request latency, a bandwidth cap shared by all transfers, randomly injected connection
+failures and a delay until restored objects become available. This allows to measure the behavior of
+`S3Storage` and the flows under WAN or Glacier like conditions without a MinIO instance.
+"""
+
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+import boto3
+from botocore.exceptions import ClientError, EndpointConnectionError
+from moto import mock_aws
+from pydantic import SecretStr
+
+from utils.bandwidth_governor import TokenBucket
+from utils.s3_storage_interface import S3Storage
+
+
+@dataclass
+class S3ServiceProfile:
+    # added to every request, including retries
+    latency_s: float = 0
+    # shared by uploads and downloads of all attached clients, 0 for unlimited
+    bandwidth_bytes_per_s: float = 0
+    # probability of a request failing with a connection error
+    failure_rate: float = 0
+    # time between `restore_object` and the object being available
+    restore_delay_s: float = 0
+    seed: int = 0
+
+
+class _ShapedBody:
+    """Wraps a response body such that reading from it is limited by a token bucket"""
+
+    def __init__(self, body, bandwidth: TokenBucket):
+        self._body = body
+        self._bandwidth = bandwidth
+
+    def read(self, amt=None):
+        data = self._body.read(amt)
+        self._bandwidth.acquire(len(data))
+        return data
+
+    def iter_chunks(self, chunk_size: int = 1024):
+        while chunk := self.read(chunk_size):
+            yield chunk
+
+    def __getattr__(self, name):
+        return getattr(self._body, name)
+
+
+class S3ServiceMock:
+    """Context manager providing a shaped, in-process S3 service.
+
+    Usage:
+        with S3ServiceMock(S3ServiceProfile(latency_s=0.05), buckets=["landingzone"]) as service:
+            s3 = service.s3_storage()
+            ...
+    """
+
+    def __init__(self, profile: S3ServiceProfile = S3ServiceProfile(), buckets: list[str] | None = None):
+        self.profile = profile
+        self._buckets = buckets or []
+        self._random = random.Random(profile.seed)
+        self._random_lock = threading.Lock()
+        self._bandwidth = TokenBucket(
+            rate=profile.bandwidth_bytes_per_s,
+            capacity=profile.bandwidth_bytes_per_s / 10,
+        )
+        self._restores: Dict[Tuple[str, str], float] = {}
+        self._mock = mock_aws()
+        self.request_count = 0
+        self.failure_count = 0
+
+    def __enter__(self):
+        self._mock.start()
+        client = boto3.client("s3", region_name="eu-west-1")
+        for bucket in self._buckets:
+            client.create_bucket(Bucket=bucket, CreateBucketConfiguration={"LocationConstraint": "eu-west-1"})
+        # unshaped client to set up test data and inspect results
+        self.client = client
+        return self
+
+    def __exit__(self, *args):
+        self._mock.stop()
+
+    def s3_storage(self) -> S3Storage:
+        """Creates an `S3Storage` talking to this service"""
+        return self.attach(S3Storage(url="", user="user", password=SecretStr("pass"), region="eu-west-1"))
+
+    def attach(self, s3: S3Storage) -> S3Storage:
+        for client in [s3._client, s3._external_s3_client, s3._resource.meta.client]:
+            events = client.meta.events
+            events.register_first("before-send.s3", self._before_send)
+            events.register("before-parameter-build.s3.RestoreObject", self._on_restore)
+            events.register("before-parameter-build.s3.GetObject", self._check_restored)
+            events.register("before-parameter-build.s3.HeadObject", self._remember_key)
+            events.register("after-call.s3.HeadObject", self._restore_header)
+            events.register("after-call.s3.GetObject", self._shape_body)
+        return s3
+
+    def put_object(self, bucket: str, key: str, body: bytes, storage_class: str = "GLACIER") -> None:
+        self.client.put_object(Bucket=bucket, Key=key, Body=body, StorageClass=storage_class)
+
+    def _before_send(self, request, **kwargs):
+        if self.profile.latency_s > 0:
+            time.sleep(self.profile.latency_s)
+
+        with self._random_lock:
+            self.request_count += 1
+            fail = self._random.random() < self.profile.failure_rate
+            if fail:
+                self.failure_count += 1
+        if fail:
+            raise EndpointConnectionError(endpoint_url=request.url)
+
+        if request.method in ("PUT", "POST"):
+            self._bandwidth.acquire(int(request.headers.get("Content-Length", 0)))
+
+    def _on_restore(self, params, **kwargs):
+        self._restores.setdefault((params["Bucket"], params["Key"]), time.monotonic())
+
+    def _is_restoring(self, bucket: str, key: str) -> bool:
+        requested = self._restores.get((bucket, key))
+        return requested is not None and time.monotonic() - requested < self.profile.restore_delay_s
+
+    def _check_restored(self, params, **kwargs):
+        if self._is_restoring(params["Bucket"], params["Key"]):
+            raise ClientError(
+                {"Error": {"Code": "InvalidObjectState", "Message": "Object restore is in progress"}},
+                "GetObject",
+            )
+
+    def _remember_key(self, params, context, **kwargs):
+        context["s3_service_mock_key"] = (params["Bucket"], params["Key"])
+
+    def _restore_header(self, parsed, context, **kwargs):
+        if self._is_restoring(*context.get("s3_service_mock_key", ("", ""))):
+            parsed["Restore"] = 'ongoing-request="true"'
+
+    def _shape_body(self, parsed, **kwargs):
+        if "Body" in parsed and self._bandwidth.enabled:
+            parsed["Body"] = _ShapedBody(parsed["Body"], self._bandwidth)
@@ -0,0 +1,64 @@
+import threading
+import time
+from pathlib import Path
+
+from utils.bandwidth_governor import TokenBucket, S3Governor
+
+
+def test_disabled_bucket_does_not_block():
+    bucket = TokenBucket(rate=0)
+
+    start = time.monotonic()
+    bucket.acquire(10**12)
+    assert time.monotonic() - start < 0.1
+
+
+def test_bucket_limits_rate():
+    bucket = TokenBucket(rate=1000, capacity=100)
+
+    start = time.monotonic()
+    for _ in range(4):
+        bucket.acquire(100)
+    # first 100 tokens are available immediately, the remaining 300 take 0.3s
+    assert time.monotonic() - start >= 0.25
+
+
+def test_requests_are_served_in_order():
+    bucket = TokenBucket(rate=1000, capacity=100)
+    bucket.acquire(100)
+    done = {}
+
+    def acquire(name: str, amount: int):
+        bucket.acquire(amount)
+        done[name] = time.monotonic()
+
+    large = threading.Thread(target=acquire, args=("large", 300))
+    large.start()
+    time.sleep(0.05)
+    # small requests arriving later don't drain the bucket ahead of the large one
+    for i in range(5):
+        acquire(f"small_{i}", 10)
+    large.join()
+
+    assert all(done["large"] <= done[f"small_{i}"] for i in range(5))
+
+
+def test_shared_bucket_budget(tmp_path: Path):
+    state_file = tmp_path / "bucket"
+    bucket_a = TokenBucket(rate=1000, capacity=100, state_file=state_file)
+    bucket_b = TokenBucket(rate=1000, capacity=100, state_file=state_file)
+
+    start = time.monotonic()
+    bucket_a.acquire(100)
+    bucket_b.acquire(100)
+    bucket_a.acquire(100)
+    assert time.monotonic() - start >= 0.15
+    assert state_file.exists()
+
+
+def test_governor_without_limits(tmp_path: Path):
+    governor = S3Governor(state_folder=tmp_path / "governor")
+
+    governor.request()
+    governor.transfer(10**9)
+    assert not (tmp_path / "governor").exists()
@@ -13,6 +13,8 @@ from utils.datablocks import ArchiveInfo
 import utils.datablocks as datablock_operations
 from utils.model import OrigDataBlock, DataBlock, DataFile
 from flows.flow_utils import StoragePaths, SystemError
+from utils.s3_storage_interface import Bucket
+from utils.scratch_trash import ScratchTrash
 
 
 test_dataset_id = "testprefix/1234.4567"
@@ -286,11 +288,13 @@ def test_create_datablock_entries(
     origDataBlocks_fixture: List[OrigDataBlock],
 ):
     folder = create_raw_files_fixture(storage_paths_fixture, 10, 1 * MB)
-    datablocks: List[DataBlock] = datablock_operations.create_datablock_entries(
-        test_dataset_id,
-        folder,
-        origDataBlocks_fixture,
-        tar_infos_fixture,
+    datablocks: List[DataBlock] = list(
+        datablock_operations.create_datablock_entries(
+            test_dataset_id,
+            folder,
+            origDataBlocks_fixture,
+            tar_infos_fixture,
+        )
     )
 
     assert len(datablocks) == 2
@@ -345,9 +349,56 @@ def test_cleanup_scratch(storage_paths_fixture):
 
     assert all([Path(f.name).exists() for f in files_in_scratch])
 
-    datablock_operations.cleanup_scratch(dataset_id=dataset)
+    datablock_operations.cleanup_scratch(dataset_id=dataset).join()
 
     assert all([not Path(f.name).exists() for f in files_in_scratch])
+    assert not StoragePaths.scratch_folder(dataset).exists()
+
+
+def test_cleanup_scratch_releases_reservation(storage_paths_fixture):
+    from utils.scratch_reservations import ScratchReservations
+
+    dataset = "1"
+    create_files_in_scratch(dataset)
+    reservations = ScratchReservations.from_variables()
+    assert reservations.try_reserve(dataset, 10 * MB)
+
+    with patch.object(ScratchTrash, "RELEASE_STEP_BYTES", 1):
+        datablock_operations.cleanup_scratch(dataset_id=dataset).join()
+
+    assert reservations.reserved(dataset) == 0
+
+
+def test_cleanup_partition_scratch(storage_paths_fixture):
+    dataset_id = "testprefix/33.333"
+    raw_prefix = StoragePaths.relative_raw_files_folder(dataset_id)
+    raw_files_folder = StoragePaths.scratch_archival_raw_files_folder(dataset_id)
+    datablocks_folder = StoragePaths.scratch_archival_datablocks_folder(dataset_id)
+    raw_files_folder.mkdir(parents=True)
+    datablocks_folder.mkdir(parents=True)
+    for name in ["file_0.bin", "file_1.bin", "other.bin"]:
+        (raw_files_folder / name).write_bytes(b"raw")
+    (datablocks_folder / datablock_operations.datablock_name(dataset_id, 1)).write_bytes(b"tar")
+    (datablocks_folder / datablock_operations.datablock_name(dataset_id, 2)).write_bytes(b"tar")
+
+    # file_1.bin was not downloaded yet
+    (raw_files_folder / "file_1.bin").unlink()
+    datablock_operations.cleanup_partition_scratch(
+        dataset_id, 1, [str(raw_prefix / "file_0.bin"), str(raw_prefix / "file_1.bin")]
+    )
+
+    # files of other partitions are kept
+    assert [p.name for p in raw_files_folder.iterdir()] == ["other.bin"]
+    other_datablock = datablock_operations.datablock_name(dataset_id, 2)
+    assert [p.name for p in datablocks_folder.iterdir()] == [other_datablock]
+
+
+def test_estimate_scratch_footprint():
+    orig_datablocks = [OrigDataBlock(size=10 * MB, ownerGroup="group", dataFileList=[]) for _ in range(3)]
+
+    assert datablock_operations.estimate_scratch_footprint(orig_datablocks, target_size=100 * MB) == 60 * MB
+    # at most 9 partitions of raw files and tar are on scratch at the same time
+    assert datablock_operations.estimate_scratch_footprint(orig_datablocks, target_size=1 * MB) == 18 * MB
 
 
 def mock_find_object_in_s3(*args, **kwargs):
@@ -404,11 +455,13 @@ def test_create_datablocks(
         target_size=500 * 1024 * 1024,
     )
 
-    datablocks = datablock_operations.create_datablock_entries(
-        dataset_id=dataset_id,
-        folder=datablocks_scratch_folder,
-        origDataBlocks=origDataBlocks_fixture,
-        tar_infos=tar_files,
+    datablocks = list(
+        datablock_operations.create_datablock_entries(
+            dataset_id=dataset_id,
+            folder=datablocks_scratch_folder,
+            origDataBlocks=origDataBlocks_fixture,
+            tar_infos=tar_files,
+        )
     )
 
     assert len(datablocks) == 1
@@ -422,3 +475,133 @@ def test_create_datablocks(
         StoragePaths.scratch_archival_datablocks_folder(dataset_id),
         created_tars,
     )
+
+
+@pytest.mark.parametrize(
+    "sizes,target_size,expected_partition_sizes",
+    [
+        ([1, 1, 1, 1], 2, [2, 2]),
+        ([1, 1, 1], 10, [3]),
+        ([5, 1, 1], 2, [1, 2]),  # single object larger than the target size
+        ([], 2, []),
+    ],
+)
+def test_partition_objects(sizes, target_size, expected_partition_sizes):
+    from utils.s3_storage_interface import S3Storage
+
+    objects = [S3Storage.ListedObject(Name=f"file_{i}", Size=s) for i, s in enumerate(sizes)]
+
+    partitions = datablock_operations.partition_objects(objects, target_size)
+
+    assert [len(p) for p in partitions] == expected_partition_sizes
+    assert [o for p in partitions for o in p] == objects
+
+
+def test_partition_objects_max_files():
+    from utils.s3_storage_interface import S3Storage
+
+    objects = [S3Storage.ListedObject(Name=f"file_{i}", Size=1) for i in range(7)]
+
+    partitions = datablock_operations.partition_objects(objects, 100, max_files=3)
+
+    assert [len(p) for p in partitions] == [3, 3, 1]
+
+
+def test_create_datablocks_pipelined(storage_paths_fixture):
+    import hashlib
+    from utils.s3_storage_interface import S3Storage
+    from utils.tests.s3_service_mock import S3ServiceMock
+
+    dataset_id = "testprefix/22.222"
+    envs = {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "S3_EXTERNAL_ENDPOINT": "endpoint:9000",
+        "S3_URL_EXPIRATION_DAYS": "1",
+        "S3_LANDINGZONE_BUCKET": "landingzone",
+        "S3_ARCHIVAL_BUCKET": "archival",
+        "ARCHIVER_NUM_WORKERS": "2",
+    }
+    raw_prefix = StoragePaths.relative_raw_files_folder(dataset_id)
+    raw_files = {f"subfolder/file_{i}.bin": os.urandom(MB) for i in range(5)}
+
+    with (
+        patch.dict(os.environ, envs),
+        S3ServiceMock(buckets=["landingzone", "archival"]) as service,
+    ):
+        for name, content in raw_files.items():
+            service.put_object("landingzone", str(raw_prefix / name), content)
+        s3 = service.s3_storage()
+        objects = s3.list_objects(Bucket("landingzone"), str(raw_prefix))
+
+        with patch.object(S3Storage, "RESTORE_POLL_INTERVAL_S", 0.1):
+            archive_infos = datablock_operations.create_datablocks_pipelined(
+                s3, dataset_id=dataset_id, objects=objects, target_size=2 * MB, queue_size=1
+            )
+
+        assert len(archive_infos) == 3
+        assert [a.fileCount for a in archive_infos] == [2, 2, 1]
+
+        for archive_info in archive_infos:
+            head = service.client.head_object(
+                Bucket="archival",
+                Key=str(StoragePaths.relative_datablocks_folder(dataset_id) / archive_info.path.name),
+            )
+            assert head["ContentLength"] == archive_info.packedSize
+            # uploaded datablocks are removed from scratch
+            assert not archive_info.path.exists()
+
+            for data_file in archive_info.dataFiles:
+                assert data_file.chk == hashlib.md5(raw_files[data_file.path]).hexdigest()
+                assert data_file.size == MB
+
+    # raw files are removed from scratch once packed
+    assert datablock_operations.count_files(StoragePaths.scratch_archival_raw_files_folder(dataset_id)) == 0
+
+
+def test_create_datablock(storage_paths_fixture):
+    import hashlib
+    from utils.tests.s3_service_mock import S3ServiceMock
+
+    dataset_id = "testprefix/33.333"
+    envs = {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "S3_EXTERNAL_ENDPOINT": "endpoint:9000",
+        "S3_URL_EXPIRATION_DAYS": "1",
+        "S3_LANDINGZONE_BUCKET": "landingzone",
+        "S3_ARCHIVAL_BUCKET": "archival",
+        "ARCHIVER_NUM_WORKERS": "2",
+    }
+    raw_prefix = StoragePaths.relative_raw_files_folder(dataset_id)
+    raw_files = {f"file_{i}.bin": os.urandom(1024) for i in range(3)}
+
+    with (
+        patch.dict(os.environ, envs),
+        S3ServiceMock(buckets=["landingzone", "archival"]) as service,
+    ):
+        for name, content in raw_files.items():
+            service.put_object("landingzone", str(raw_prefix / name), content)
+        s3 = service.s3_storage()
+
+        archive_info = datablock_operations.create_datablock(
+            s3, dataset_id, 1, [str(raw_prefix / name) for name in raw_files]
+        )
+        assert archive_info.path.name == "testprefix-33.333_1.tar"
+        assert not archive_info.path.exists()
+        service.client.head_object(
+            Bucket="archival",
+            Key=str(StoragePaths.relative_datablocks_folder(dataset_id) / archive_info.path.name),
+        )
+
+        # collected from the manifest, e.g. by a flow on another worker, without restoring it
+        head = service.client.head_object(
+            Bucket="landingzone",
+            Key=str(StoragePaths.relative_manifests_folder(dataset_id) / f"{archive_info.path.name}.json"),
+        )
+        assert head.get("StorageClass", "STANDARD") == "STANDARD"
+        loaded = datablock_operations.load_archive_info(s3, dataset_id, archive_info.path.name)
+        assert loaded == archive_info
+        assert {f.path: f.chk for f in loaded.dataFiles} == {
+            name: hashlib.md5(content).hexdigest() for name, content in raw_files.items()
+        }
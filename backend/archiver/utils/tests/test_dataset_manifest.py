@@ -0,0 +1,109 @@
+import hashlib
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import utils.datablocks as datablock_operations
+from flows.flow_utils import StoragePaths
+from utils.dataset_manifest import DatasetManifest, ManifestEntry
+from utils.file_manifest import FileManifest
+
+
+def file_manifest(names, offset: int = 512) -> FileManifest:
+    m = FileManifest()
+    for name in names:
+        m.append(name, 10, hashlib.md5(name.encode()).hexdigest(), offset=offset)
+    return m
+
+
+def test_round_trip():
+    manifest = DatasetManifest.from_file_manifests(
+        [
+            ("ds_0.tar", file_manifest(["a", "b"])),
+            ("ds_1.tar", file_manifest(["c"])),
+            ("ds_2.tar", FileManifest()),
+        ]
+    )
+
+    loaded = DatasetManifest.from_bytes(manifest.to_bytes())
+
+    assert len(loaded) == 3
+    assert loaded.datablocks == ["ds_0.tar", "ds_1.tar", "ds_2.tar"]
+    assert loaded.find("c") == ManifestEntry(
+        path="c", datablock="ds_1.tar", offset=512, size=10, chk=hashlib.md5(b"c").hexdigest()
+    )
+    assert loaded.find("d") is None
+    assert [e.path for e in loaded.files_of("ds_0.tar")] == ["a", "b"]
+    assert loaded.total_size() == 30
+
+    no_checksum = FileManifest()
+    no_checksum.append("folder", 0)
+    directory = DatasetManifest.from_file_manifests([("ds.tar", no_checksum)])
+    assert DatasetManifest.from_bytes(directory.to_bytes())[0].chk is None
+    assert len(DatasetManifest.from_bytes(DatasetManifest.from_file_manifests([]).to_bytes())) == 0
+
+
+def test_invalid_manifests_are_rejected():
+    with pytest.raises(ValueError):
+        DatasetManifest.from_bytes(b"SADM\x02\x00" + bytes(12))
+
+    sha256 = FileManifest()
+    sha256.append("a", 1, hashlib.sha256(b"a").hexdigest())
+    with pytest.raises(ValueError):
+        DatasetManifest.from_file_manifests([("ds.tar", sha256)])
+
+
+def test_offsets_point_to_the_data(tmp_path: Path):
+    src = tmp_path / "src"
+    src.mkdir()
+    contents = {f"file_{i}.bin": os.urandom(1000 * i + 1) for i in range(4)}
+    for name, content in contents.items():
+        (src / name).write_bytes(content)
+
+    tar_path = tmp_path / "ds_0.tar"
+    archive_info = datablock_operations.create_tar(src, tar_path, [Path(n) for n in contents], checksums=True)
+    manifest = DatasetManifest.from_file_manifests([(tar_path.name, archive_info.dataFiles)])  # type: ignore
+
+    with open(tar_path, "rb") as tar:
+        for name, content in contents.items():
+            entry = manifest.find(name)
+            assert entry is not None
+            tar.seek(entry.offset)
+            assert tar.read(entry.size) == content
+            assert entry.chk == hashlib.md5(content).hexdigest()
+
+
+def test_upload_dataset_manifest(tmp_path: Path):
+    from utils.tests.s3_service_mock import S3ServiceMock
+
+    dataset_id = "testprefix/44.444"
+    envs = {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "S3_ARCHIVAL_BUCKET": "archival",
+        "ARCHIVER_SCRATCH_FOLDER": str(tmp_path),
+    }
+    archive_infos = [
+        datablock_operations.ArchiveInfo(
+            unpackedSize=20,
+            packedSize=2048,
+            path=Path(f"{i}.tar"),
+            fileCount=2,
+            dataFiles=file_manifest(["a", "b"]),
+        )
+        for i in range(2)
+    ]
+
+    with patch.dict(os.environ, envs), S3ServiceMock(buckets=["archival"]) as service:
+        s3 = service.s3_storage()
+        datablock_operations.upload_dataset_manifest(s3, dataset_id, archive_infos)
+
+        key = StoragePaths.relative_datablocks_folder(dataset_id) / "testprefix-44.444.manifest"
+        head = service.client.head_object(Bucket="archival", Key=str(key))
+        assert head.get("StorageClass", "STANDARD") == "STANDARD"
+
+        manifest = datablock_operations.load_dataset_manifest(s3, dataset_id)
+        assert manifest.datablocks == ["0.tar", "1.tar"]
+        assert len(manifest) == 4
@@ -0,0 +1,116 @@
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from utils.dataset_scheduler import DatasetScheduler
+
+GB = 1024 * 1024 * 1024
+
+
+@pytest.fixture()
+def scheduler(tmp_path: Path) -> DatasetScheduler:
+    return DatasetScheduler(
+        ledger_file=tmp_path / ".dataset-schedule",
+        slots=3,
+        large_slots=1,
+        large_size=100 * GB,
+        # 1 GB per second
+        seconds_per_byte=1.0 / GB,
+    )
+
+
+def test_large_datasets_keep_to_their_lane(scheduler: DatasetScheduler):
+    assert scheduler.try_acquire("large_1", DatasetScheduler.ARCHIVAL, 30000 * GB)
+    assert not scheduler.try_acquire("large_2", DatasetScheduler.ARCHIVAL, 30000 * GB)
+
+    # small datasets are not blocked by the large ones
+    assert scheduler.try_acquire("small_1", DatasetScheduler.ARCHIVAL, 1 * GB)
+    assert scheduler.try_acquire("small_2", DatasetScheduler.ARCHIVAL, 1 * GB)
+    assert not scheduler.try_acquire("small_3", DatasetScheduler.ARCHIVAL, 1 * GB)
+
+    assert scheduler.running() == {
+        "large_1": DatasetScheduler.LARGE,
+        "small_1": DatasetScheduler.SMALL,
+        "small_2": DatasetScheduler.SMALL,
+    }
+
+
+def test_small_datasets_use_idle_large_lane(scheduler: DatasetScheduler):
+    for i in range(3):
+        assert scheduler.try_acquire(f"small_{i}", DatasetScheduler.ARCHIVAL, 1 * GB)
+    assert scheduler.running()["small_2"] == DatasetScheduler.LARGE
+
+    assert not scheduler.try_acquire("large", DatasetScheduler.ARCHIVAL, 1000 * GB)
+    scheduler.release("small_0")
+    assert scheduler.try_acquire("small_3", DatasetScheduler.ARCHIVAL, 1 * GB)
+    # the large lane is not lent out while a large dataset is waiting
+    scheduler.release("small_2")
+    assert not scheduler.try_acquire("small_4", DatasetScheduler.ARCHIVAL, 1 * GB)
+    assert scheduler.try_acquire("large", DatasetScheduler.ARCHIVAL, 1000 * GB)
+
+
+def test_shortest_first_and_retrievals_ahead(scheduler: DatasetScheduler):
+    for i in range(3):
+        assert scheduler.try_acquire(f"running_{i}", DatasetScheduler.ARCHIVAL, 1 * GB)
+
+    with patch("time.time", return_value=1000.0):
+        assert not scheduler.try_acquire("archival_50", DatasetScheduler.ARCHIVAL, 50 * GB)
+        assert not scheduler.try_acquire("archival_10", DatasetScheduler.ARCHIVAL, 10 * GB)
+        assert not scheduler.try_acquire("retrieval_90", DatasetScheduler.RETRIEVAL, 90 * GB)
+
+    scheduler.release("running_0")
+    with patch("time.time", return_value=1001.0):
+        assert not scheduler.try_acquire("archival_50", DatasetScheduler.ARCHIVAL, 50 * GB)
+        assert not scheduler.try_acquire("archival_10", DatasetScheduler.ARCHIVAL, 10 * GB)
+        assert scheduler.try_acquire("retrieval_90", DatasetScheduler.RETRIEVAL, 90 * GB)
+
+    scheduler.release("running_1")
+    with patch("time.time", return_value=1002.0):
+        assert not scheduler.try_acquire("archival_50", DatasetScheduler.ARCHIVAL, 50 * GB)
+        assert scheduler.try_acquire("archival_10", DatasetScheduler.ARCHIVAL, 10 * GB)
+
+
+def test_waiting_datasets_age(scheduler: DatasetScheduler):
+    for i in range(3):
+        assert scheduler.try_acquire(f"running_{i}", DatasetScheduler.ARCHIVAL, 1 * GB)
+
+    with patch("time.time", return_value=1000.0):
+        assert not scheduler.try_acquire("old", DatasetScheduler.ARCHIVAL, 50 * GB)
+    # polling keeps the place in the queue
+    with patch("time.time", return_value=1030.0):
+        assert not scheduler.try_acquire("old", DatasetScheduler.ARCHIVAL, 50 * GB)
+    scheduler.release("running_0")
+
+    # waiting for longer than its size accounts for, the larger dataset goes ahead of a smaller one
+    with patch("time.time", return_value=1060.0):
+        assert not scheduler.try_acquire("new", DatasetScheduler.ARCHIVAL, 1 * GB)
+        assert scheduler.try_acquire("old", DatasetScheduler.ARCHIVAL, 50 * GB)
+
+
+def test_slots_of_abandoned_holders_are_reclaimed(scheduler: DatasetScheduler):
+    with patch("time.time", return_value=1000.0):
+        for i in range(3):
+            assert scheduler.try_acquire(f"running_{i}", DatasetScheduler.ARCHIVAL, 1 * GB)
+    # running_0 and running_1 keep refreshing their slots, running_2 was killed
+    with patch("time.time", return_value=1000.0 + DatasetScheduler.STALE_HOLDER_S - 1):
+        scheduler.heartbeat("running_0")
+        scheduler.heartbeat("running_1")
+        assert not scheduler.try_acquire("waiting", DatasetScheduler.ARCHIVAL, 1 * GB)
+
+    with patch("time.time", return_value=1000.0 + DatasetScheduler.STALE_HOLDER_S):
+        assert scheduler.try_acquire("waiting", DatasetScheduler.ARCHIVAL, 1 * GB)
+    assert set(scheduler.running()) == {"running_0", "running_1", "waiting"}
+
+
+def test_slot_refreshes_its_lease(scheduler: DatasetScheduler):
+    with (
+        patch.object(DatasetScheduler, "HEARTBEAT_INTERVAL_S", 0.01),
+        patch.object(scheduler, "heartbeat", wraps=scheduler.heartbeat) as heartbeat,
+        scheduler.slot("dataset", DatasetScheduler.ARCHIVAL, 1 * GB),
+    ):
+        while heartbeat.call_count < 2:
+            time.sleep(0.01)
+        assert scheduler.running() == {"dataset": DatasetScheduler.SMALL}
+    assert scheduler.running() == {}
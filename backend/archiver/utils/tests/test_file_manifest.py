@@ -0,0 +1,72 @@
+import tarfile
+from pathlib import Path
+
+from pydantic import TypeAdapter
+
+from utils.datablocks import ArchiveInfo
+from utils.file_manifest import FileManifest
+from utils.model import DataFile
+
+
+def manifest() -> FileManifest:
+    m = FileManifest()
+    m.append("b.bin", 20, "chk_b", uid=1000, gid=100, perm=0o644, mtime=1700000000.5)
+    m.append("a.bin", 10, "chk_a", uid=1000, gid=100, perm=0o600, mtime=1700000001.0)
+    m.append("c", None, None)
+    return m
+
+
+def test_entries_are_created_on_access():
+    m = manifest()
+
+    assert len(m) == 3
+    assert m[0] == DataFile(
+        path="b.bin",
+        size=20,
+        chk="chk_b",
+        uid="1000",
+        gid="100",
+        perm=str(0o644),
+        time="2023-11-14T22:13:20.500000+00:00",
+    )
+    assert m[-1] == DataFile(path="c")
+    assert [f.path for f in m] == ["b.bin", "a.bin", "c"]
+
+
+def test_filter_sort_and_sizes():
+    m = manifest()
+
+    assert m.total_size() == 30
+    assert m.sorted_by(m.paths).paths == ["a.bin", "b.bin", "c"]
+    assert m.sorted_by(m.sizes, reverse=True).paths == ["b.bin", "a.bin", "c"]
+    assert m.filter(chk is not None for chk in m.checksums).paths == ["b.bin", "a.bin"]
+    assert m.filter(s > 15 for s in m.sizes).total_size() == 20
+
+
+def test_append_tar_info():
+    tar_info = tarfile.TarInfo("folder/file")
+    tar_info.size = 5
+    tar_info.uid = 1
+    tar_info.mtime = 1700000000
+
+    m = FileManifest()
+    m.append_tar_info(tar_info, "chk")
+
+    assert m[0].path == "folder/file"
+    assert m[0].size == 5
+    assert m[0].uid == "1"
+    assert m[0].perm == str(tar_info.mode)
+
+
+def test_serialization():
+    m = manifest()
+    adapter = TypeAdapter(ArchiveInfo)
+
+    assert FileManifest.parse(m.to_columns()) == m
+    # data file lists written before manifests were columnar
+    assert FileManifest.parse([f.model_dump() for f in m]) == m
+
+    archive_info = ArchiveInfo(unpackedSize=30, packedSize=40, path=Path("x.tar"), fileCount=3, dataFiles=m)
+    loaded = adapter.validate_json(adapter.dump_json(archive_info))
+    assert loaded.dataFiles == m
+    assert loaded.dataFiles.to_datafiles() == m.to_datafiles()
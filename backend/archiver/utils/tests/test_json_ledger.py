@@ -0,0 +1,42 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from utils.json_ledger import locked_json_ledger
+
+
+def test_ledger_is_written_back(tmp_path: Path):
+    ledger_file = tmp_path / "folder" / ".ledger"
+
+    with locked_json_ledger(ledger_file, {"running": {}, "waiting": []}) as ledger:
+        assert ledger == {"running": {}, "waiting": []}
+        ledger["running"]["dataset"] = 1
+
+    with locked_json_ledger(ledger_file, {"running": {}, "waiting": []}) as ledger:
+        assert ledger == {"running": {"dataset": 1}, "waiting": []}
+
+
+def test_ledger_is_not_written_on_errors(tmp_path: Path):
+    ledger_file = tmp_path / ".ledger"
+    ledger_file.write_text(json.dumps({"running": {"dataset": 1}}))
+
+    with pytest.raises(RuntimeError):
+        with locked_json_ledger(ledger_file, {"running": {}}) as ledger:
+            ledger["running"].clear()
+            raise RuntimeError()
+
+    assert json.loads(ledger_file.read_text()) == {"running": {"dataset": 1}}
+
+
+def test_corrupt_ledger_is_reset(tmp_path: Path):
+    ledger_file = tmp_path / ".ledger"
+    ledger_file.write_text('{"running": {"data')
+    defaults = {"running": {}}
+
+    with locked_json_ledger(ledger_file, defaults) as ledger:
+        ledger["running"]["dataset"] = 1
+
+    # defaults are copied, not shared between ledgers
+    assert defaults == {"running": {}}
+    assert json.loads(ledger_file.read_text()) == {"running": {"dataset": 1}}
@@ -0,0 +1,75 @@
+import logging
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from utils.log import log, log_debug
+from utils.model import DataBlock, DataFile
+
+
+class CountingRepr:
+    count = 0
+
+    def __repr__(self) -> str:
+        CountingRepr.count += 1
+        return "counted"
+
+
+@log_debug
+def identity(*args, **kwargs):
+    return args
+
+
+def test_arguments_are_not_formatted_if_disabled(caplog):
+    CountingRepr.count = 0
+
+    with caplog.at_level(logging.INFO, logger="TestLogger"):
+        identity(CountingRepr(), value=CountingRepr())
+
+    assert CountingRepr.count == 0
+    assert caplog.records == []
+
+
+def test_arguments_are_formatted_bounded(caplog):
+    files = [Path(f"folder/file_{i}") for i in range(100_000)]
+    datablock = DataBlock(
+        archiveId="a.tar", size=1, version="1", dataFileList=[DataFile(path=f"f_{i}") for i in range(1000)]
+    )
+
+    with caplog.at_level(logging.DEBUG, logger="TestLogger"):
+        identity(files, datablock=datablock)
+
+    call, returned = [r.getMessage() for r in caplog.records]
+    assert call.startswith("Function identity([PosixPath('folder/file_0'), ")
+    assert "datablock=DataBlock(" in call
+    assert len(call) < 600
+    assert len(returned) < 300
+
+
+@pytest.mark.skipif(not os.environ.get("ARCHIVER_BENCHMARKS"), reason="set ARCHIVER_BENCHMARKS to run")
+def test_benchmark_log_overhead():
+    files = [Path(f"folder/file_{i}") for i in range(10_000)]
+    calls = 10_000
+
+    def plain(files):
+        return files
+
+    def timed(func):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func(files)
+        return (time.perf_counter() - start) / calls * 1e6
+
+    baseline = timed(plain)
+    timings = {"log (disabled)": timed(log(plain)), "log_debug (disabled)": timed(log_debug(plain))}
+    logging.getLogger("TestLogger").setLevel(logging.INFO)
+    try:
+        timings["log (enabled)"] = timed(log(plain))
+    finally:
+        logging.getLogger("TestLogger").setLevel(logging.NOTSET)
+
+    print(f"\nOverhead per call with a list of {len(files)} paths as argument:")
+    for name, us in timings.items():
+        print(f"  {name:<24}{us - baseline:.2f} us")
@@ -0,0 +1,64 @@
+import os
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from flows.flow_utils import StoragePaths, SystemError
+from utils.datablocks import ArchiveInfo
+from utils.file_manifest import FileManifest
+from utils.model import DataFile
+from utils.result_manifests import iter_results, load_results, save_results
+from utils.s3_storage_interface import S3Storage
+
+
+@pytest.fixture(autouse=True)
+def scratch_folder(tmp_path: Path):
+    with patch.dict(os.environ, {"ARCHIVER_SCRATCH_FOLDER": str(tmp_path)}):
+        yield tmp_path
+
+
+def test_save_and_load_results():
+    archive_infos = [
+        ArchiveInfo(
+            unpackedSize=100,
+            packedSize=120,
+            path=Path("/scratch/prefix-123_0.tar"),
+            fileCount=2,
+            dataFiles=FileManifest.from_datafiles(
+                [DataFile(path="a", size=50, chk="1"), DataFile(path="b", size=50, chk="2")]
+            ),
+        ),
+        ArchiveInfo(unpackedSize=10, packedSize=12, path=Path("/scratch/prefix-123_1.tar"), fileCount=1),
+    ]
+
+    ref = save_results("prefix/123", "archive_infos", archive_infos, ArchiveInfo)
+
+    assert ref.count == 2
+    assert ref.path.is_relative_to(StoragePaths.scratch_folder("prefix/123"))
+    assert load_results(ref, ArchiveInfo) == archive_infos
+    # only the reference is passed between tasks
+    assert len(ref.model_dump_json()) < 500
+
+
+def test_results_are_read_lazily():
+    objects = (S3Storage.ListedObject(Name=f"file_{i}", Size=i) for i in range(1000))
+    ref = save_results("prefix/123", "raw_files", objects, S3Storage.ListedObject)
+
+    results = iter_results(ref, S3Storage.ListedObject)
+
+    assert next(results) == S3Storage.ListedObject(Name="file_0", Size=0)
+    assert sum(1 for _ in results) == 999
+
+
+def test_modified_results_are_rejected():
+    objects = [S3Storage.ListedObject(Name="file")]
+    ref = save_results("prefix/123", "raw_files", objects, S3Storage.ListedObject)
+    ref.path.write_text('{"Name": "other", "Size": 0, "ETag": ""}\n')
+
+    with pytest.raises(SystemError):
+        load_results(ref, S3Storage.ListedObject)
+
+    ref.path.unlink()
+    with pytest.raises(SystemError):
+        load_results(ref, S3Storage.ListedObject)
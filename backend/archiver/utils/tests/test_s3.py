@@ -1,6 +1,7 @@
 import os
 import boto3
 from pathlib import Path
+from unittest.mock import patch
 from moto import mock_aws
 from pydantic import SecretStr
 import pytest
@@ -91,3 +92,147 @@ def test_s3_interface(s3):
     listed_objects = s3.list_objects(bucket=bucket, folder="/tmp")
 
     assert len(listed_objects) == 0
+
+
+@pytest.fixture(scope="function")
+def s3_resumable(aws_credentials, tmp_path):
+    """
+    Returns a S3Storage against the moto default endpoint with a small download chunk size
+    """
+    with mock_aws():
+        client = boto3.client("s3")
+        location = {"LocationConstraint": "eu-west-1"}
+        client.create_bucket(Bucket="landingzone", CreateBucketConfiguration=location)
+        client.put_object(Bucket="landingzone", Key="prefix/sub/file.bin", Body=os.urandom(10 * 1024))
+
+        with (
+            patch.object(S3Storage, "DOWNLOAD_CHUNK_SIZE", 1024),
+            patch.object(S3Storage, "check_restore"),
+        ):
+            yield client, S3Storage(url="", user="user", password=SecretStr("pass"), region="eu-west-1")
+
+
+def test_download_file_resumes_partial_download(s3_resumable, tmp_path):
+    client, s3 = s3_resumable
+    key = "prefix/sub/file.bin"
+    body = client.get_object(Bucket="landingzone", Key=key)["Body"].read()
+    etag = client.head_object(Bucket="landingzone", Key=key)["ETag"]
+
+    # simulate an interrupted download: first chunk complete, garbage after it
+    part_dir = tmp_path / "sub"
+    part_dir.mkdir()
+    (part_dir / "file.bin.part").write_bytes(body[:1024] + b"\0" * 512)
+    S3Storage.PartialDownload(ETag=etag, Size=len(body), Ranges=[[0, 1023]]).save(
+        part_dir / "file.bin.part.json"
+    )
+
+    with patch.object(s3._client, "get_object", wraps=s3._client.get_object) as get_object:
+        path = s3.download_file(key, Path("prefix"), tmp_path, Bucket("landingzone"))
+
+    assert path == part_dir / "file.bin"
+    assert path.read_bytes() == body
+    assert not (part_dir / "file.bin.part").exists()
+    assert not (part_dir / "file.bin.part.json").exists()
+    assert get_object.call_count == 9
+    assert all(c.kwargs["Range"] != "bytes=0-1023" for c in get_object.call_args_list)
+
+
+def test_download_file_restarts_on_etag_change(s3_resumable, tmp_path):
+    client, s3 = s3_resumable
+    key = "prefix/sub/file.bin"
+    body = client.get_object(Bucket="landingzone", Key=key)["Body"].read()
+
+    part_dir = tmp_path / "sub"
+    part_dir.mkdir()
+    (part_dir / "file.bin.part").write_bytes(b"\1" * 1024)
+    S3Storage.PartialDownload(ETag='"outdated"', Size=len(body), Ranges=[[0, 1023]]).save(
+        part_dir / "file.bin.part.json"
+    )
+
+    path = s3.download_file(key, Path("prefix"), tmp_path, Bucket("landingzone"))
+
+    assert path.read_bytes() == body
+
+
+def multipart_etag(data: bytes, part_size: int) -> str:
+    import hashlib
+
+    digests = [hashlib.md5(data[i : i + part_size]).digest() for i in range(0, len(data), part_size)]
+    return f'"{hashlib.md5(b"".join(digests)).hexdigest()}-{len(digests)}"'
+
+
+def test_multipart_upload_resumes_after_failure(s3_resumable, tmp_path):
+    client, s3 = s3_resumable
+    part_size = 5 * 1024 * 1024
+    data = os.urandom(2 * part_size + 1024)
+    source_file = tmp_path / "datablock.tar"
+    source_file.write_bytes(data)
+    key = "datasets/1/datablocks/datablock.tar"
+
+    stale_upload = client.create_multipart_upload(Bucket="landingzone", Key=key)["UploadId"]
+
+    upload_part = s3._client.upload_part
+
+    def fail_on_second_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise IOError("connection lost")
+        return upload_part(**kwargs)
+
+    with (
+        patch.object(S3Storage, "UPLOAD_PART_SIZE", part_size),
+        patch.object(S3Storage, "UPLOAD_CONCURRENCY", 1),
+    ):
+        with patch.object(s3._client, "upload_part", side_effect=fail_on_second_part):
+            with pytest.raises(IOError):
+                s3.fput_object(source_file, Path(key), Bucket("landingzone"))
+
+        state = S3Storage.MultipartUpload.load(tmp_path / "datablock.tar.upload.json")
+        assert state is not None
+        assert list(state.Parts.keys()) == ["1"]
+
+        with patch.object(s3._client, "upload_part", wraps=upload_part) as retried_upload_part:
+            s3.fput_object(source_file, Path(key), Bucket("landingzone"))
+
+    assert [c.kwargs["PartNumber"] for c in retried_upload_part.call_args_list] == [2, 3]
+    assert not (tmp_path / "datablock.tar.upload.json").exists()
+    assert "Uploads" not in client.list_multipart_uploads(Bucket="landingzone")
+
+    head = client.head_object(Bucket="landingzone", Key=key)
+    assert head["ContentLength"] == len(data)
+    assert head["ETag"] == multipart_etag(data, part_size)
+    assert stale_upload != state.UploadId
+
+
+def test_multipart_upload_is_not_resumed_for_a_recreated_file(s3_resumable, tmp_path):
+    client, s3 = s3_resumable
+    part_size = 5 * 1024 * 1024
+    source_file = tmp_path / "datablock.tar"
+    source_file.write_bytes(os.urandom(2 * part_size))
+    key = "datasets/1/datablocks/datablock.tar"
+
+    upload_part = s3._client.upload_part
+
+    def fail_on_second_part(**kwargs):
+        if kwargs["PartNumber"] == 2:
+            raise IOError("connection lost")
+        return upload_part(**kwargs)
+
+    with (
+        patch.object(S3Storage, "UPLOAD_PART_SIZE", part_size),
+        patch.object(S3Storage, "UPLOAD_CONCURRENCY", 1),
+    ):
+        with patch.object(s3._client, "upload_part", side_effect=fail_on_second_part):
+            with pytest.raises(IOError):
+                s3.fput_object(source_file, Path(key), Bucket("landingzone"))
+
+        # e.g. packed again after the pod died, same size but different content
+        data = os.urandom(2 * part_size)
+        repacked = tmp_path / "repacked.tar"
+        repacked.write_bytes(data)
+        os.replace(repacked, source_file)
+
+        with patch.object(s3._client, "upload_part", wraps=upload_part) as retried_upload_part:
+            s3.fput_object(source_file, Path(key), Bucket("landingzone"))
+
+    assert [c.kwargs["PartNumber"] for c in retried_upload_part.call_args_list] == [1, 2]
+    assert client.head_object(Bucket="landingzone", Key=key)["ETag"] == multipart_etag(data, part_size)
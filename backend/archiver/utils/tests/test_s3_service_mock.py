@@ -0,0 +1,118 @@
+import os
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+import utils.datablocks as datablock_operations
+from utils.s3_storage_interface import S3Storage, Bucket
+from utils.tests.s3_service_mock import S3ServiceMock, S3ServiceProfile
+
+MB = 1024 * 1024
+
+
+@pytest.fixture(autouse=True)
+def s3_env(tmp_path):
+    envs = {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_DEFAULT_REGION": "eu-west-1",
+        "S3_EXTERNAL_ENDPOINT": "endpoint:9000",
+        "S3_URL_EXPIRATION_DAYS": "1",
+        "ARCHIVER_NUM_WORKERS": "4",
+        "ARCHIVER_SCRATCH_FOLDER": str(tmp_path),
+    }
+    for k, v in envs.items():
+        os.environ[k] = v
+
+    with patch.object(S3Storage, "RESTORE_POLL_INTERVAL_S", 0.1):
+        yield
+
+    for k in envs.keys():
+        os.environ.pop(k)
+
+
+def test_bandwidth_cap():
+    with S3ServiceMock(S3ServiceProfile(bandwidth_bytes_per_s=4 * MB), buckets=["landingzone"]) as service:
+        service.put_object("landingzone", "prefix/file", os.urandom(2 * MB), storage_class="STANDARD")
+        s3 = service.s3_storage()
+
+        start = time.monotonic()
+        s3._client.get_object(Bucket="landingzone", Key="prefix/file")["Body"].read()
+        assert time.monotonic() - start >= 0.4
+
+
+@patch.dict(os.environ, {"ARCHIVER_NUM_WORKERS": "1"})
+def test_failures_are_retried(tmp_path: Path):
+    # a single worker keeps the sequence of injected failures deterministic
+    with S3ServiceMock(S3ServiceProfile(failure_rate=0.1, seed=1), buckets=["landingzone"]) as service:
+        for i in range(10):
+            service.put_object("landingzone", f"prefix/file_{i}", os.urandom(1024))
+        s3 = service.s3_storage()
+
+        files = s3.download_objects(Path("prefix"), Bucket("landingzone"), tmp_path)
+
+        assert len(files) == 10
+        assert service.failure_count > 0
+
+
+def test_restore_delay(tmp_path: Path):
+    with S3ServiceMock(S3ServiceProfile(restore_delay_s=0.5), buckets=["landingzone"]) as service:
+        service.put_object("landingzone", "prefix/file", os.urandom(1024))
+        s3 = service.s3_storage()
+
+        s3.restore_objects(Bucket("landingzone"), ["prefix/file"])
+        head = s3._client.head_object(Bucket="landingzone", Key="prefix/file")
+        assert 'ongoing-request="true"' in head["Restore"]
+
+        start = time.monotonic()
+        s3.check_restore(Bucket("landingzone"), "prefix/file")
+        assert time.monotonic() - start >= 0.3
+
+
+@pytest.mark.skipif(not os.environ.get("ARCHIVER_BENCHMARKS"), reason="set ARCHIVER_BENCHMARKS to run")
+@pytest.mark.parametrize(
+    "profile",
+    [
+        S3ServiceProfile(),
+        S3ServiceProfile(latency_s=0.02, bandwidth_bytes_per_s=50 * MB),
+        S3ServiceProfile(latency_s=0.02, bandwidth_bytes_per_s=50 * MB, failure_rate=0.05),
+    ],
+)
+def test_transfer_benchmark(profile: S3ServiceProfile, tmp_path: Path):
+    """Round trip of datablocks through the operations used by the flows. Prints the throughput, run with
+    `ARCHIVER_BENCHMARKS=1 pytest -s` to see it.
+    """
+    num_files = 8
+    file_size = 2 * MB
+    source_folder = tmp_path / "source"
+    source_folder.mkdir()
+    for i in range(num_files):
+        (source_folder / f"datablock_{i}.tar").write_bytes(os.urandom(file_size))
+
+    with S3ServiceMock(profile, buckets=["archival"]) as service:
+        s3 = service.s3_storage()
+
+        start = time.monotonic()
+        datablock_operations.upload_objects_to_s3(
+            s3, prefix=Path("dataset"), bucket=Bucket("archival"), source_folder=source_folder, ext=".tar"
+        )
+        upload_s = time.monotonic() - start
+
+        start = time.monotonic()
+        files = datablock_operations.download_objects_from_s3(
+            s3,
+            prefix=Path("dataset"),
+            bucket=Bucket("archival"),
+            destination_folder=tmp_path / "destination",
+            progress_callback=None,
+        )
+        download_s = time.monotonic() - start
+
+    assert len(files) == num_files
+    total_mb = num_files * file_size / MB
+    print(
+        f"{profile}: upload {total_mb / upload_s:.1f} MB/s, download {total_mb / download_s:.1f} MB/s, "
+        f"{service.request_count} requests, {service.failure_count} injected failures"
+    )
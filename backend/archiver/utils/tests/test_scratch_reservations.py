@@ -0,0 +1,103 @@
+import shutil
+from collections import namedtuple
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from flows.flow_utils import SystemError
+from utils.scratch_reservations import ScratchReservations
+
+DiskUsage = namedtuple("DiskUsage", ["total", "used", "free"])
+
+
+@pytest.fixture()
+def reservations(tmp_path: Path) -> ScratchReservations:
+    return ScratchReservations(
+        scratch_folder=tmp_path,
+        ledger_file=tmp_path / ".scratch-reservations",
+        folder_of=lambda dataset_id: tmp_path / dataset_id,
+    )
+
+
+def disk_usage(free: int):
+    return patch.object(shutil, "disk_usage", lambda _: DiskUsage(total=1000, used=1000 - free, free=free))
+
+
+def test_reserve_and_release(reservations: ScratchReservations):
+    with disk_usage(free=1000):
+        assert reservations.try_reserve("a", 600)
+        assert not reservations.try_reserve("b", 600)
+        assert reservations.reserved("a") == 600
+
+        reservations.release("a", 200)
+        assert reservations.try_reserve("b", 600)
+
+        reservations.release("a")
+        assert reservations.reserved("a") == 0
+
+
+def test_used_space_counts_towards_reservation(reservations: ScratchReservations, tmp_path: Path):
+    with disk_usage(free=1000):
+        assert reservations.try_reserve("a", 600)
+
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "raw").write_bytes(b"0" * 500)
+
+    # the 500 B written by "a" are part of its reservation and not taken twice
+    with disk_usage(free=500):
+        assert reservations.try_reserve("b", 400)
+
+
+def test_waiting_reservations_are_granted_in_order(reservations: ScratchReservations):
+    with disk_usage(free=1000):
+        assert reservations.try_reserve("a", 800)
+        assert not reservations.try_reserve("b", 500)
+        # would fit, but "b" is waiting for longer
+        assert not reservations.try_reserve("c", 100)
+
+        reservations.release("a")
+        assert not reservations.try_reserve("c", 100)
+        assert reservations.try_reserve("b", 500)
+        assert reservations.try_reserve("c", 100)
+
+
+def test_abandoned_waiting_reservations_are_dropped(reservations: ScratchReservations):
+    with disk_usage(free=1000), patch.object(ScratchReservations, "STALE_WAITER_S", 0):
+        assert reservations.try_reserve("a", 800)
+        assert not reservations.try_reserve("b", 500)
+        assert reservations.try_reserve("c", 100)
+
+
+def test_abandoned_reservations_are_dropped(reservations: ScratchReservations):
+    with disk_usage(free=1000):
+        with patch("time.time", return_value=1000.0):
+            assert reservations.try_reserve("a", 500)
+            assert reservations.try_reserve("b", 500)
+        # "a" is refreshed by the heartbeat of its process, the process holding "b" was killed
+        with patch("time.time", return_value=1000.0 + ScratchReservations.STALE_HOLDER_S - 1):
+            reservations.refresh({"a"})
+            assert not reservations.try_reserve("c", 500)
+
+        with patch("time.time", return_value=1000.0 + ScratchReservations.STALE_HOLDER_S):
+            assert reservations.try_reserve("c", 500)
+        assert reservations.reserved("a") == 500
+        assert reservations.reserved("b") == 0
+
+
+def test_reservation_larger_than_scratch(reservations: ScratchReservations):
+    with disk_usage(free=1000), pytest.raises(SystemError):
+        reservations.reserve("a", 2000)
+
+
+def test_ledger_is_shared(reservations: ScratchReservations, tmp_path: Path):
+    other = ScratchReservations(
+        scratch_folder=tmp_path,
+        ledger_file=tmp_path / ".scratch-reservations",
+        folder_of=lambda dataset_id: tmp_path / dataset_id,
+    )
+    with disk_usage(free=1000):
+        assert reservations.try_reserve("a", 600)
+        assert not other.try_reserve("b", 600)
+        reservations.release("a")
+        assert other.try_reserve("b", 600)
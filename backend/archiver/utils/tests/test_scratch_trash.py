@@ -0,0 +1,94 @@
+import shutil
+from collections import namedtuple
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from utils.scratch_reservations import ScratchReservations
+from utils.scratch_trash import ScratchTrash
+
+DiskUsage = namedtuple("DiskUsage", ["total", "used", "free"])
+
+
+@pytest.fixture()
+def reservations(tmp_path: Path) -> ScratchReservations:
+    def folder_of(reservation_id: str) -> Path:
+        return tmp_path / reservation_id
+
+    return ScratchReservations(
+        scratch_folder=tmp_path,
+        ledger_file=tmp_path / ".scratch-reservations",
+        folder_of=folder_of,
+    )
+
+
+@pytest.fixture()
+def trash(tmp_path: Path, reservations: ScratchReservations) -> ScratchTrash:
+    return ScratchTrash(trash_folder=tmp_path / ".trash", reservations=reservations, num_workers=2)
+
+
+def create_folder(folder: Path, num_files: int) -> None:
+    (folder / "sub").mkdir(parents=True)
+    for i in range(num_files):
+        (folder / "sub" / f"file_{i}").write_bytes(b"0" * 100)
+
+
+def test_move_frees_path(trash: ScratchTrash, reservations: ScratchReservations, tmp_path: Path):
+    create_folder(tmp_path / "a", num_files=3)
+    with patch.object(shutil, "disk_usage", lambda _: DiskUsage(total=1000, used=0, free=1000)):
+        assert reservations.try_reserve("a", 500)
+
+    entry = trash.move(tmp_path / "a", reservation_id="a")
+
+    assert entry is not None and not (tmp_path / "a").exists()
+    assert len(list(entry.rglob("file_*"))) == 3
+    assert reservations.reserved("a") == 0
+    assert reservations.reserved(ScratchReservations.trash_reservation_id(entry.name)) == 500
+
+    # the path can be used again right away
+    create_folder(tmp_path / "a", num_files=1)
+    trash.empty().join()
+
+    assert not entry.exists()
+    assert (tmp_path / "a" / "sub" / "file_0").exists()
+    assert reservations.reserved(ScratchReservations.trash_reservation_id(entry.name)) == 0
+
+
+def test_move_missing_folder(trash: ScratchTrash, reservations: ScratchReservations, tmp_path: Path):
+    with patch.object(shutil, "disk_usage", lambda _: DiskUsage(total=1000, used=0, free=1000)):
+        assert reservations.try_reserve("a", 500)
+
+    assert trash.move(tmp_path / "a", reservation_id="a") is None
+    assert reservations.reserved("a") == 0
+
+
+def test_empty_releases_reservation_in_steps(
+    trash: ScratchTrash, reservations: ScratchReservations, tmp_path: Path
+):
+    create_folder(tmp_path / "a", num_files=50)
+    with patch.object(shutil, "disk_usage", lambda _: DiskUsage(total=10000, used=0, free=10000)):
+        assert reservations.try_reserve("a", 5000)
+    entry = trash.move(tmp_path / "a", reservation_id="a")
+    assert entry is not None
+
+    released = []
+    with (
+        patch.object(ScratchTrash, "RELEASE_STEP_BYTES", 1000),
+        patch.object(ScratchTrash, "UNLINK_BATCH_SIZE", 10),
+        patch.object(reservations, "release", lambda _, num_bytes=None: released.append(num_bytes)),
+    ):
+        trash.empty().join()
+
+    assert not entry.exists()
+    assert released == [1000] * 5 + [None]
+
+
+def test_empty_removes_leftovers(trash: ScratchTrash, tmp_path: Path):
+    # entries left behind by a process that exited before emptying the trash
+    create_folder(tmp_path / ".trash" / "leftover_1", num_files=2)
+    create_folder(tmp_path / ".trash" / "leftover_2", num_files=2)
+
+    trash.empty().join()
+
+    assert list((tmp_path / ".trash").iterdir()) == []
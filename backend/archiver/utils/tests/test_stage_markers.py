@@ -0,0 +1,61 @@
+import os
+import shutil
+from unittest.mock import patch
+
+import pytest
+
+from flows.flow_utils import StoragePaths
+from utils.stage_markers import StageMarkers
+from utils.tests.s3_service_mock import S3ServiceMock
+
+
+@pytest.fixture()
+def stage_markers(tmp_path):
+    envs = {
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "S3_EXTERNAL_ENDPOINT": "endpoint:9000",
+        "S3_LANDINGZONE_BUCKET": "landingzone",
+        "ARCHIVER_SCRATCH_FOLDER": str(tmp_path),
+    }
+    with patch.dict(os.environ, envs), S3ServiceMock(buckets=["landingzone"]) as service:
+        yield StageMarkers(service.s3_storage(), "prefix/123")
+
+
+def test_stage_completion(stage_markers: StageMarkers):
+    fingerprint = StageMarkers.fingerprint(["file_1", "file_2"], 1024)
+
+    assert not stage_markers.is_complete(StageMarkers.DATABLOCKS, fingerprint)
+    stage_markers.complete(StageMarkers.DATABLOCKS, fingerprint)
+
+    assert stage_markers.is_complete(StageMarkers.DATABLOCKS, fingerprint)
+    # different inputs
+    assert not stage_markers.is_complete(StageMarkers.DATABLOCKS, StageMarkers.fingerprint(["file_1"], 1024))
+    assert not stage_markers.is_complete(StageMarkers.REGISTER, fingerprint)
+
+
+def test_markers_survive_scratch_cleanup(stage_markers: StageMarkers):
+    fingerprint = StageMarkers.fingerprint("inputs")
+    stage_markers.complete(StageMarkers.DATABLOCKS, fingerprint)
+
+    shutil.rmtree(StoragePaths.scratch_folder("prefix/123"))
+
+    # restored from the metadata of the marker object in the landing zone
+    assert stage_markers.is_complete(StageMarkers.DATABLOCKS, fingerprint)
+    assert (StoragePaths.scratch_folder("prefix/123") / ".stages" / "datablocks.json").exists()
+
+
+def test_invalidate_changes_cache_key(stage_markers: StageMarkers):
+    fingerprint = StageMarkers.fingerprint("inputs")
+    stage_markers.complete(StageMarkers.REGISTER, fingerprint)
+    key = stage_markers.cache_key(StageMarkers.REGISTER, fingerprint)
+
+    stage_markers.invalidate(StageMarkers.REGISTER)
+    shutil.rmtree(StoragePaths.scratch_folder("prefix/123"))
+
+    assert not stage_markers.is_complete(StageMarkers.REGISTER, fingerprint)
+    assert stage_markers.cache_key(StageMarkers.REGISTER, fingerprint) != key
+
+    stage_markers.complete(StageMarkers.REGISTER, fingerprint)
+    assert stage_markers.is_complete(StageMarkers.REGISTER, fingerprint)
+    assert stage_markers.cache_key(StageMarkers.REGISTER, fingerprint) != key